@@ -0,0 +1,5 @@
+"""This module runs the pkrsplitter command line interface with `python -m pkrsplitter`."""
+from pkrsplitter.cli import main
+
+if __name__ == "__main__":
+    main()
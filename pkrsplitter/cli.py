@@ -0,0 +1,233 @@
+"""This module defines the pkrsplitter command line interface, which runs the splitters on local or S3 histories."""
+import argparse
+import logging
+import re
+import threading
+import time
+from datetime import date
+from pkrsplitter.settings import settings, SettingsError
+from pkrsplitter.splitters.abstract import AbstractFileSplitter, EXECUTOR_TYPES, OUTPUT_FORMATS
+from pkrsplitter.splitters.metrics import SplitMetrics, METRICS_FORMATS
+from pkrsplitter.splitters.rooms import ROOMS
+
+BACKENDS = ("local", "s3")
+COMMANDS = {
+    "split": "split_files",
+    "split-new": "split_new_files",
+    "split-new-histories": "split_new_histories",
+    "split-appended": "split_appended_files",
+    "correct": "split_correction_files",
+}
+DEDUP_MODES = ("raw", "hands", "all")
+DATE_PATTERN = re.compile(r"^(\d{4})[-/](\d{2})[-/](\d{2})$")
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+logger = logging.getLogger(__name__)
+
+
+def parse_date(value: str) -> date:
+    """
+    Parses a date argument
+    Args:
+        value (str): A date in the YYYY-MM-DD or YYYY/MM/DD format
+
+    Returns:
+        date (date): The parsed date
+    """
+    match = DATE_PATTERN.match(value)
+    try:
+        return date(*(int(part) for part in match.groups()))
+    except (AttributeError, ValueError):
+        raise argparse.ArgumentTypeError(f"Invalid date {value}, expected YYYY-MM-DD")
+
+
+class ProgressReporter:
+    """
+    Counts the split raw files, hands and bytes, and logs the throughput at regular intervals
+
+    Methods:
+        on_split: Counts a split raw file, to be passed as the on_split callback of the split runs
+        get_summary: Returns the throughput of the whole run
+    """
+
+    def __init__(self, interval: float = 5.0):
+        """
+        Initializes the ProgressReporter class
+        Args:
+            interval: The number of seconds between two progress lines
+        """
+        self.interval = interval
+        self.files_count = 0
+        self.hands_count = 0
+        self.bytes_count = 0
+        self.started_at = time.monotonic()
+        self.reported_at = self.started_at
+        self._lock = threading.Lock()
+
+    def on_split(self, job):
+        with self._lock:
+            self.files_count += 1
+            self.hands_count += len(job.destination_keys or ())
+            self.bytes_count += job.size or 0
+            now = time.monotonic()
+            if now - self.reported_at < self.interval:
+                return
+            self.reported_at = now
+            line = self.get_summary()
+        logger.info(line)
+
+    def get_summary(self) -> str:
+        """
+        Returns the throughput of the run so far
+        Returns:
+            summary (str): The counts and rates of files, hands and megabytes
+        """
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        megabytes = self.bytes_count / 1024 ** 2
+        return (f"{self.files_count} files, {self.hands_count} hands, {megabytes:.1f} MB in {elapsed:.1f} s: "
+                f"{self.files_count / elapsed:.1f} files/s, {self.hands_count / elapsed:.0f} hands/s, "
+                f"{megabytes / elapsed:.2f} MB/s")
+
+
+def get_parser() -> argparse.ArgumentParser:
+    """
+    Returns the parser of the command line arguments
+    Returns:
+        parser (argparse.ArgumentParser): The parser, with a sub-command per split run
+    """
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument("--backend", choices=BACKENDS, default="local",
+                         help="Split the histories of the local data directory or of the S3 bucket")
+    options.add_argument("--data-dir", help="The local data directory, defaults to POKER_DATA_DIR")
+    options.add_argument("--bucket", help="The S3 bucket, defaults to POKER_AWS_BUCKET_NAME")
+    options.add_argument("--executor", choices=EXECUTOR_TYPES, default="thread", help="The executor backend")
+    options.add_argument("--workers", type=int, help="The number of workers of the fetch and write stages")
+    options.add_argument("--parser-workers", type=int, help="The number of workers of the split stage")
+    options.add_argument("--queue-size", type=int, help="The maximum number of raw files waiting for each stage")
+    options.add_argument("--streaming", action="store_true", help="Read the raw files in chunks")
+    options.add_argument("--mmap", action="store_true", help="Memory-map the raw files (local backend)")
+    options.add_argument("--fsync", action="store_true",
+                         help="Sync the split files to disk in batches before renaming them (local backend)")
+    options.add_argument("--output-format", choices=OUTPUT_FORMATS, default="files",
+                         help="Write a file per hand, or a pack per raw file")
+    options.add_argument("--manifest", action="store_true",
+                         help="Record the split raw files in a manifest to skip the unchanged ones")
+    options.add_argument("--dedup", choices=DEDUP_MODES, nargs="?", const="all", default=None,
+                         help="Skip the raw files identical to an already split one (raw, with a manifest), "
+                              "and do not rewrite the hands identical to their split file (hands)")
+    options.add_argument("--room", choices=tuple(ROOMS),
+                         help="The room of the raw files, sniffed from the beginning of each file by default")
+    options.add_argument("--prefix", help="Only split the raw files under this sub-directory, e.g. 2024/01")
+    options.add_argument("--since", type=parse_date, help="Only split the raw files of this date or later")
+    options.add_argument("--until", type=parse_date, help="Only split the raw files of this date or earlier")
+    options.add_argument("--tour-id", action="append", dest="tour_ids", metavar="TOUR_ID",
+                         help="Only split the raw files of this tournament, can be repeated")
+    options.add_argument("--resume", action="store_true",
+                         help="Checkpoint the run, quarantining the failing raw files, and resume it if interrupted")
+    options.add_argument("--dry-run", action="store_true", help="List the raw files to split without splitting them")
+    options.add_argument("--progress", type=float, nargs="?", const=5.0, default=None, metavar="SECONDS",
+                         help="Log the throughput every few seconds")
+    options.add_argument("--log-level", choices=LOG_LEVELS, default="INFO",
+                         help="The level of the logs, DEBUG logs each split hand")
+    options.add_argument("-q", "--quiet", action="store_true", help="Only log the warnings and errors")
+    options.add_argument("--metrics", metavar="PATH", help="Write the stage timings and counters of the run to a file")
+    options.add_argument("--metrics-format", choices=METRICS_FORMATS, default="json",
+                         help="The format of the metrics file, JSON or the Prometheus text format")
+    parser = argparse.ArgumentParser(prog="pkrsplitter", description="Split poker history files into single hands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("split", parents=[options], help="Split all the raw history files")
+    subparsers.add_parser("split-new", parents=[options], help="Split the hands that are not split yet")
+    subparsers.add_parser("split-new-histories", parents=[options],
+                          help="Split the raw history files that were never split")
+    subparsers.add_parser("split-appended", parents=[options],
+                          help="Split the hands appended to the raw history files since the last run")
+    subparsers.add_parser("correct", parents=[options], help="Split the raw history files of the correction file")
+    return parser
+
+
+def create_splitter(args: argparse.Namespace) -> AbstractFileSplitter:
+    """
+    Creates the splitter configured by the command line arguments
+    Args:
+        args (argparse.Namespace): The parsed arguments
+
+    Returns:
+        splitter (AbstractFileSplitter): The local or cloud splitter
+    """
+    if args.backend == "s3":
+        from pkrsplitter.splitters.cloud import CloudFileSplitter
+        splitter = CloudFileSplitter(args.bucket or settings.bucket_name, streaming=args.streaming,
+                                     executor_type=args.executor, max_workers=args.workers,
+                                     max_parser_workers=args.parser_workers, output_format=args.output_format)
+    else:
+        from pkrsplitter.splitters.local import LocalFileSplitter
+        splitter = LocalFileSplitter(args.data_dir or settings.data_dir, streaming=args.streaming,
+                                     use_mmap=args.mmap, executor_type=args.executor, max_workers=args.workers,
+                                     max_parser_workers=args.parser_workers, output_format=args.output_format)
+        if args.fsync:
+            splitter.set_writer(fsync=True)
+    if args.queue_size:
+        splitter.set_pipeline(queue_size=args.queue_size)
+    splitter.set_room(args.room)
+    splitter.set_raw_filter(args.prefix, start_date=args.since, end_date=args.until, tour_ids=args.tour_ids)
+    if args.manifest:
+        splitter.set_manifest()
+    if args.resume and not args.dry_run:
+        splitter.set_checkpoint()
+    if args.dedup:
+        splitter.set_deduplication(raw=args.dedup in ("raw", "all"), hands=args.dedup in ("hands", "all"))
+    return splitter
+
+
+def print_dry_run(splitter: AbstractFileSplitter, command: str):
+    """
+    Prints the raw files a command would split
+    Args:
+        splitter (AbstractFileSplitter): The configured splitter
+        command (str): The sub-command
+    """
+    if command == "correct":
+        raw_keys = splitter.get_file_content(splitter.correction_raw_keys_file_key).split()
+        jobs_sizes = [(raw_key, None) for raw_key in raw_keys]
+    else:
+        jobs = splitter.list_raw_histories_jobs(only_changed=command != "split")
+        jobs_sizes = [(job.raw_key, job.size) for job in jobs]
+    for raw_key, _ in jobs_sizes:
+        print(raw_key)
+    megabytes = sum(size or 0 for _, size in jobs_sizes) / 1024 ** 2
+    print(f"\n{len(jobs_sizes)} raw files ({megabytes:.1f} MB) would be split by {command}")
+
+
+def main(argv: list = None):
+    """
+    Runs the pkrsplitter command line interface
+    Args:
+        argv (list): The command line arguments, defaults to sys.argv
+    """
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    logging.basicConfig(level="WARNING" if args.quiet else args.log_level, format=LOG_FORMAT)
+    try:
+        splitter = create_splitter(args)
+    except SettingsError as error:
+        parser.error(f"{error}, use --data-dir or --bucket")
+    if args.dry_run:
+        print_dry_run(splitter, args.command)
+        return
+    if args.metrics:
+        splitter.set_metrics(SplitMetrics())
+    # Without --progress, the throughput is only logged at the end of the run
+    progress = ProgressReporter(args.progress if args.progress is not None else float("inf"))
+    try:
+        with splitter:
+            getattr(splitter, COMMANDS[args.command])(on_split=progress.on_split)
+    finally:
+        # The metrics of a failed run are kept, to see the stage it failed in
+        if args.metrics:
+            splitter.metrics.dump(args.metrics, args.metrics_format)
+    logger.info(progress.get_summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,95 @@
-""" This module defines a lambda handler that splits a single raw history file in an S3 bucket."""
-import json
-from pkrsplitter.splitters.cloud import CloudFileSplitter
-
-
-def lambda_handler(event, context):
-    """
-    Splits raw histories in a S3 bucket
-    Args:
-        event:
-        context:
-
-    Returns:
-
-    """
-    print(f"Event: {event} Starting lambda_handler")
-    for record in event['Records']:
-        body = record['body']
-        body_dict = json.loads(body)
-        message = body_dict["Message"]
-        message_dict = json.loads(message)
-        message_record = message_dict["Records"][0]
-        bucket_name = message_record['s3']['bucket']['name']
-        key = message_record['s3']['object']['key']
-        print(f"Splitting file {key}")
-        try:
-            splitter = CloudFileSplitter(bucket_name)
-            splitter.write_split_files(key)
-            return {
-                'statusCode': 200,
-                'body': f'File {key} processed successfully as split hands to {splitter.get_destination_dir(key)}'
-            }
-        except Exception as e:
-            print(f"Error in lambda_handler: {e}")
-            return {
-                'statusCode': 500,
-                'body': f'Error processing file {key}: {e}'
-            }
+""" This module defines a lambda handler that splits the raw history files of a batch of SQS messages in an S3 bucket."""
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote_plus
+from pkrsplitter.splitters.cloud import CloudFileSplitter
+from pkrsplitter.splitters.metrics import SplitMetrics
+
+MAX_RECORD_WORKERS = int(os.environ.get("POKER_SPLITTER_RECORD_WORKERS", 10))
+LOG_LEVEL = os.environ.get("POKER_SPLITTER_LOG_LEVEL", "INFO")
+
+# The lambda runtime configures the handler of the root logger, only its level is set
+logging.getLogger().setLevel(LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+# The splitters, with their S3 client and upload workers, are created once per container and reused by warm invocations
+splitters = {}
+splitters_lock = threading.Lock()
+records_executor = ThreadPoolExecutor(max_workers=MAX_RECORD_WORKERS)
+# The metrics are shared by the splitters and reset by each invocation, which logs them once done
+metrics = SplitMetrics()
+
+
+def get_splitter(bucket_name: str) -> CloudFileSplitter:
+    """
+    Returns the splitter of a bucket, created on the first invocation of the container that needs it
+    Args:
+        bucket_name (str): The name of the S3 bucket
+
+    Returns:
+        splitter (CloudFileSplitter): The splitter of the bucket
+    """
+    with splitters_lock:
+        splitter = splitters.get(bucket_name)
+        if splitter is None:
+            splitter = splitters[bucket_name] = CloudFileSplitter(bucket_name)
+            splitter.set_metrics(metrics)
+        return splitter
+
+
+def get_record_objects(record: dict) -> list:
+    """
+    Returns the S3 objects notified by a SQS record, whose body is a SNS message wrapping a S3 event
+    Args:
+        record (dict): The SQS record
+
+    Returns:
+        objects (list): Tuples of the bucket name and the decoded key of each object
+    """
+    message_dict = json.loads(json.loads(record["body"])["Message"])
+    return [(message_record["s3"]["bucket"]["name"], unquote_plus(message_record["s3"]["object"]["key"]))
+            for message_record in message_dict["Records"]]
+
+
+def process_record(record: dict) -> None:
+    """
+    Splits the raw history files notified by a SQS record
+    Args:
+        record (dict): The SQS record
+    """
+    for bucket_name, key in get_record_objects(record):
+        splitter = get_splitter(bucket_name)
+        logger.info("Splitting file %s", key)
+        with metrics.time_stage("split"):
+            destination_keys = splitter.write_split_files(key)
+        metrics.increment("files")
+        metrics.increment("hands", len(destination_keys))
+        logger.info("File %s processed successfully as split hands to %s", key, splitter.get_destination_dir(key))
+
+
+def lambda_handler(event, context):
+    """
+    Splits raw histories in a S3 bucket, processing all the records of the SQS batch concurrently.
+    The event source mapping must enable ReportBatchItemFailures, so that only the failed messages are retried.
+    Args:
+        event: The SQS event, with a batch of records
+        context: The lambda context
+
+    Returns:
+        response (dict): The partial batch response, listing the message ids of the failed records
+    """
+    records = event["Records"]
+    metrics.reset()
+    logger.info("Starting lambda_handler with %d records", len(records))
+    futures = {record["messageId"]: records_executor.submit(process_record, record) for record in records}
+    batch_item_failures = []
+    for message_id, future in futures.items():
+        error = future.exception()
+        if error is not None:
+            logger.error("Error in lambda_handler for message %s: %s", message_id, error, exc_info=error)
+            batch_item_failures.append({"itemIdentifier": message_id})
+    logger.info("Metrics: %s", metrics.to_json())
+    return {"batchItemFailures": batch_item_failures}
@@ -0,0 +1,4 @@
+"""This module defines the RegEx patterns of the GGPoker history files."""
+SNIFF_PATTERN = r"Poker\s+Hand\s+#[A-Z]*\d+:"
+NEW_HAND_PATTERN = r"Poker\s+Hand\s+(?=#[A-Z]*\d+:)"
+HAND_ID_PATTERN = r"#(?P<hand_id>[A-Z]*\d+):\s+(?P<Variant>[A-Za-z' ]+)"
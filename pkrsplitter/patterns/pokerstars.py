@@ -0,0 +1,4 @@
+"""This module defines the RegEx patterns of the PokerStars history files."""
+SNIFF_PATTERN = r"PokerStars\s+(?:Zoom\s+)?(?:Hand|Game)\s+#\d+"
+NEW_HAND_PATTERN = r"PokerStars\s+(?:Zoom\s+)?(?:Hand|Game)\s+(?=#\d+)"
+HAND_ID_PATTERN = r"#(?P<hand_id>\d+):\s+(?P<Variant>[A-Za-z' ]+)"
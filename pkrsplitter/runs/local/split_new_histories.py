@@ -1,7 +0,0 @@
-"""This script is used to split new raw histories in the local file system."""
-from pkrsplitter.splitters.local import LocalFileSplitter
-from pkrsplitter.settings import DATA_DIR
-
-if __name__ == "__main__":
-    splitter = LocalFileSplitter(DATA_DIR)
-    splitter.split_new_histories()
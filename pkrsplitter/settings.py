@@ -1,14 +1,96 @@
-"""This module defines the directories used by the pkrsplitter package."""
-import os
-
-DATA_DIR = os.environ.get("POKER_DATA_DIR")
-HISTORY_DIR = os.path.join(DATA_DIR, "histories")
-RAW_HISTORY_DIR = os.path.join(HISTORY_DIR, "raw")
-SPLIT_HISTORY_DIR = os.path.join(HISTORY_DIR, "split")
-BUCKET_NAME = os.environ.get("POKER_AWS_BUCKET_NAME")
-
-if __name__ == "__main__":
-    print(f"Source directory: {DATA_DIR}")
-    print(f"History directory: {HISTORY_DIR}")
-    print(f"Raw history directory: {RAW_HISTORY_DIR}")
-    print(f"Split history directory: {SPLIT_HISTORY_DIR}")
\ No newline at end of file
+"""This module defines the directories used by the pkrsplitter package, read from the environment when first used."""
+import os
+
+
+class SettingsError(RuntimeError):
+    """
+    Raised when a setting is used while its environment variable is missing or invalid
+    """
+
+
+class Settings:
+    """
+    The configuration of the package, read from the environment when each setting is first used,
+    so that importing the package never fails nor touches the file system.
+
+    Attributes:
+        data_dir (str): The data directory, from POKER_DATA_DIR, which must be an existing directory
+        history_dir (str): The histories directory of the data directory
+        raw_history_dir (str): The raw histories directory
+        split_history_dir (str): The split histories directory
+        bucket_name (str): The name of the S3 bucket, from POKER_AWS_BUCKET_NAME
+
+    Examples:
+        settings = Settings()
+        splitter = LocalFileSplitter(settings.data_dir)
+    """
+
+    def __init__(self, environ: dict = None):
+        """
+        Initializes the Settings class
+        Args:
+            environ: The environment variables, defaults to os.environ
+        """
+        self.environ = os.environ if environ is None else environ
+
+    def get_required(self, name: str) -> str:
+        """
+        Returns the value of a required environment variable
+        Args:
+            name (str): The name of the environment variable
+
+        Returns:
+            value (str): The value of the environment variable
+        """
+        value = self.environ.get(name)
+        if not value:
+            raise SettingsError(f"The {name} environment variable is not set")
+        return value
+
+    @property
+    def data_dir(self) -> str:
+        data_dir = self.get_required("POKER_DATA_DIR")
+        if not os.path.isdir(data_dir):
+            raise SettingsError(f"POKER_DATA_DIR is not a directory: {data_dir}")
+        return data_dir
+
+    @property
+    def history_dir(self) -> str:
+        return os.path.join(self.data_dir, "histories")
+
+    @property
+    def raw_history_dir(self) -> str:
+        return os.path.join(self.history_dir, "raw")
+
+    @property
+    def split_history_dir(self) -> str:
+        return os.path.join(self.history_dir, "split")
+
+    @property
+    def bucket_name(self) -> str:
+        return self.get_required("POKER_AWS_BUCKET_NAME")
+
+
+settings = Settings()
+
+SETTINGS_NAMES = {
+    "DATA_DIR": "data_dir",
+    "HISTORY_DIR": "history_dir",
+    "RAW_HISTORY_DIR": "raw_history_dir",
+    "SPLIT_HISTORY_DIR": "split_history_dir",
+    "BUCKET_NAME": "bucket_name",
+}
+
+
+def __getattr__(name: str):
+    # The module constants are computed on access, e.g. by `from pkrsplitter.settings import DATA_DIR`
+    if name in SETTINGS_NAMES:
+        return getattr(settings, SETTINGS_NAMES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if __name__ == "__main__":
+    print(f"Source directory: {settings.data_dir}")
+    print(f"History directory: {settings.history_dir}")
+    print(f"Raw history directory: {settings.raw_history_dir}")
+    print(f"Split history directory: {settings.split_history_dir}")
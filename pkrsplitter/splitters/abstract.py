@@ -1,271 +1,1253 @@
-"""This module defines the AbstractFileSplitter class, which is used to split poker history files."""
-import re
-from abc import ABC, abstractmethod
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from pkrsplitter.patterns.winamax import NEW_HAND_PATTERN, HAND_ID_PATTERN
-
-
-class AbstractFileSplitter(ABC):
-    """
-    A class to split poker history files
-
-    Methods:
-        list_raw_histories_keys: Lists all the history files in the raw directory and returns a list of their key
-        get_destination_dir: Returns the directory where the split files will be stored
-        check_split_file_exists: Checks if the split files already exist
-        check_split_dir_exists: Checks if the split directory for the history file already exists
-        get_raw_text: Returns the text of a raw history file
-        split_raw_text: Splits a history file into separate hands
-        get_split_texts: Returns a list of the separate hand texts in a history file
-        get_hand_id: Extracts the hand id from a hand text
-        get_id_list: Returns a list of the hand ids in a history file
-        get_separated_hands_info: Returns a list of tuples containing the destination key and the text of each hand
-        write_split_files: Writes the split files to the destination key of the bucket
-        write_new_split_files: Writes the split files that do not already exist
-        write_new_split_histories: Writes the split files for raw files that have never been split
-        split_files: Splits all the history files in the raw directory
-        split_new_files: Splits all the history files that have not already been split
-        split_new_histories: Splits the raw history files for raw files that have never been split
-    Examples:
-        splitter = LocalFileSplitter(DATA_DIR)
-        splitter.split_files()
-
-        splitter = CloudFileSplitter(BUCKET_NAME)
-        splitter.split_new_files()
-
-    See Also:
-        pkrsplitter.splitters.local.LocalFileSplitter
-        pkrsplitter.splitters.s3.S3FileSplitter
-    """
-
-    data_dir: str
-    raw_dir: str
-    correction_raw_keys_file_key: str
-    correction_split_keys_file_key: str
-
-    @abstractmethod
-    def list_raw_histories_keys(self, directory_key: str = None) -> list:
-        """
-         Lists all the history files in the raw directory and returns a list of their key
-        Returns:
-            list: A list of dictionaries containing the root and filename of the history files
-        """
-        pass
-
-    @staticmethod
-    def get_destination_dir(raw_key: str) -> str:
-        """
-        Returns the directory where the split files will be stored
-        Args:
-            raw_key (str): The full path of the history file
-
-        Returns:
-            destination_dir (str): The directory where the split files will be stored
-
-        """
-        destination_dir = raw_key.replace("raw", "split").replace(".txt", "")
-        return destination_dir
-
-    @abstractmethod
-    def check_split_dir_exists(self, raw_key: str) -> bool:
-        """
-        Checks if the split directory for the history file already exists
-        Args:
-            raw_key: The full key of the history file
-
-        Returns:
-            split_dir_exists (bool): True if the split directory already exists, False otherwise
-        """
-        pass
-
-    @abstractmethod
-    def get_file_content(self, file_key: str) -> str:
-        """
-        Returns the text of a file
-        Args:
-            file_key (str): The file key
-
-        Returns:
-            content (str): The content text
-
-        """
-        pass
-
-    @abstractmethod
-    def write_file(self, file_key: str, content: str) -> None:
-        """
-        """
-        pass
-
-    @abstractmethod
-    def write_file_from_list(self, file_key: str, content: list) -> None:
-        """
-        """
-        pass
-
-    @staticmethod
-    def split_raw_text(raw_text: str) -> list:
-        """
-        Splits a history file into separate hands
-        Args:
-            raw_text (str): The raw text of the history file
-
-        Returns:
-            raw_hands (list): A list of the separate hands in the history file
-        """
-        raw_hands = re.split(NEW_HAND_PATTERN, raw_text)
-        raw_hands.pop(0)
-        return raw_hands
-
-    def get_split_texts(self, raw_key: str) -> list:
-        """
-        Returns a list of the separate hand texts in a history file
-        Args:
-            raw_key (str): The raw_key of the history file
-
-        Returns:
-            split_texts (list): A list of the separate hand texts in the history file
-        """
-
-        raw_text = self.get_file_content(raw_key)
-        split_texts = self.split_raw_text(raw_text)
-        return split_texts
-
-    @staticmethod
-    def get_hand_id(hand_text: str) -> str:
-        """
-        Extracts the hand id from a hand text
-        Args:
-            hand_text (str): The text of a hand
-
-        Returns:
-            hand_id (str): The id of the hand
-        """
-        r = re.compile(HAND_ID_PATTERN)
-        match = r.search(hand_text)
-        if match:
-            hand_id = match.group("hand_id")
-        else:
-            hand_id = ""
-        return hand_id
-
-    def get_id_list(self, raw_key: str) -> list:
-        """
-        Returns a list of the hand ids in a history file
-        Args:
-            raw_key (str): The key of the raw history file
-
-        Returns:
-            id_list (list): A list of the hand ids in the history file
-        """
-        split_texts = self.get_split_texts(raw_key)
-        id_list = [self.get_hand_id(hand) for hand in split_texts]
-        return id_list
-        # try:
-        #    pass
-        # except Exception:
-        #     print(f"Error in get_id_list for {raw_key}")
-
-    def get_separated_hands_info(self, raw_key: str) -> list:
-        """
-        Returns a list of tuples containing the destination key and the text of each hand
-        Args:
-            raw_key (str): The path of the history file
-
-        Returns:
-            separated_hands_info (list): A list of tuples containing the destination path and the text of each hand
-        """
-        id_list = self.get_id_list(raw_key)
-        split_texts = self.get_split_texts(raw_key)
-        destination_dir = self.get_destination_dir(raw_key)
-        try:
-            destination_key_list = [f"{destination_dir}/{hand_id}.txt" for hand_id in id_list]
-            separated_hands_info = list(zip(destination_key_list, split_texts))
-            return separated_hands_info
-        except TypeError:
-            print(f"Error in get_separated_hands_info for {raw_key}")
-            print(len(id_list))
-            print(len(split_texts))
-            raise TypeError
-
-    def write_split_files(self, raw_key: str):
-        """
-        Writes the split files to the split directory
-        Args:
-            raw_key (str): The path of the history file
-        """
-        destination_dir = self.get_destination_dir(raw_key)
-        print(f"Splitting {raw_key} to {destination_dir}")
-        for destination_key, hand_text in self.get_separated_hands_info(raw_key):
-            if hand_text:
-                self.write_file(file_key=destination_key, content=hand_text)
-
-    @abstractmethod
-    def write_new_split_files(self, raw_key: str):
-        """
-        Writes the split files that do not already exist
-        Args:
-            raw_key:
-        """
-        pass
-
-    def write_new_split_histories(self, raw_key: str):
-        """
-        Writes the split files for raw files that have never been split
-        Args:
-            raw_key: The key of the raw history file
-        """
-        if not self.check_split_dir_exists(raw_key):
-            self.write_split_files(raw_key)
-
-    def split_files(self):
-        """
-        Splits all the history files in the raw directory
-        """
-        print(f"Splitting history files from {self.raw_dir}...\n")
-        history_keys = self.list_raw_histories_keys()[::-1]
-        with ThreadPoolExecutor() as executor:
-            futures = {executor.submit(self.write_split_files, raw_key) for raw_key in history_keys}
-            for future in as_completed(futures):
-                future.result()
-
-    def split_new_files(self):
-        """
-        Splits all the history files that have not already been split
-        """
-        history_keys = self.list_raw_histories_keys()[::-1]
-        with ThreadPoolExecutor() as executor:
-            futures = {executor.submit(self.write_new_split_files, raw_key) for raw_key in history_keys}
-            for future in as_completed(futures):
-                future.result()
-
-    def split_new_histories(self):
-        """
-        Splits the raw history files for raw files that have never been split
-        """
-        history_keys = self.list_raw_histories_keys()[::-1]
-        with ThreadPoolExecutor() as executor:
-            futures = {executor.submit(self.write_new_split_histories, raw_key) for raw_key in history_keys}
-            for future in as_completed(futures):
-                future.result()
-
-    def split_correction_files(self):
-        """
-        Split the history files to correct.
-        Returns:
-
-        """
-        print("Splitting correction files...\n")
-        raw_keys_content = self.get_file_content(self.correction_raw_keys_file_key)
-        raw_keys = raw_keys_content.split()
-        destination_keys = [hand_info[0]
-                            for raw_key in raw_keys
-                            for hand_info in self.get_separated_hands_info(raw_key)]
-        print(f"There are {len(raw_keys)} raw files to split.\n")
-        self.write_file_from_list(self.correction_split_keys_file_key, destination_keys)
-        with ThreadPoolExecutor() as executor:
-            futures = {executor.submit(self.write_new_split_files, raw_key) for raw_key in raw_keys}
-            for future in as_completed(futures):
-                future.result()
-        self.write_file(self.correction_raw_keys_file_key, "")
-        print("Raw history files to correct have been split.")
+"""This module defines the AbstractFileSplitter class, which is used to split poker history files."""
+import itertools
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor
+from datetime import date
+from typing import Callable, Iterable, Iterator
+from pkrsplitter.splitters.engine import (iter_hand_texts, iter_identified_hands, iter_streamed_hand_texts,
+                                          extract_hand_id, find_hands, get_hands, get_complete_hands_end,
+                                          DEFAULT_CHUNK_SIZE)
+from pkrsplitter.splitters.hand_index import HandIndex, SplitKeys, get_hand_ids
+from pkrsplitter.splitters.rooms import Room, get_room, sniff_room, DEFAULT_ROOM, SNIFF_SIZE
+from pkrsplitter.splitters.pipeline import Pipeline, Stage, DEFAULT_QUEUE_SIZE
+from pkrsplitter.splitters.split_keys import SplitKeysCache
+from pkrsplitter.splitters.checkpoint import AbstractCheckpoint, get_run_filter, guard_task
+from pkrsplitter.splitters.manifest import (AbstractManifest, ManifestEntry, get_content_hasher, hash_content,
+                                            iter_hashed_chunks)
+from pkrsplitter.splitters.partitions import PartitionFilter, intersect_prefixes
+from pkrsplitter.splitters.listing import iter_parallel_walk
+from pkrsplitter.splitters.metrics import SplitMetrics, increment, time_stage
+from pkrsplitter.splitters.packed import get_index_key, read_packed_hand, write_packed_hands
+
+EXECUTOR_TYPES = ("thread", "process", "hybrid")
+OUTPUT_FORMATS = ("files", "packed")
+
+logger = logging.getLogger(__name__)
+
+
+class SplitJob:
+    """
+    The splitting of a raw history file, handed from one stage of the pipeline to the next
+
+    Attributes:
+        raw_key (str): The key of the raw history file
+        size (int): The size of the raw history file from the listing, if known
+        version (str): The modification time or ETag of the raw history file from the listing, if known
+        raw_history (str | Iterator[str]): The raw text, or its chunks in streaming mode, once fetched
+        separated_hands_info (list | Iterator[tuple]): The destination key and text of each hand, once split
+        destination_keys (list): The destination keys of the hands, once written
+        content_hash (str): The hash of the raw text, when a manifest is used
+        hasher: The hash object fed by the chunks of the raw text in streaming mode
+    """
+    __slots__ = ("raw_key", "size", "version", "raw_history", "separated_hands_info", "destination_keys",
+                 "content_hash", "hasher")
+
+    def __init__(self, raw_key: str, size: int = None, version: str = None):
+        self.raw_key = raw_key
+        self.size = size
+        self.version = version
+        self.raw_history = None
+        self.separated_hands_info = None
+        self.destination_keys = None
+        self.content_hash = None
+        self.hasher = None
+
+
+class AbstractFileSplitter(ABC):
+    """
+    A class to split poker history files
+
+    Methods:
+        list_raw_histories_keys: Lists all the history files in the raw directory and returns a list of their key
+        scan_raw_directory: Lists the sub-directories and the history files of a single directory level
+        iter_raw_histories_stats: Yields the history files of directories as they are listed in parallel
+        create_manifest: Creates the default manifest recording the split raw files
+        get_destination_dir: Returns the directory where the split files will be stored
+        check_split_file_exists: Checks if the split files already exist
+        check_split_dir_exists: Checks if the split directory for the history file already exists
+        check_split_output_exists: Checks if the history file was already split, in the output format of the splitter
+        list_split_keys: Lists all the split keys under a directory
+        list_split_fingerprints: Lists all the split keys under a directory with a fingerprint of their content
+        matches_fingerprint: Checks if an existing split file has the given content, from its fingerprint
+        get_existing_split_keys: Returns the split keys that already exist for a history file
+        get_raw_text: Returns the text of a raw history file
+        iter_file_chunks: Yields the text of a file in chunks of a fixed size
+        get_file_bytes: Returns the raw bytes of a file from a byte offset, or of a byte range
+        decode_raw_bytes: Decodes raw bytes read from a history file
+        read_raw_history: Returns the raw text of a history file, or its chunks in streaming mode
+        get_raw_room: Returns the room of a history file, sniffed from its first bytes
+        peek_raw_history_room: Returns the room of a raw history already read, from its first chunk in streaming mode
+        iter_raw_history_hands: Yields the destination key and the text of each hand of a raw history
+        split_raw_text: Splits a history file into separate hands
+        get_split_texts: Returns a list of the separate hand texts in a history file
+        get_hand_id: Extracts the hand id from a hand text
+        get_id_list: Returns a list of the hand ids in a history file
+        iter_separated_hands_info: Yields the destination key and the text of each hand, reading the file once
+        get_hand_index: Returns the compact index of the hands of a raw text, building their keys and texts on demand
+        get_separated_hands_info: Returns a sequence of tuples containing the destination key and the text of each hand
+        write_files: Writes many files, one after the other unless a splitter writes them concurrently
+        write_separated_hands: Writes the given hands to their destination keys
+        read_split_hand: Returns the text of a split hand, whatever the output format
+        write_split_files: Writes the split files to the destination key of the bucket
+        write_new_split_files: Writes the split files that do not already exist
+        write_new_split_histories: Writes the split files for raw files that have never been split
+        write_appended_split_files: Writes the split files of the hands appended since the last incremental run
+        split_raw_keys: Splits raw history files through a bounded list, fetch, split and write pipeline
+        iter_raw_histories_jobs: Yields the history files as SplitJobs while they are listed in parallel
+        list_raw_histories_jobs: Lists the history files as SplitJobs, skipping the unchanged ones with a manifest
+        split_files: Splits all the history files in the raw directory
+        split_new_files: Splits all the history files that have not already been split
+        split_new_histories: Splits the raw history files for raw files that have never been split
+        split_appended_files: Splits the hands appended to the raw history files since the last incremental run
+        set_metrics: Sets the metrics recording the stage timings and the counters of the split runs
+        set_checkpoint: Sets the checkpoint recording the progress of the split runs, so that they can be resumed
+        create_checkpoint: Creates the default checkpoint of the splitter
+        start_checkpoint: Starts recording a run in the checkpoint, resuming it if it was interrupted
+        complete_checkpoint: Writes the quarantined raw files of a complete run and clears the checkpoint
+        close: Releases the worker pools kept by the splitter between runs, also when used as a context manager
+    Executor types:
+        thread: The fetch, split and write stages run in threads, which suits the latency of S3 requests
+        process: Each raw file is split by a single task run in a process pool, for CPU-bound local runs
+        hybrid: The fetch and write stages run in threads, and the split stage hands the parsing to a process pool
+    Output formats:
+        files: Each hand is written to its own f"{destination_dir}/{hand_id}.txt" file
+        packed: The hands of a raw file are written to a single f"{destination_dir}.pack" file, with a JSON index of
+            their byte spans in f"{destination_dir}.index.json". The destination keys keep the files format and are
+            read with read_split_hand.
+    Examples:
+        splitter = LocalFileSplitter(DATA_DIR)
+        splitter.split_files()
+
+        splitter = CloudFileSplitter(BUCKET_NAME)
+        splitter.split_new_files()
+
+    See Also:
+        pkrsplitter.splitters.local.LocalFileSplitter
+        pkrsplitter.splitters.s3.S3FileSplitter
+    """
+
+    data_dir: str
+    raw_dir: str
+    correction_raw_keys_file_key: str
+    correction_split_keys_file_key: str
+    quarantine_file_key: str
+    streaming: bool
+    chunk_size: int
+    executor_type: str
+    max_workers: int
+    max_parser_workers: int
+    parser_pool: Executor
+    stage_workers: dict
+    queue_size: int
+    split_keys_cache: SplitKeysCache
+    manifest: AbstractManifest
+    output_format: str
+    encoding: str = "utf-8"
+    raw_prefix: str
+    raw_key_filter: Callable[[str], bool]
+    partition_filter: PartitionFilter
+    deduplicate_raw: bool
+    deduplicate_hands: bool
+    room: str
+    metrics: SplitMetrics
+    checkpoint: AbstractCheckpoint
+
+    def __init__(self, streaming: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE, executor_type: str = "thread",
+                 max_workers: int = None, max_parser_workers: int = None, output_format: str = "files"):
+        """
+        Initializes the settings shared by the splitters, each optional feature being off until set
+        Args:
+            streaming: Whether raw histories are read in chunks instead of all at once
+            chunk_size: The size of the chunks read at once in streaming mode
+            executor_type: The executor backend running the splitting tasks: "thread", "process" or "hybrid"
+            max_workers: The maximum number of workers running the splitting tasks
+            max_parser_workers: The maximum number of parsing processes in hybrid mode
+            output_format: The format of the split files: "files", for a file per hand, or "packed"
+        """
+        self.streaming = streaming
+        self.chunk_size = chunk_size
+        self.set_executor(executor_type, max_workers, max_parser_workers)
+        self.set_output_format(output_format)
+        self.set_pipeline()
+        self.set_raw_filter()
+        self.set_room()
+        self.deduplicate_raw = False
+        self.deduplicate_hands = False
+        self.parser_pool = None
+        self.split_keys_cache = None
+        self.manifest = None
+        self.metrics = None
+        self.checkpoint = None
+
+    def set_executor(self, executor_type: str = "thread", max_workers: int = None, max_parser_workers: int = None):
+        """
+        Sets the executor backend used to run the splitting tasks
+        Args:
+            executor_type (str): One of "thread", "process" or "hybrid"
+            max_workers (int): The maximum number of workers running the tasks, defaults to the executor default
+            max_parser_workers (int): The maximum number of parsing processes in hybrid mode, defaults to the CPU count
+        """
+        if executor_type not in EXECUTOR_TYPES:
+            raise ValueError(f"Unknown executor type {executor_type}, expected one of {EXECUTOR_TYPES}")
+        self.executor_type = executor_type
+        self.max_workers = max_workers
+        self.max_parser_workers = max_parser_workers
+
+    def set_output_format(self, output_format: str = "files"):
+        """
+        Sets the format of the split files
+        Args:
+            output_format (str): One of "files", for a file per hand, or "packed", for a pack per raw file
+        """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format {output_format}, expected one of {OUTPUT_FORMATS}")
+        self.output_format = output_format
+
+    def set_room(self, room: str = None):
+        """
+        Sets the room of the raw history files, instead of sniffing the room of each file from its first bytes
+        Args:
+            room (str): The name of a registered room, e.g. "winamax", "pokerstars" or "ggpoker", or None to sniff it
+        """
+        if room is not None:
+            get_room(room)
+        self.room = room
+
+    def set_raw_filter(self, prefix: str = None, key_filter: Callable[[str], bool] = None, start_date: date = None,
+                       end_date: date = None, tour_ids: set = None):
+        """
+        Limits the raw history files listed by the split runs.
+        With a start date, only the raw/YYYY/MM/DD partitions of the date range are listed, in parallel, and only
+        those under the prefix with both.
+        Args:
+            prefix (str): The sub-directory of the raw directory to list, e.g. "2024/01"
+            key_filter (Callable): Called with each listed raw key, the file is split only if it returns True
+            start_date (date): The first date of the files to split
+            end_date (date): The last date of the files to split
+            tour_ids (set): The ids of the tournaments to split
+        """
+        self.raw_prefix = prefix
+        self.raw_key_filter = key_filter
+        self.partition_filter = None
+        if start_date is not None or end_date is not None or tour_ids:
+            self.partition_filter = PartitionFilter(start_date, end_date, tour_ids)
+
+    def get_raw_directory_keys(self) -> list:
+        """
+        Returns the directories listed by the split runs
+        Returns:
+            directory_keys (list): The partitions of the date range under the sub-directory of the raw directory if
+                any, or the raw directory or its sub-directory
+        """
+        prefixes = self.partition_filter.get_prefixes() if self.partition_filter is not None else None
+        if prefixes is None:
+            return [self.get_raw_directory_key()]
+        if self.raw_prefix:
+            prefixes = intersect_prefixes(self.raw_prefix, prefixes)
+            if not prefixes:
+                logger.warning("The raw directory %s is outside the selected date range", self.get_raw_directory_key())
+        return [f"{self.raw_dir}/{prefix}" for prefix in prefixes]
+
+    def iter_raw_histories_stats(self, directory_keys: list = None) -> Iterator[tuple]:
+        """
+        Yields the history files of directories with their size and version, as they are found.
+        The sub-directories are scanned in parallel by the listing workers, as many as the workers of the fetch stage.
+        Args:
+            directory_keys (list): The directories to list, defaults to the raw directory
+
+        Returns:
+            raw_stats (Iterator[tuple]): Tuples of (raw_key, size, version)
+        """
+        def scan(directory_key: str) -> tuple:
+            with time_stage(self.metrics, "list"):
+                return self.scan_raw_directory(directory_key)
+
+        if directory_keys is None:
+            directory_keys = [self.raw_dir]
+        return iter_parallel_walk(scan, directory_keys, self.get_stage_workers("fetch"))
+
+    def get_raw_directory_key(self) -> str:
+        """
+        Returns the directory listed by the split runs
+        Returns:
+            directory_key (str): The raw directory, or its sub-directory set by set_raw_filter
+        """
+        if not self.raw_prefix:
+            return self.raw_dir
+        return f"{self.raw_dir}/{self.raw_prefix.strip('/')}"
+
+    def set_pipeline(self, stage_workers: dict = None, queue_size: int = DEFAULT_QUEUE_SIZE):
+        """
+        Sets the concurrency of the splitting pipeline
+        Args:
+            stage_workers (dict): The number of workers of the "fetch", "split" and "write" stages
+            queue_size (int): The maximum number of raw files waiting for each stage
+        """
+        self.stage_workers = stage_workers or {}
+        self.queue_size = queue_size
+
+    def set_manifest(self, manifest: AbstractManifest = None):
+        """
+        Sets the manifest recording the split raw files, so that incremental runs skip the unchanged ones
+        Args:
+            manifest (AbstractManifest): The manifest to use, defaults to the manifest created by create_manifest
+        """
+        self.manifest = manifest or self.create_manifest()
+
+    def set_deduplication(self, raw: bool = True, hands: bool = True):
+        """
+        Sets the deduplication of the split runs.
+        Raw files are deduplicated by the content hash recorded in the manifest, which is set if needed: a raw file
+        with the same content as an already split one is not split again, whatever its key. The content is hashed
+        when the raw file is fetched whole, so raw files are not deduplicated in streaming mode nor when split
+        by a single task per file.
+        Hands are deduplicated by the fingerprint of the existing split files, listed with their keys: a hand whose
+        split file already has the same content is not written again.
+        Args:
+            raw (bool): Whether the raw files identical to an already split raw file are skipped
+            hands (bool): Whether the hands identical to their existing split file are not written again
+        """
+        self.deduplicate_raw = raw
+        self.deduplicate_hands = hands
+        if raw and self.manifest is None:
+            self.set_manifest()
+
+    def set_metrics(self, metrics: SplitMetrics = None):
+        """
+        Sets the metrics recording the time spent in the list, fetch, split, exists_check and write stages, and the
+        files, hands, bytes, skipped and retries counters of the split runs
+        Args:
+            metrics (SplitMetrics): The metrics to record to, defaults to new metrics
+        """
+        self.metrics = metrics or SplitMetrics()
+
+    def set_checkpoint(self, checkpoint: AbstractCheckpoint = None):
+        """
+        Sets the checkpoint recording the progress of the split runs.
+        With a checkpoint, a raw file whose splitting fails is quarantined instead of stopping the run, and a run
+        interrupted by a crash is resumed by the next run of the same kind, which skips the raw files already split
+        or quarantined without listing the raw files again. The quarantined raw files of a complete run are written
+        to the quarantine file, with their error, unless the run quarantined nothing.
+        Args:
+            checkpoint (AbstractCheckpoint): The checkpoint to use, defaults to the checkpoint created by
+                create_checkpoint
+        """
+        self.checkpoint = checkpoint or self.create_checkpoint()
+
+    def start_checkpoint(self, run_name: str):
+        """
+        Starts recording a run in the checkpoint, if the splitter has one, resuming the previous run of the same kind
+        and the same selection of raw files
+        Args:
+            run_name (str): The name of the run, e.g. "split_files"
+        """
+        if self.checkpoint is not None and self.checkpoint.start(run_name, get_run_filter(
+                self.raw_dir, self.raw_prefix, self.partition_filter, self.raw_key_filter)):
+            logger.info("Resuming %s: %d raw files already split, %d quarantined", run_name,
+                        len(self.checkpoint.done_keys), len(self.checkpoint.quarantined))
+
+    def complete_checkpoint(self):
+        """
+        Writes the quarantined raw files of a complete run to the quarantine file, and clears the checkpoint.
+        A run which quarantined nothing keeps the quarantine file of the previous runs.
+        """
+        if self.checkpoint is None:
+            return
+        quarantined = dict(self.checkpoint.quarantined)
+        if quarantined:
+            logger.warning("%d raw files failed and were quarantined in %s", len(quarantined),
+                           self.quarantine_file_key)
+            self.write_file(self.quarantine_file_key, json.dumps(quarantined, indent=2))
+        self.checkpoint.clear()
+
+    def get_stage_workers(self, stage_name: str) -> int:
+        """
+        Returns the number of workers of a pipeline stage
+        Args:
+            stage_name (str): The name of the stage: "fetch", "split" or "write"
+
+        Returns:
+            workers (int): The configured number of workers, or a default based on the CPU count
+        """
+        if stage_name in self.stage_workers:
+            return self.stage_workers[stage_name]
+        if stage_name == "split":
+            return self.max_parser_workers or os.cpu_count() or 1
+        return self.max_workers or min(32, (os.cpu_count() or 1) + 4)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state.pop("parser_pool", None)
+        state.pop("split_keys_cache", None)
+        state.pop("manifest", None)
+        state.pop("checkpoint", None)
+        # The metrics are recorded by the main process, from the results of the tasks
+        state.pop("metrics", None)
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.parser_pool = None
+        self.split_keys_cache = None
+        self.manifest = None
+        self.checkpoint = None
+        self.metrics = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Releases the worker pools kept by the splitter between runs. The splitter can still be used afterwards,
+        its pools being created again when needed.
+        """
+        pass
+
+    @abstractmethod
+    def list_raw_histories_keys(self, directory_key: str = None) -> list:
+        """
+         Lists all the history files in the raw directory and returns a list of their key
+        Returns:
+            list: A list of dictionaries containing the root and filename of the history files
+        """
+        pass
+
+    @staticmethod
+    def get_destination_dir(raw_key: str) -> str:
+        """
+        Returns the directory where the split files will be stored
+        Args:
+            raw_key (str): The full path of the history file
+
+        Returns:
+            destination_dir (str): The directory where the split files will be stored
+
+        """
+        destination_dir = raw_key.replace("raw", "split").replace(".txt", "")
+        return destination_dir
+
+    @abstractmethod
+    def scan_raw_directory(self, directory_key: str) -> tuple:
+        """
+        Lists a single level of a raw directory, with a single listing
+        Args:
+            directory_key (str): The directory to scan
+
+        Returns:
+            sub_directory_keys, raw_stats (tuple): The sub-directories, and the (raw_key, size, version) tuples of
+                the history files directly in the directory
+        """
+        pass
+
+    @abstractmethod
+    def create_manifest(self) -> AbstractManifest:
+        """
+        Creates the default manifest of the splitter
+        Returns:
+            manifest (AbstractManifest): The manifest stored next to the histories
+        """
+        pass
+
+    @abstractmethod
+    def create_checkpoint(self) -> AbstractCheckpoint:
+        """
+        Creates the default checkpoint of the splitter
+        Returns:
+            checkpoint (AbstractCheckpoint): The checkpoint stored next to the histories
+        """
+        pass
+
+    @abstractmethod
+    def check_split_file_exists(self, destination_key: str) -> bool:
+        """
+        Checks if a split file already exists
+        Args:
+            destination_key: The key of the split file
+
+        Returns:
+            split_file_exists (bool): True if the split file already exists, False otherwise
+        """
+        pass
+
+    @abstractmethod
+    def check_split_dir_exists(self, raw_key: str) -> bool:
+        """
+        Checks if the split directory for the history file already exists
+        Args:
+            raw_key: The full key of the history file
+
+        Returns:
+            split_dir_exists (bool): True if the split directory already exists, False otherwise
+        """
+        pass
+
+    def check_split_output_exists(self, raw_key: str) -> bool:
+        """
+        Checks if the history file was already split, in the output format of the splitter
+        Args:
+            raw_key: The full key of the history file
+
+        Returns:
+            split_output_exists (bool): True if the split directory, or the index of the pack, already exists
+        """
+        if self.output_format == "packed":
+            return self.check_split_file_exists(get_index_key(self.get_destination_dir(raw_key)))
+        return self.check_split_dir_exists(raw_key)
+
+    @abstractmethod
+    def list_split_keys(self, directory_key: str) -> list:
+        """
+        Lists all the split keys under a directory, with as few listing requests as possible
+        Args:
+            directory_key: The directory containing split directories, or a single split directory
+
+        Returns:
+            split_keys (list): The keys of the split files, in the f"{destination_dir}/{hand_id}.txt" format
+        """
+        pass
+
+    @abstractmethod
+    def list_split_fingerprints(self, directory_key: str) -> dict:
+        """
+        Lists all the split keys under a directory with a fingerprint of their content, from the listing itself
+        Args:
+            directory_key: The directory containing split directories, or a single split directory
+
+        Returns:
+            split_fingerprints (dict): The fingerprint of each split file, by key
+        """
+        pass
+
+    @abstractmethod
+    def matches_fingerprint(self, file_key: str, content: str, fingerprint) -> bool:
+        """
+        Checks if an existing split file has the given content
+        Args:
+            file_key: The key of the split file
+            content: The text of the hand to write to the split file
+            fingerprint: The fingerprint of the split file, as listed by list_split_fingerprints
+
+        Returns:
+            matches (bool): True if the split file already has the content, False otherwise
+        """
+        pass
+
+    def get_existing_split_keys(self, raw_key: str) -> dict:
+        """
+        Returns the split keys that already exist for a history file, with their fingerprint when hands are
+        deduplicated.
+        During a split run, the keys of many history files are listed in bulk by the split keys cache.
+        Args:
+            raw_key: The key of the history file
+
+        Returns:
+            existing_split_keys (dict): The keys of the split files already in the split directory of the history
+                file, mapped to their fingerprint, or to None
+        """
+        destination_dir = self.get_destination_dir(raw_key)
+        with time_stage(self.metrics, "exists_check"):
+            if self.split_keys_cache is not None:
+                return self.split_keys_cache.get_split_dir_keys(destination_dir)
+            if self.deduplicate_hands:
+                return self.list_split_fingerprints(destination_dir)
+            return dict.fromkeys(self.list_split_keys(destination_dir))
+
+    @abstractmethod
+    def get_file_content(self, file_key: str) -> str:
+        """
+        Returns the text of a file
+        Args:
+            file_key (str): The file key
+
+        Returns:
+            content (str): The content text
+
+        """
+        pass
+
+    @abstractmethod
+    def iter_file_chunks(self, file_key: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+        """
+        Yields the text of a file in chunks, without loading the whole file in memory
+        Args:
+            file_key (str): The file key
+            chunk_size (int): The size of each chunk read from the file
+
+        Returns:
+            chunks (Iterator[str]): The successive chunks of the content text
+        """
+        pass
+
+    @abstractmethod
+    def get_file_bytes(self, file_key: str, start: int = 0, end: int = None) -> bytes:
+        """
+        Returns the raw bytes of a file from a byte offset, reading only the requested range
+        Args:
+            file_key (str): The file key
+            start (int): The byte offset to read from
+            end (int): The byte offset to read to, excluded, or None to read to the end of the file
+
+        Returns:
+            content (bytes): The bytes of the range, empty if the offset is at or after the end of the file
+        """
+        pass
+
+    @abstractmethod
+    def decode_raw_bytes(self, raw_bytes: bytes) -> str:
+        """
+        Decodes raw bytes read from a history file, the same way get_file_content decodes the file
+        Args:
+            raw_bytes (bytes): The raw bytes
+
+        Returns:
+            raw_text (str): The decoded text
+        """
+        pass
+
+    @abstractmethod
+    def write_file(self, file_key: str, content: str) -> None:
+        """
+        """
+        pass
+
+    @abstractmethod
+    def write_file_from_list(self, file_key: str, content: Iterable[str]) -> None:
+        """
+        """
+        pass
+
+    @abstractmethod
+    def write_file_bytes(self, file_key: str, content: bytes) -> None:
+        """
+        Writes bytes to a file
+        Args:
+            file_key (str): The file key
+            content (bytes): The bytes to write
+        """
+        pass
+
+    @staticmethod
+    def split_raw_text(raw_text: str) -> list:
+        """
+        Splits a history file into separate hands
+        Args:
+            raw_text (str): The raw text of the history file
+
+        Returns:
+            raw_hands (list): A list of the separate hands in the history file
+        """
+        room = sniff_room(raw_text[:SNIFF_SIZE])
+        raw_hands = list(iter_hand_texts(raw_text, room.new_hand_regex))
+        return raw_hands
+
+    def get_split_texts(self, raw_key: str) -> list:
+        """
+        Returns a list of the separate hand texts in a history file
+        Args:
+            raw_key (str): The raw_key of the history file
+
+        Returns:
+            split_texts (list): A list of the separate hand texts in the history file
+        """
+
+        raw_text = self.get_file_content(raw_key)
+        split_texts = self.split_raw_text(raw_text)
+        return split_texts
+
+    @staticmethod
+    def get_hand_id(hand_text: str, room: str = DEFAULT_ROOM) -> str:
+        """
+        Extracts the hand id from a hand text
+        Args:
+            hand_text (str): The text of a hand
+            room (str): The name of the room of the hand
+
+        Returns:
+            hand_id (str): The id of the hand
+        """
+        hand_id = extract_hand_id(hand_text, get_room(room).hand_id_regex)
+        return hand_id
+
+    def get_id_list(self, raw_key: str) -> list:
+        """
+        Returns a list of the hand ids in a history file
+        Args:
+            raw_key (str): The key of the raw history file
+
+        Returns:
+            id_list (list): A list of the hand ids in the history file
+        """
+        raw_text = self.get_file_content(raw_key)
+        room = self.get_raw_room(raw_key, raw_text[:SNIFF_SIZE])
+        _, _, id_list = find_hands(raw_text, room.new_hand_regex, room.hand_id_regex)
+        return id_list
+
+    def read_raw_history(self, raw_key: str):
+        """
+        Returns the raw text of a history file, or a lazy iterator over its chunks in streaming mode
+        Args:
+            raw_key (str): The key of the history file
+
+        Returns:
+            raw_history (str | Iterator[str]): The raw text, or its chunks in streaming mode
+        """
+        if self.streaming:
+            return self.iter_file_chunks(raw_key, self.chunk_size)
+        return self.get_file_content(raw_key)
+
+    def get_raw_room(self, raw_key: str, head=None) -> Room:
+        """
+        Returns the room of a history file, set by set_room or sniffed from the first bytes of the file
+        Args:
+            raw_key (str): The key of the history file
+            head (str | bytes-like): The beginning of the file if already read, otherwise SNIFF_SIZE bytes are read
+
+        Returns:
+            room (Room): The room, with its compiled patterns
+        """
+        if self.room is not None:
+            return get_room(self.room)
+        if head is None:
+            head = self.get_file_bytes(raw_key, 0, SNIFF_SIZE)
+        return sniff_room(head)
+
+    def peek_raw_history_room(self, raw_key: str, raw_history) -> tuple:
+        """
+        Returns the room of a raw history already read, sniffed from its beginning without any other read
+        Args:
+            raw_key (str): The key of the history file
+            raw_history (str | Iterator[str]): The raw text, or its chunks in streaming mode, from read_raw_history
+
+        Returns:
+            room_history (tuple): The room, and the raw history, whose first chunk is put back in streaming mode
+        """
+        if not self.streaming:
+            return self.get_raw_room(raw_key, raw_history[:SNIFF_SIZE]), raw_history
+        chunks = iter(raw_history)
+        first_chunk = next(chunks, "")
+        return self.get_raw_room(raw_key, first_chunk[:SNIFF_SIZE]), itertools.chain((first_chunk,), chunks)
+
+    def iter_raw_history_hands(self, raw_key: str, raw_history) -> Iterator[tuple]:
+        """
+        Yields the destination key and the text of each hand of a raw history already read
+        Args:
+            raw_key (str): The key of the history file
+            raw_history (str | Iterator[str]): The raw text, or its chunks in streaming mode, from read_raw_history
+
+        Returns:
+            separated_hands_info (Iterator[tuple]): Tuples containing the destination key and the text of each hand
+        """
+        if not self.streaming:
+            return iter(self.get_hand_index(raw_key, raw_history))
+        room, raw_history = self.peek_raw_history_room(raw_key, raw_history)
+        hands = iter_identified_hands(iter_streamed_hand_texts(raw_history, room.new_hand_regex), room.hand_id_regex)
+        destination_dir = self.get_destination_dir(raw_key)
+        return ((f"{destination_dir}/{hand_id}.txt", hand_text) for hand_id, hand_text in hands)
+
+    def get_hand_index(self, raw_key: str, raw_text: str) -> HandIndex:
+        """
+        Returns the index of the hands of a raw text, whose destination keys and texts are built when iterated
+        Args:
+            raw_key (str): The key of the history file
+            raw_text (str): The raw text of the history file
+
+        Returns:
+            hand_index (HandIndex): The offsets and ids of the hands in the raw text
+        """
+        room = self.get_raw_room(raw_key, raw_text[:SNIFF_SIZE])
+        if self.parser_pool is not None:
+            # Only the offsets and ids are sent back by the parsing process, the hands are sliced when written
+            hands_offsets = self.parser_pool.submit(find_hands, raw_text, room.new_hand_regex,
+                                                    room.hand_id_regex).result()
+        else:
+            hands_offsets = find_hands(raw_text, room.new_hand_regex, room.hand_id_regex)
+        return HandIndex(self.get_destination_dir(raw_key), raw_text, *hands_offsets)
+
+    def iter_separated_hands_info(self, raw_key: str) -> Iterator[tuple]:
+        """
+        Yields the destination key and the text of each hand, reading the raw file only once.
+        In streaming mode, the file is read in chunks and only the current hand is kept in memory.
+        Args:
+            raw_key (str): The path of the history file
+
+        Returns:
+            separated_hands_info (Iterator[tuple]): Tuples containing the destination key and the text of each hand
+        """
+        return self.iter_raw_history_hands(raw_key, self.read_raw_history(raw_key))
+
+    def get_separated_hands_info(self, raw_key: str):
+        """
+        Returns a sequence of tuples containing the destination key and the text of each hand
+        Args:
+            raw_key (str): The path of the history file
+
+        Returns:
+            separated_hands_info (HandIndex | list): The index of the hands, whose tuples are built when read,
+                or a list of the tuples in streaming mode
+        """
+        if not self.streaming:
+            return self.get_hand_index(raw_key, self.read_raw_history(raw_key))
+        separated_hands_info = list(self.iter_separated_hands_info(raw_key))
+        return separated_hands_info
+
+    def write_files(self, files: Iterable[tuple]) -> None:
+        """
+        Writes many files, one after the other
+        Args:
+            files (Iterable[tuple]): Tuples of the key and the content text of each file, consumed lazily
+        """
+        for file_key, content in files:
+            self.write_file(file_key=file_key, content=content)
+
+    def write_separated_hands(self, raw_key: str, separated_hands_info: Iterable[tuple], only_new: bool = False) -> list:
+        """
+        Writes the given hands to their destination keys
+        Args:
+            raw_key (str): The key of the raw history file the hands come from
+            separated_hands_info (Iterable[tuple]): Tuples containing the destination key and the text of each hand
+            only_new (bool): Whether the split files that already exist are skipped
+
+        Returns:
+            destination_keys (list | SplitKeys): The destination keys of the given hands, as compact SplitKeys
+                for a HandIndex
+        """
+        if self.output_format == "packed":
+            return write_packed_hands(self, raw_key, separated_hands_info, only_new)
+        check_existing = only_new or self.deduplicate_hands
+        existing_split_keys = self.get_existing_split_keys(raw_key) if check_existing else {}
+        is_indexed = isinstance(separated_hands_info, HandIndex)
+        destination_keys = []
+        # The new split keys are added to the split keys cache, to be seen by the later checks of the run
+        new_keys = [] if self.split_keys_cache is not None else None
+
+        def iter_hand_files():
+            for destination_key, hand_text in separated_hands_info:
+                if not is_indexed:
+                    destination_keys.append(destination_key)
+                if not hand_text:
+                    continue
+                if new_keys is not None and destination_key not in existing_split_keys:
+                    new_keys.append(destination_key)
+                if not check_existing:
+                    yield destination_key, hand_text
+                elif destination_key not in existing_split_keys:
+                    yield destination_key, hand_text
+                    if only_new:
+                        logger.debug("Created %s from %s", destination_key, raw_key)
+                elif not only_new and not self.matches_fingerprint(destination_key, hand_text,
+                                                                   existing_split_keys[destination_key]):
+                    yield destination_key, hand_text
+
+        self.write_files(iter_hand_files())
+        if new_keys:
+            self.split_keys_cache.add_split_keys(new_keys)
+        if is_indexed:
+            return separated_hands_info.get_split_keys()
+        return destination_keys
+
+    def read_split_hand(self, destination_key: str) -> str:
+        """
+        Returns the text of a split hand, from its own file or from its pack depending on the output format
+        Args:
+            destination_key (str): The destination key of the hand
+
+        Returns:
+            hand_text (str): The text of the hand
+        """
+        if self.output_format == "packed":
+            return read_packed_hand(self, destination_key)
+        return self.get_file_content(destination_key)
+
+    def write_split_files(self, raw_key: str) -> list:
+        """
+        Writes the split files to the split directory
+        Args:
+            raw_key (str): The path of the history file
+
+        Returns:
+            destination_keys (list): The destination keys of the hands found in the history file
+        """
+        logger.info("Splitting %s to %s", raw_key, self.get_destination_dir(raw_key))
+        return self.write_separated_hands(raw_key, self.iter_separated_hands_info(raw_key))
+
+    def write_new_split_files(self, raw_key: str) -> list:
+        """
+        Writes the split files that do not already exist
+        Args:
+            raw_key (str): The key of the raw history file
+
+        Returns:
+            destination_keys (list): The destination keys of the hands found in the history file
+        """
+        return self.write_separated_hands(raw_key, self.iter_separated_hands_info(raw_key), only_new=True)
+
+    def write_new_split_histories(self, raw_key: str):
+        """
+        Writes the split files for raw files that have never been split
+        Args:
+            raw_key: The key of the raw history file
+
+        Returns:
+            destination_keys (list | None): The destination keys of the hands, or None if the file was already split
+        """
+        if not self.check_split_output_exists(raw_key):
+            return self.write_split_files(raw_key)
+
+    def write_appended_split_files(self, raw_key: str, size: int = None, version: str = None) -> list:
+        """
+        Writes the split files of the hands appended to a raw history file since the last incremental run.
+        Only the bytes after the offset recorded in the manifest are read, and a partial trailing hand is left
+        for the next run, so that a history file still being written can be split every minute.
+        Args:
+            raw_key (str): The key of the raw history file
+            size (int): The size of the raw history file from the listing, if known
+            version (str): The modification time or ETag of the raw history file from the listing, if known
+
+        Returns:
+            destination_keys (list): The destination keys of the new complete hands
+        """
+        offset = self.manifest.get_offset(raw_key)
+        raw_bytes = self.get_file_bytes(raw_key, start=offset)
+        # Past the first run, the beginning of the file is read again to sniff its room
+        room = self.get_raw_room(raw_key, raw_bytes[:SNIFF_SIZE] if not offset else None)
+        complete_end = get_complete_hands_end(raw_bytes, room.new_hand_bytes_regex)
+        raw_text = self.decode_raw_bytes(raw_bytes[:complete_end])
+        destination_dir = self.get_destination_dir(raw_key)
+        hands = get_hands(raw_text, room.new_hand_regex, room.hand_id_regex)
+        # A pack is rewritten as a whole, so the appended hands are merged into the existing one
+        destination_keys = self.write_separated_hands(
+            raw_key, [(f"{destination_dir}/{hand_id}.txt", hand_text) for hand_id, hand_text in hands],
+            only_new=self.output_format == "packed")
+        self.manifest.record_appended(raw_key, size if size is not None else offset + len(raw_bytes), version,
+                                      [hand_id for hand_id, _ in hands], offset + complete_end)
+        return destination_keys
+
+    def uses_staged_pipeline(self) -> bool:
+        """
+        Checks if raw files are split through separate fetch, split and write stages, or by a single task per file
+        Returns:
+            staged (bool): True if the fetch, split and write stages are separate
+        """
+        return self.executor_type != "process"
+
+    def get_split_task(self, only_new: bool = False, only_new_histories: bool = False) -> Callable:
+        """
+        Returns the method splitting a whole raw file in a single task
+        Args:
+            only_new (bool): Whether the split files that already exist are skipped
+            only_new_histories (bool): Whether the raw files that have already been split are skipped
+
+        Returns:
+            task (Callable): The method taking a raw key and returning its destination keys
+        """
+        if only_new_histories:
+            return self.write_new_split_histories
+        if only_new:
+            return self.write_new_split_files
+        return self.write_split_files
+
+    def get_pipeline_stages(self, only_new: bool = False, only_new_histories: bool = False,
+                            on_split: Callable = None) -> list:
+        """
+        Returns the fetch, split and write stages splitting raw files
+        Args:
+            only_new (bool): Whether the split files that already exist are skipped
+            only_new_histories (bool): Whether the raw files that have already been split are skipped
+            on_split (Callable): Called with the SplitJob of each raw file once it is written
+
+        Returns:
+            stages (list): The stages of the pipeline
+        """
+        run_content_keys = {}
+
+        def fetch(job: SplitJob):
+            if only_new_histories:
+                with time_stage(self.metrics, "exists_check"):
+                    split_output_exists = self.check_split_output_exists(job.raw_key)
+                if split_output_exists:
+                    increment(self.metrics, "skipped")
+                    return None
+            with time_stage(self.metrics, "fetch"):
+                job.raw_history = self.read_raw_history(job.raw_key)
+            if self.manifest is not None and job.size is not None:
+                if self.streaming:
+                    job.hasher = get_content_hasher()
+                    job.raw_history = iter_hashed_chunks(job.raw_history, job.hasher)
+                else:
+                    job.content_hash = hash_content(job.raw_history)
+                    if only_new and self.manifest.record_same_content(job.raw_key, job.size, job.version,
+                                                                      job.content_hash):
+                        increment(self.metrics, "skipped")
+                        return None
+                    duplicate_key = None
+                    if self.deduplicate_raw:
+                        duplicate_key = self.manifest.record_duplicate(job.raw_key, job.size, job.version,
+                                                                       job.content_hash, run_content_keys)
+                    if duplicate_key is not None:
+                        logger.info("Skipped %s, identical to %s", job.raw_key, duplicate_key)
+                        increment(self.metrics, "skipped")
+                        return None
+            return job
+
+        def split(job: SplitJob) -> SplitJob:
+            # In streaming mode, the hands are only read when written, to keep a single hand in memory,
+            # otherwise they are indexed in the raw text and sliced when written
+            with time_stage(self.metrics, "split"):
+                if self.streaming:
+                    job.separated_hands_info = self.iter_raw_history_hands(job.raw_key, job.raw_history)
+                else:
+                    job.separated_hands_info = self.get_hand_index(job.raw_key, job.raw_history)
+            job.raw_history = None
+            return job
+
+        def write(job: SplitJob):
+            if not only_new:
+                logger.info("Splitting %s to %s", job.raw_key, self.get_destination_dir(job.raw_key))
+            # In streaming mode, the write stage also reads and splits the hands of the raw file
+            with time_stage(self.metrics, "write"):
+                job.destination_keys = self.write_separated_hands(job.raw_key, job.separated_hands_info,
+                                                                  only_new=only_new)
+            job.separated_hands_info = None
+            if job.hasher is not None:
+                job.content_hash = job.hasher.hexdigest()
+            self.complete_job(job, on_split)
+
+        return [Stage(name, guard_task(self.checkpoint, func, self.metrics), self.get_stage_workers(name),
+                      self.queue_size)
+                for name, func in (("fetch", fetch), ("split", split), ("write", write))]
+
+    def complete_job(self, job: SplitJob, on_split: Callable = None):
+        """
+        Records a split raw file in the manifest and calls the on_split callback
+        Args:
+            job (SplitJob): The job of the split raw file
+            on_split (Callable): Called with the SplitJob of each raw file once it is written
+        """
+        keeps_hand_ids = self.checkpoint is not None and self.checkpoint.keeps_hand_ids
+        hand_ids = ()
+        if (self.manifest is not None and job.size is not None) or keeps_hand_ids:
+            hand_ids = get_hand_ids(job.destination_keys)
+        if self.manifest is not None and job.size is not None:
+            self.manifest.record(ManifestEntry(job.raw_key, job.size, job.version, job.content_hash, hand_ids))
+        if self.checkpoint is not None:
+            self.checkpoint.mark_done(job.raw_key, hand_ids)
+        increment(self.metrics, "files")
+        increment(self.metrics, "hands", len(job.destination_keys))
+        if job.size is not None:
+            increment(self.metrics, "bytes", job.size)
+        if on_split is not None:
+            on_split(job)
+
+    def split_raw_keys(self, raw_keys: Iterable, only_new: bool = False, only_new_histories: bool = False,
+                       on_split: Callable = None):
+        """
+        Splits raw history files through a pipeline of bounded queues, so that the number of files in flight
+        does not depend on the number of raw keys.
+        Args:
+            raw_keys (Iterable): The keys of the raw history files, or their SplitJobs, consumed lazily
+            only_new (bool): Whether the split files that already exist are skipped
+            only_new_histories (bool): Whether the raw files that have already been split are skipped
+            on_split (Callable): Called with the SplitJob of each raw file once it is written
+        """
+        jobs = (raw_key if isinstance(raw_key, SplitJob) else SplitJob(raw_key) for raw_key in raw_keys)
+        if self.checkpoint is not None:
+            jobs = (job for job in jobs if not self.checkpoint.is_settled(job.raw_key))
+        if self.deduplicate_hands:
+            self.split_keys_cache = SplitKeysCache(self.list_split_fingerprints)
+        elif only_new or only_new_histories:
+            self.split_keys_cache = SplitKeysCache(self.list_split_keys)
+        try:
+            self._split_jobs(jobs, only_new, only_new_histories, on_split)
+        finally:
+            self.split_keys_cache = None
+            if self.manifest is not None:
+                self.manifest.save()
+            if self.checkpoint is not None:
+                self.checkpoint.save()
+            self.close()
+
+    def _split_jobs(self, jobs: Iterable, only_new: bool, only_new_histories: bool, on_split: Callable):
+        if self.uses_staged_pipeline():
+            stages = self.get_pipeline_stages(only_new, only_new_histories, on_split)
+            if self.executor_type == "hybrid":
+                # Imported here, as multiprocessing is slow to import and only needed by the process pools
+                from concurrent.futures import ProcessPoolExecutor
+                self.parser_pool = ProcessPoolExecutor(max_workers=self.max_parser_workers)
+            try:
+                Pipeline(stages).run(jobs)
+            finally:
+                if self.parser_pool is not None:
+                    self.parser_pool.shutdown()
+                    self.parser_pool = None
+            return
+        task = self.get_split_task(only_new, only_new_histories)
+        process_pool = None
+        if self.executor_type == "process":
+            from concurrent.futures import ProcessPoolExecutor
+            process_pool = ProcessPoolExecutor(max_workers=self.max_workers)
+
+        def run_task(job: SplitJob):
+            # A single task fetches, splits and writes the raw file, so its whole time is the split stage time
+            with time_stage(self.metrics, "split"):
+                if process_pool is not None:
+                    job.destination_keys = process_pool.submit(task, job.raw_key).result()
+                else:
+                    job.destination_keys = task(job.raw_key)
+            if job.destination_keys is not None:
+                self.complete_job(job, on_split)
+            else:
+                increment(self.metrics, "skipped")
+
+        try:
+            workers = self.max_workers or os.cpu_count() or 1
+            guarded_task = guard_task(self.checkpoint, run_task, self.metrics)
+            Pipeline([Stage("split", guarded_task, workers, self.queue_size)]).run(jobs)
+        finally:
+            if process_pool is not None:
+                process_pool.shutdown()
+
+    def iter_raw_histories_jobs(self, only_changed: bool = False) -> Iterator[SplitJob]:
+        """
+        Yields the history files selected by set_raw_filter as SplitJobs with their size and version, while the raw
+        directories are listed in parallel, so that splitting starts with the first listed files.
+        With a checkpoint, the listed files are recorded, and a resumed run yields the recorded files instead of
+        listing them again.
+        Args:
+            only_changed (bool): Whether the files that are unchanged since they were recorded in the manifest are skipped
+
+        Returns:
+            jobs (Iterator[SplitJob]): The SplitJobs of the history files
+        """
+        def list_raw_stats() -> Iterator[tuple]:
+            raw_stats = self.iter_raw_histories_stats(self.get_raw_directory_keys())
+            if self.partition_filter is not None:
+                raw_stats = (raw_stat for raw_stat in raw_stats if self.partition_filter.matches(raw_stat[0]))
+            if self.raw_key_filter is not None:
+                raw_stats = (raw_stat for raw_stat in raw_stats if self.raw_key_filter(raw_stat[0]))
+            if only_changed and self.manifest is not None:
+                raw_stats = self.manifest.iter_changed(raw_stats)
+            return raw_stats
+
+        raw_stats = self.checkpoint.iter_listing(list_raw_stats) if self.checkpoint is not None else list_raw_stats()
+        for raw_key, size, version in raw_stats:
+            yield SplitJob(raw_key, size, version)
+
+    def list_raw_histories_jobs(self, only_changed: bool = False) -> list:
+        """
+        Lists the history files selected by set_raw_filter as SplitJobs with their size and version,
+        most recent keys first
+        Args:
+            only_changed (bool): Whether the files that are unchanged since they were recorded in the manifest are skipped
+
+        Returns:
+            jobs (list): The SplitJobs of the history files
+        """
+        return sorted(self.iter_raw_histories_jobs(only_changed), key=lambda job: job.raw_key, reverse=True)
+
+    def split_files(self, on_split: Callable = None):
+        """
+        Splits all the history files in the raw directory
+        Args:
+            on_split (Callable): Called with the SplitJob of each raw file once it is written
+        """
+        logger.info("Splitting history files from %s...", self.get_raw_directory_key())
+        self.start_checkpoint("split_files")
+        self.split_raw_keys(self.iter_raw_histories_jobs(), on_split=on_split)
+        self.complete_checkpoint()
+
+    def split_new_files(self, on_split: Callable = None):
+        """
+        Splits all the history files that have not already been split.
+        With a manifest, only the files that are new or changed since they were recorded are read.
+        Args:
+            on_split (Callable): Called with the SplitJob of each raw file once it is written
+        """
+        self.start_checkpoint("split_new_files")
+        self.split_raw_keys(self.iter_raw_histories_jobs(only_changed=True), only_new=True, on_split=on_split)
+        self.complete_checkpoint()
+
+    def split_new_histories(self, on_split: Callable = None):
+        """
+        Splits the raw history files for raw files that have never been split.
+        With a manifest, only the files that are new or changed since they were recorded are checked.
+        Args:
+            on_split (Callable): Called with the SplitJob of each raw file once it is written
+        """
+        self.start_checkpoint("split_new_histories")
+        self.split_raw_keys(self.iter_raw_histories_jobs(only_changed=True), only_new_histories=True,
+                            on_split=on_split)
+        self.complete_checkpoint()
+
+    def split_appended_files(self, on_split: Callable = None):
+        """
+        Splits the hands appended to the raw history files since the last incremental run.
+        The manifest records the offset reached in each file, and is created if the splitter does not have one.
+        Args:
+            on_split (Callable): Called with the SplitJob of each raw file once its new hands are written
+        """
+        if self.manifest is None:
+            self.set_manifest()
+        self.start_checkpoint("split_appended_files")
+
+        def split_appended(job: SplitJob):
+            with time_stage(self.metrics, "split"):
+                job.destination_keys = self.write_appended_split_files(job.raw_key, job.size, job.version)
+            if job.destination_keys:
+                logger.info("Split %d new hands from %s", len(job.destination_keys), job.raw_key)
+            if self.checkpoint is not None:
+                self.checkpoint.mark_done(job.raw_key)
+            increment(self.metrics, "files")
+            increment(self.metrics, "hands", len(job.destination_keys))
+            if on_split is not None:
+                on_split(job)
+
+        try:
+            jobs = self.iter_raw_histories_jobs(only_changed=True)
+            if self.checkpoint is not None:
+                jobs = (job for job in jobs if not self.checkpoint.is_settled(job.raw_key))
+            guarded_task = guard_task(self.checkpoint, split_appended, self.metrics)
+            Pipeline([Stage("split", guarded_task, self.get_stage_workers("fetch"), self.queue_size)]).run(jobs)
+        finally:
+            self.manifest.save()
+            if self.checkpoint is not None:
+                self.checkpoint.save()
+            self.close()
+        self.complete_checkpoint()
+
+    def split_correction_files(self, on_split: Callable = None):
+        """
+        Split the history files to correct.
+        Args:
+            on_split (Callable): Called with the SplitJob of each raw file once it is written
+        """
+        logger.info("Splitting correction files...")
+        self.start_checkpoint("split_correction_files")
+        raw_keys_content = self.get_file_content(self.correction_raw_keys_file_key)
+        raw_keys = raw_keys_content.split()
+        logger.info("There are %d raw files to split.", len(raw_keys))
+        # The destination keys of each file are kept as compact SplitKeys, and only built when written
+        split_keys = []
+        if self.checkpoint is not None:
+            # The hand ids of the split files are recorded, to write the split keys of the files split before a resume
+            self.checkpoint.keeps_hand_ids = True
+            split_keys.extend(SplitKeys(self.get_destination_dir(raw_key), hand_ids.split())
+                              for raw_key, hand_ids in self.checkpoint.done_keys.items() if hand_ids is not None)
+
+        def on_correction_split(job: SplitJob):
+            split_keys.append(job.destination_keys)
+            if on_split is not None:
+                on_split(job)
+
+        self.split_raw_keys(raw_keys, only_new=True, on_split=on_correction_split)
+        self.write_file_from_list(self.correction_split_keys_file_key, itertools.chain.from_iterable(split_keys))
+        # The quarantined raw files are kept in the correction file, to be split again by the next correction run
+        quarantined_keys = list(self.checkpoint.quarantined) if self.checkpoint is not None else []
+        self.write_file(self.correction_raw_keys_file_key, "\n".join(quarantined_keys))
+        self.complete_checkpoint()
+        logger.info("Raw history files to correct have been split.")
@@ -0,0 +1,285 @@
+"""This module defines the AsyncAbstractFileSplitter class, the asyncio version of the AbstractFileSplitter contract."""
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Iterable
+from pkrsplitter.splitters.abstract import AbstractFileSplitter
+from pkrsplitter.splitters.engine import get_hands
+from pkrsplitter.splitters.metrics import SplitMetrics, increment, time_stage
+from pkrsplitter.splitters.pipeline import DEFAULT_QUEUE_SIZE
+from pkrsplitter.splitters.rooms import sniff_room, SNIFF_SIZE
+
+DEFAULT_CONCURRENCY = 64
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncAbstractFileSplitter(ABC):
+    """
+    A class to split poker history files with asyncio, keeping many requests in flight from a single thread
+
+    Methods:
+        list_raw_histories_keys: Lists all the history files in the raw directory and returns a list of their key
+        get_destination_dir: Returns the directory where the split files will be stored
+        check_split_file_exists: Checks if a split file already exists
+        check_split_dir_exists: Checks if the split directory for the history file already exists
+        list_split_keys: Lists all the split keys under a directory
+        get_file_content: Returns the text of a file
+        write_file: Writes the content to a file
+        write_file_from_list: Writes the lines of a list to a file
+        get_separated_hands_info: Returns a list of tuples containing the destination key and the text of each hand
+        write_split_files: Writes the split files to the split directory
+        write_new_split_files: Writes the split files that do not already exist
+        write_new_split_histories: Writes the split files for raw files that have never been split
+        split_raw_keys: Splits raw history files with a bounded number of concurrent files
+        split_files: Splits all the history files in the raw directory
+        split_new_files: Splits all the history files that have not already been split
+        split_new_histories: Splits the raw history files for raw files that have never been split
+        split_correction_files: Splits the history files listed in the correction file
+        set_metrics: Sets the metrics recording the split stage timings and the counters of the split runs
+
+    Examples:
+        async with AsyncCloudFileSplitter(BUCKET_NAME) as splitter:
+            await splitter.split_new_files()
+
+    See Also:
+        pkrsplitter.splitters.abstract.AbstractFileSplitter
+        pkrsplitter.splitters.async_cloud.AsyncCloudFileSplitter
+    """
+
+    data_dir: str
+    raw_dir: str
+    correction_raw_keys_file_key: str
+    correction_split_keys_file_key: str
+    file_concurrency: int = DEFAULT_CONCURRENCY
+    queue_size: int = DEFAULT_QUEUE_SIZE
+    metrics: SplitMetrics = None
+
+    get_destination_dir = staticmethod(AbstractFileSplitter.get_destination_dir)
+    set_metrics = AbstractFileSplitter.set_metrics
+
+    @abstractmethod
+    async def list_raw_histories_keys(self, directory_key: str = None) -> list:
+        """
+        Lists all the history files in the raw directory and returns a list of their key
+        Returns:
+            list: A list of the keys of the history files
+        """
+        pass
+
+    @abstractmethod
+    async def check_split_file_exists(self, destination_key: str) -> bool:
+        """
+        Checks if a split file already exists
+        Args:
+            destination_key: The key of the split file
+
+        Returns:
+            split_file_exists (bool): True if the split file already exists, False otherwise
+        """
+        pass
+
+    @abstractmethod
+    async def check_split_dir_exists(self, raw_key: str) -> bool:
+        """
+        Checks if the split directory for the history file already exists
+        Args:
+            raw_key: The full key of the history file
+
+        Returns:
+            split_dir_exists (bool): True if the split directory already exists, False otherwise
+        """
+        pass
+
+    @abstractmethod
+    async def list_split_keys(self, directory_key: str) -> list:
+        """
+        Lists all the split keys under a directory, with as few listing requests as possible
+        Args:
+            directory_key: The directory containing split directories, or a single split directory
+
+        Returns:
+            split_keys (list): The keys of the split files
+        """
+        pass
+
+    @abstractmethod
+    async def get_file_content(self, file_key: str) -> str:
+        """
+        Returns the text of a file
+        Args:
+            file_key (str): The file key
+
+        Returns:
+            content (str): The content text
+        """
+        pass
+
+    @abstractmethod
+    async def write_file(self, file_key: str, content: str) -> None:
+        """
+        Writes the content to a file
+        Args:
+            file_key (str): The file key
+            content (str): The content to write
+        """
+        pass
+
+    @abstractmethod
+    async def write_file_from_list(self, file_key: str, content: list) -> None:
+        """
+        Writes the lines of a list to a file
+        Args:
+            file_key (str): The file key
+            content (list): The lines to write
+        """
+        pass
+
+    async def get_separated_hands_info(self, raw_key: str) -> list:
+        """
+        Returns a list of tuples containing the destination key and the text of each hand.
+        The parsing runs in a worker thread so that it does not block the requests in flight.
+        Args:
+            raw_key (str): The key of the history file
+
+        Returns:
+            separated_hands_info (list): A list of tuples containing the destination key and the text of each hand
+        """
+        raw_text = await self.get_file_content(raw_key)
+        room = sniff_room(raw_text[:SNIFF_SIZE])
+        hands = await asyncio.to_thread(get_hands, raw_text, room.new_hand_regex, room.hand_id_regex)
+        destination_dir = self.get_destination_dir(raw_key)
+        return [(f"{destination_dir}/{hand_id}.txt", hand_text) for hand_id, hand_text in hands]
+
+    async def write_separated_hands(self, raw_key: str, separated_hands_info: list, only_new: bool = False) -> list:
+        """
+        Writes the given hands to their destination keys concurrently
+        Args:
+            raw_key (str): The key of the raw history file the hands come from
+            separated_hands_info (list): Tuples containing the destination key and the text of each hand
+            only_new (bool): Whether the split files that already exist are skipped
+
+        Returns:
+            destination_keys (list): The destination keys of the given hands
+        """
+        existing_split_keys = set(await self.list_split_keys(self.get_destination_dir(raw_key))) if only_new else set()
+
+        async def write_hand(destination_key: str, hand_text: str):
+            if destination_key in existing_split_keys:
+                return
+            await self.write_file(file_key=destination_key, content=hand_text)
+            if only_new:
+                logger.debug("Created %s from %s", destination_key, raw_key)
+
+        await asyncio.gather(*(write_hand(destination_key, hand_text)
+                               for destination_key, hand_text in separated_hands_info if hand_text))
+        return [destination_key for destination_key, _ in separated_hands_info]
+
+    async def write_split_files(self, raw_key: str) -> list:
+        """
+        Writes the split files to the split directory
+        Args:
+            raw_key (str): The key of the history file
+
+        Returns:
+            destination_keys (list): The destination keys of the hands found in the history file
+        """
+        logger.info("Splitting %s to %s", raw_key, self.get_destination_dir(raw_key))
+        return await self.write_separated_hands(raw_key, await self.get_separated_hands_info(raw_key))
+
+    async def write_new_split_files(self, raw_key: str) -> list:
+        """
+        Writes the split files that do not already exist
+        Args:
+            raw_key (str): The key of the history file
+
+        Returns:
+            destination_keys (list): The destination keys of the hands found in the history file
+        """
+        return await self.write_separated_hands(raw_key, await self.get_separated_hands_info(raw_key), only_new=True)
+
+    async def write_new_split_histories(self, raw_key: str):
+        """
+        Writes the split files for raw files that have never been split
+        Args:
+            raw_key (str): The key of the history file
+
+        Returns:
+            destination_keys (list | None): The destination keys of the hands, or None if the file was already split
+        """
+        if not await self.check_split_dir_exists(raw_key):
+            return await self.write_split_files(raw_key)
+
+    async def split_raw_keys(self, raw_keys: Iterable, task: Callable[[str], Awaitable],
+                             on_split: Callable = None):
+        """
+        Splits raw history files with a bounded number of files in flight, whatever the number of raw keys
+        Args:
+            raw_keys (Iterable): The keys of the raw history files
+            task (Callable): The coroutine function splitting a raw file
+            on_split (Callable): Called with each raw key and its destination keys once the file is written
+        """
+        raw_keys_queue = asyncio.Queue(maxsize=self.queue_size)
+
+        async def work():
+            while (raw_key := await raw_keys_queue.get()) is not None:
+                # The files in flight share the event loop, so the split stage time includes the waits on the others
+                with time_stage(self.metrics, "split"):
+                    destination_keys = await task(raw_key)
+                if destination_keys is None:
+                    increment(self.metrics, "skipped")
+                    continue
+                increment(self.metrics, "files")
+                increment(self.metrics, "hands", len(destination_keys))
+                if on_split is not None:
+                    on_split(raw_key, destination_keys)
+
+        async def feed():
+            for raw_key in raw_keys:
+                await raw_keys_queue.put(raw_key)
+            for _ in range(self.file_concurrency):
+                await raw_keys_queue.put(None)
+
+        tasks = [asyncio.create_task(feed())] + [asyncio.create_task(work()) for _ in range(self.file_concurrency)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for pending_task in tasks:
+                pending_task.cancel()
+
+    async def split_files(self):
+        """
+        Splits all the history files in the raw directory
+        """
+        logger.info("Splitting history files from %s...", self.raw_dir)
+        history_keys = (await self.list_raw_histories_keys())[::-1]
+        await self.split_raw_keys(history_keys, self.write_split_files)
+
+    async def split_new_files(self):
+        """
+        Splits all the history files that have not already been split
+        """
+        history_keys = (await self.list_raw_histories_keys())[::-1]
+        await self.split_raw_keys(history_keys, self.write_new_split_files)
+
+    async def split_new_histories(self):
+        """
+        Splits the raw history files for raw files that have never been split
+        """
+        history_keys = (await self.list_raw_histories_keys())[::-1]
+        await self.split_raw_keys(history_keys, self.write_new_split_histories)
+
+    async def split_correction_files(self):
+        """
+        Splits the history files listed in the correction file
+        """
+        logger.info("Splitting correction files...")
+        raw_keys = (await self.get_file_content(self.correction_raw_keys_file_key)).split()
+        logger.info("There are %d raw files to split.", len(raw_keys))
+        destination_keys = []
+        await self.split_raw_keys(raw_keys, self.write_new_split_files,
+                                  on_split=lambda raw_key, raw_destination_keys: destination_keys.extend(
+                                      raw_destination_keys))
+        await self.write_file_from_list(self.correction_split_keys_file_key, destination_keys)
+        await self.write_file(self.correction_raw_keys_file_key, "")
+        logger.info("Raw history files to correct have been split.")
@@ -0,0 +1,164 @@
+"""This module defines the AsyncCloudFileSplitter class, which splits poker history files of a S3 bucket with asyncio."""
+import asyncio
+from contextlib import AsyncExitStack
+from .async_abstract import AsyncAbstractFileSplitter, DEFAULT_CONCURRENCY
+
+
+class AsyncCloudFileSplitter(AsyncAbstractFileSplitter):
+    """
+    A class to split poker history files of a S3 bucket with asyncio.
+    It shares a single pooled aiobotocore client and limits the GET and PUT requests in flight with semaphores.
+    It requires the aiobotocore package (pip install pkrsplitter[async]).
+
+    Examples:
+        async with AsyncCloudFileSplitter(BUCKET_NAME) as splitter:
+            await splitter.split_files()
+
+        # Against a local S3 stand-in, e.g. `moto_server -p 5000`
+        async with AsyncCloudFileSplitter(BUCKET_NAME, endpoint_url="http://localhost:5000") as splitter:
+            await splitter.split_files()
+    """
+
+    def __init__(self, bucket_name: str, endpoint_url: str = None, max_pool_connections: int = DEFAULT_CONCURRENCY,
+                 get_concurrency: int = DEFAULT_CONCURRENCY, put_concurrency: int = DEFAULT_CONCURRENCY,
+                 file_concurrency: int = DEFAULT_CONCURRENCY):
+        """
+        Initializes the AsyncCloudFileSplitter class
+        Args:
+            bucket_name: The name of the S3 bucket
+            endpoint_url: The URL of the S3 endpoint, to use a local S3 stand-in such as a moto server
+            max_pool_connections: The size of the HTTP connection pool shared by all requests
+            get_concurrency: The maximum number of GET and LIST requests in flight
+            put_concurrency: The maximum number of PUT requests in flight
+            file_concurrency: The maximum number of raw files split at the same time
+        """
+        self.bucket_name = bucket_name
+        self.endpoint_url = endpoint_url
+        self.max_pool_connections = max_pool_connections
+        self.file_concurrency = file_concurrency
+        self.get_semaphore = asyncio.Semaphore(get_concurrency)
+        self.put_semaphore = asyncio.Semaphore(put_concurrency)
+        self.s3 = None
+        self._exit_stack = None
+        self.data_dir = "data"
+        self.raw_dir = "data/histories/raw"
+        self.correction_raw_keys_file_key = "data/correction_raw_keys.txt"
+        self.correction_split_keys_file_key = "data/correction_split_keys.txt"
+
+    async def __aenter__(self):
+        try:
+            from aiobotocore.config import AioConfig
+            from aiobotocore.session import get_session
+        except ImportError as error:
+            raise ImportError("AsyncCloudFileSplitter requires aiobotocore: pip install pkrsplitter[async]") from error
+        self._exit_stack = AsyncExitStack()
+        config = AioConfig(max_pool_connections=self.max_pool_connections)
+        self.s3 = await self._exit_stack.enter_async_context(
+            get_session().create_client("s3", endpoint_url=self.endpoint_url, config=config))
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self._exit_stack.aclose()
+        self.s3 = None
+        self._exit_stack = None
+
+    async def list_keys(self, prefix: str) -> list:
+        """
+        Lists all the keys under a prefix, page by page. The GET semaphore is held for each page request only,
+        so that the other GET requests are not held up for the whole listing.
+        Args:
+            prefix (str): The prefix of the keys
+
+        Returns:
+            keys (list): The keys under the prefix
+        """
+        keys = []
+        list_params = {"Bucket": self.bucket_name, "Prefix": prefix}
+        while True:
+            async with self.get_semaphore:
+                page = await self.s3.list_objects_v2(**list_params)
+            keys.extend(obj["Key"] for obj in page.get("Contents", []))
+            if not page.get("IsTruncated"):
+                return keys
+            list_params["ContinuationToken"] = page["NextContinuationToken"]
+
+    async def list_raw_histories_keys(self, directory_key: str = None) -> list:
+        """
+        Lists all the history files in the bucket and returns a list of their keys
+
+        Returns:
+            list: A list of the keys of the history files
+        """
+        return await self.list_keys(directory_key or self.raw_dir)
+
+    async def check_split_file_exists(self, destination_key: str) -> bool:
+        """
+        Checks if a split file already exists
+        Args:
+            destination_key: The key of the split file
+
+        Returns:
+            split_file_exists (bool): True if the split file already exists, False otherwise
+        """
+        async with self.get_semaphore:
+            response = await self.s3.list_objects_v2(Bucket=self.bucket_name, Prefix=destination_key, MaxKeys=1)
+        return bool(response.get("Contents"))
+
+    async def check_split_dir_exists(self, raw_key: str) -> bool:
+        """
+        Checks if the split directory for the history file already exists
+        Args:
+            raw_key: The full key of the history file
+
+        Returns:
+            split_dir_exists (bool): True if the split directory already exists, False otherwise
+        """
+        destination_dir = self.get_destination_dir(raw_key)
+        async with self.get_semaphore:
+            response = await self.s3.list_objects_v2(Bucket=self.bucket_name, Prefix=destination_dir, MaxKeys=1)
+        return bool(response.get("Contents"))
+
+    async def list_split_keys(self, directory_key: str) -> list:
+        """
+        Lists all the split keys under a directory with a single paginated listing
+        Args:
+            directory_key: The directory containing split directories, or a single split directory
+
+        Returns:
+            split_keys (list): The keys of the split files
+        """
+        return await self.list_keys(f"{directory_key.rstrip('/')}/")
+
+    async def get_file_content(self, file_key: str) -> str:
+        """
+        Returns the text of a file of the bucket
+        Args:
+            file_key (str): The key of the file
+
+        Returns:
+            content (str): The content text
+        """
+        async with self.get_semaphore:
+            response = await self.s3.get_object(Bucket=self.bucket_name, Key=file_key)
+            async with response["Body"] as stream:
+                content = await stream.read()
+        return content.decode("utf-8")
+
+    async def write_file(self, file_key: str, content: str) -> None:
+        """
+        Writes a file to the S3 bucket
+        Args:
+            file_key (str): The key of the file to write
+            content (str): The content of the file
+        """
+        async with self.put_semaphore:
+            await self.s3.put_object(Bucket=self.bucket_name, Key=file_key, Body=content.encode("utf-8"))
+
+    async def write_file_from_list(self, file_key: str, content: list) -> None:
+        """
+        Writes a file to the S3 bucket
+        Args:
+            file_key (str): The key of the file to write
+            content (list): The lines of the file
+        """
+        await self.write_file(file_key, "\n".join(content))
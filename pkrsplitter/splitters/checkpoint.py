@@ -0,0 +1,399 @@
+"""This module defines the checkpoints of the split runs, which record their progress so that they can be resumed."""
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Iterable, Iterator
+from pkrsplitter.splitters.metrics import SplitMetrics, increment
+from pkrsplitter.splitters.partitions import PartitionFilter
+
+DEFAULT_SAVE_EVERY = 100
+DEFAULT_SAVE_INTERVAL = 5.0
+
+logger = logging.getLogger(__name__)
+
+
+class AbstractCheckpoint(ABC):
+    """
+    A durable journal of the progress of a split run: the raw files it listed, the ones it split, and the ones it
+    quarantined after an error, so that a restarted run skips the finished work without listing the raw files again.
+    The records are saved every few records or seconds, so that a crash loses at most the last ones, whose raw files
+    are split again. The listed raw files are only journaled, to be replayed by a resumed run: they are saved with the
+    other records without counting towards a save, and only the ones not settled yet are kept when replayed.
+
+    Attributes:
+        run_name (str): The name of the run recorded in the journal, or None for an empty journal
+        run_filter (dict): The selection of raw files of the recorded run, e.g. its prefix and date range
+        done_keys (dict): The split raw files, with their space-separated hand ids, or None if they were not kept
+        quarantined (dict): The error message of each quarantined raw file
+        listed_stats (dict): The (size, version) of each raw file listed by a previous run and not settled yet
+        listing_complete (bool): Whether a previous run listed all its raw files
+        keeps_hand_ids (bool): Whether the hand ids of the split raw files are recorded
+
+    Methods:
+        start: Starts recording a run, resuming the recorded run if it has the same name
+        is_settled: Checks if a raw file was split or quarantined by the run
+        iter_listed_stats: Yields the listed raw files that are not settled yet
+        iter_listing: Yields the raw files of the run as they are listed and recorded, or replays the recorded listing
+        record_listing_started: Records that the run starts listing its raw files
+        record_listed: Records a listed raw file
+        record_listing_complete: Records that all the raw files of the run were listed
+        mark_done: Records a split raw file
+        quarantine: Records a raw file whose splitting failed
+        save: Persists the pending records
+        clear: Deletes the journal, once the run is complete
+
+    Examples:
+        checkpoint = FileCheckpoint("data/split_checkpoint.jsonl")
+        checkpoint.start("split_files", {"prefix": "2024/01"})
+        for raw_key in raw_keys:
+            if not checkpoint.is_settled(raw_key):
+                split(raw_key)
+                checkpoint.mark_done(raw_key)
+        checkpoint.clear()
+    """
+
+    def __init__(self, save_every: int = DEFAULT_SAVE_EVERY, save_interval: float = DEFAULT_SAVE_INTERVAL):
+        """
+        Initializes the AbstractCheckpoint class
+        Args:
+            save_every: The number of pending records over which they are saved
+            save_interval: The number of seconds after which the pending records are saved
+        """
+        self.save_every = save_every
+        self.save_interval = save_interval
+        self.keeps_hand_ids = False
+        self._lock = threading.Lock()
+        self._pending_lines = []
+        self._pending_count = 0
+        self._saved_at = time.monotonic()
+        self._reset()
+        for record in self.iter_records():
+            self._apply(record)
+
+    def _reset(self):
+        self.run_name = None
+        self.run_filter = None
+        self.done_keys = {}
+        self.quarantined = {}
+        self.listed_stats = {}
+        self.listing_complete = False
+
+    def _apply(self, record: list):
+        kind, *values = record
+        if kind == "run":
+            self.run_name = values[0]
+            self.run_filter = values[1] if len(values) > 1 else None
+        elif kind == "listing":
+            # A listing interrupted by a crash is started over
+            self.listed_stats = {}
+            self.listing_complete = False
+        elif kind == "listed":
+            if not self.is_settled(values[0]):
+                self.listed_stats[values[0]] = tuple(values[1:])
+        elif kind == "listing_complete":
+            self.listing_complete = True
+        elif kind == "done":
+            self.done_keys[values[0]] = values[1] if len(values) > 1 else None
+            self.listed_stats.pop(values[0], None)
+        elif kind == "error":
+            self.quarantined[values[0]] = values[1]
+            self.listed_stats.pop(values[0], None)
+
+    def iter_records(self) -> Iterator[list]:
+        """
+        Yields the records of the saved journal, skipping a last record cut by a crash
+        Returns:
+            records (Iterator[list]): The records, lists starting with their kind
+        """
+        for line in self.read_lines():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+    def _record(self, *record):
+        line = json.dumps(record, separators=(",", ":"))
+        with self._lock:
+            if record[0] != "listed":
+                # The listing of the running run is not kept, it is only replayed by a resumed run
+                self._apply(list(record))
+                self._pending_count += 1
+            self._pending_lines.append(line)
+            should_save = (self._pending_count >= self.save_every
+                           or time.monotonic() - self._saved_at >= self.save_interval)
+        if should_save:
+            self.save()
+
+    def start(self, run_name: str, run_filter: dict = None) -> bool:
+        """
+        Starts recording a run. The journal of a previous run with the same name and the same selection of raw files
+        is resumed, the journal of another run is cleared, so that a resumed run never replays the listing of
+        another selection.
+        Args:
+            run_name (str): The name of the run, e.g. "split_files"
+            run_filter (dict): The selection of raw files of the run, with JSON values, e.g. {"prefix": "2024/01"}
+
+        Returns:
+            resumed (bool): True if the recorded progress of a previous run is resumed
+        """
+        self.keeps_hand_ids = False
+        run_filter = json.loads(json.dumps(run_filter)) if run_filter is not None else None
+        if self.run_name == run_name and self.run_filter == run_filter:
+            return True
+        if self.run_name is not None:
+            self.clear()
+        self._record("run", run_name, run_filter)
+        self.save()
+        return False
+
+    def is_settled(self, raw_key: str) -> bool:
+        return raw_key in self.done_keys or raw_key in self.quarantined
+
+    def iter_listed_stats(self) -> Iterator[tuple]:
+        """
+        Yields the raw files listed by the previous run that are not settled yet
+        Returns:
+            raw_stats (Iterator[tuple]): Tuples of (raw_key, size, version)
+        """
+        with self._lock:
+            # The raw files settled while they are yielded are removed from the listing
+            listed_stats = list(self.listed_stats.items())
+        for raw_key, (size, version) in listed_stats:
+            if not self.is_settled(raw_key):
+                yield raw_key, size, version
+
+    def iter_listing(self, list_raw_stats: Callable[[], Iterable[tuple]]) -> Iterator[tuple]:
+        """
+        Yields the raw files of the run, recording them as they are listed, or the raw files listed by the previous
+        run that are not settled yet, without listing them again, if its listing was complete
+        Args:
+            list_raw_stats (Callable): Returns the listed raw files, only called if they must be listed
+
+        Returns:
+            raw_stats (Iterator[tuple]): Tuples of (raw_key, size, version)
+        """
+        if self.listing_complete:
+            yield from self.iter_listed_stats()
+            return
+        self.record_listing_started()
+        for raw_key, size, version in list_raw_stats():
+            self.record_listed(raw_key, size, version)
+            yield raw_key, size, version
+        self.record_listing_complete()
+
+    def record_listing_started(self):
+        self._record("listing")
+
+    def record_listed(self, raw_key: str, size: int = None, version: str = None):
+        self._record("listed", raw_key, size, version)
+
+    def record_listing_complete(self):
+        self._record("listing_complete")
+
+    def mark_done(self, raw_key: str, hand_ids: Iterable[str] = None):
+        """
+        Records a split raw file
+        Args:
+            raw_key (str): The key of the raw file
+            hand_ids (Iterable[str]): The ids of its hands, only recorded if keeps_hand_ids is set
+        """
+        if self.keeps_hand_ids and hand_ids is not None:
+            self._record("done", raw_key, " ".join(hand_ids))
+        else:
+            self._record("done", raw_key)
+
+    def quarantine(self, raw_key: str, error: BaseException):
+        """
+        Records a raw file whose splitting failed, which is not split again when the run is resumed
+        Args:
+            raw_key (str): The key of the raw file
+            error (BaseException): The error raised while splitting it
+        """
+        self._record("error", raw_key, f"{type(error).__name__}: {error}")
+
+    def save(self):
+        with self._lock:
+            lines, self._pending_lines = self._pending_lines, []
+            self._pending_count = 0
+            self._saved_at = time.monotonic()
+            if lines:
+                self.append_lines(lines)
+
+    def clear(self):
+        with self._lock:
+            self._pending_lines = []
+            self._pending_count = 0
+            self._reset()
+            self.delete()
+
+    @abstractmethod
+    def read_lines(self) -> Iterable[str]:
+        """
+        Reads the lines of the saved journal
+        Returns:
+            lines (Iterable[str]): The lines, or nothing if there is no journal
+        """
+        pass
+
+    @abstractmethod
+    def append_lines(self, lines: list) -> None:
+        """
+        Appends lines to the saved journal durably
+        Args:
+            lines (list): The JSON lines of the records
+        """
+        pass
+
+    @abstractmethod
+    def delete(self) -> None:
+        """
+        Deletes the saved journal
+        """
+        pass
+
+
+def get_run_filter(raw_dir: str, prefix: str = None, partition_filter: PartitionFilter = None,
+                   key_filter: Callable = None) -> dict:
+    """
+    Returns the selection of raw files of a run, recorded with the run in the checkpoint
+    Args:
+        raw_dir (str): The raw directory
+        prefix (str): The sub-directory of the raw directory listed by the run
+        partition_filter (PartitionFilter): The date range and tournament ids of the run
+        key_filter (Callable): The filter of the listed raw keys
+
+    Returns:
+        run_filter (dict): The raw directory, prefix, date range, tournament ids and key filter, as JSON values
+    """
+    run_filter = {"raw_dir": raw_dir, "prefix": prefix.strip("/") if prefix else None,
+                  "start_date": None, "end_date": None, "tour_ids": None, "key_filter": None}
+    if partition_filter is not None:
+        start_date, end_date = partition_filter.start_date, partition_filter.end_date
+        run_filter["start_date"] = start_date.isoformat() if start_date else None
+        run_filter["end_date"] = end_date.isoformat() if end_date else None
+        tour_ids = partition_filter.tour_ids
+        run_filter["tour_ids"] = sorted(tour_ids) if tour_ids else None
+    if key_filter is not None:
+        # A key filter can only be told apart from another one by its name
+        run_filter["key_filter"] = getattr(key_filter, "__qualname__", repr(key_filter))
+    return run_filter
+
+
+def guard_task(checkpoint: AbstractCheckpoint, task: Callable, metrics: SplitMetrics = None) -> Callable:
+    """
+    Returns a task applied to SplitJobs which quarantines the raw file of a failing job in the checkpoint,
+    instead of raising the error and stopping the run
+    Args:
+        checkpoint (AbstractCheckpoint): The checkpoint of the run, or None
+        task (Callable): The task applied to each SplitJob
+        metrics (SplitMetrics): The metrics counting the quarantined raw files, or None
+
+    Returns:
+        guarded_task (Callable): The guarded task, or the task itself if there is no checkpoint
+    """
+    if checkpoint is None:
+        return task
+
+    def guarded_task(job):
+        try:
+            return task(job)
+        except Exception as error:
+            logger.error("Quarantined %s after an error: %s", job.raw_key, error, exc_info=True)
+            checkpoint.quarantine(job.raw_key, error)
+            increment(metrics, "quarantined")
+            return None
+
+    return guarded_task
+
+
+class FileCheckpoint(AbstractCheckpoint):
+    """
+    A checkpoint stored in a local append-only JSON lines file, synced to disk on each save
+    """
+
+    def __init__(self, path: str, save_every: int = DEFAULT_SAVE_EVERY, save_interval: float = DEFAULT_SAVE_INTERVAL):
+        """
+        Initializes the FileCheckpoint class
+        Args:
+            path: The path of the journal file
+            save_every: The number of pending records over which they are saved
+            save_interval: The number of seconds after which the pending records are saved
+        """
+        self.path = path
+        super().__init__(save_every, save_interval)
+
+    def read_lines(self) -> Iterable[str]:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding="utf-8") as file:
+            return file.read().splitlines()
+
+    def append_lines(self, lines: list) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write("".join(f"{line}\n" for line in lines))
+            file.flush()
+            os.fsync(file.fileno())
+
+    def delete(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class S3Checkpoint(AbstractCheckpoint):
+    """
+    A checkpoint stored as JSON lines objects in a S3 bucket. Since objects cannot be appended to, each save writes
+    the pending records as a new part object under the key of the journal, so that a long run never rewrites its
+    whole journal. It is saved less often than a local checkpoint.
+    """
+
+    def __init__(self, s3, bucket_name: str, key: str, save_every: int = 1000, save_interval: float = 30.0):
+        """
+        Initializes the S3Checkpoint class
+        Args:
+            s3: The boto3 S3 client
+            bucket_name: The name of the S3 bucket
+            key: The key of the journal, under which its parts are stored as f"{key}/part-000001.jsonl" objects
+            save_every: The number of pending records over which they are saved
+            save_interval: The number of seconds after which the pending records are saved
+        """
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.key = key
+        self._part_keys = []
+        super().__init__(save_every, save_interval)
+
+    def list_part_keys(self) -> list:
+        """
+        Lists the part objects of the journal
+        Returns:
+            part_keys (list): The keys of the parts, in the order they were saved
+        """
+        paginator = self.s3.get_paginator("list_objects_v2")
+        return sorted(content["Key"]
+                      for page in paginator.paginate(Bucket=self.bucket_name, Prefix=f"{self.key}/part-")
+                      for content in page.get("Contents", []))
+
+    def read_lines(self) -> Iterable[str]:
+        self._part_keys = self.list_part_keys()
+        lines = []
+        for part_key in self._part_keys:
+            response = self.s3.get_object(Bucket=self.bucket_name, Key=part_key)
+            lines.extend(response["Body"].read().decode("utf-8").splitlines())
+        return lines
+
+    def append_lines(self, lines: list) -> None:
+        part_key = f"{self.key}/part-{len(self._part_keys) + 1:06d}.jsonl"
+        body = "".join(f"{line}\n" for line in lines).encode("utf-8")
+        self.s3.put_object(Bucket=self.bucket_name, Key=part_key, Body=body)
+        self._part_keys.append(part_key)
+
+    def delete(self) -> None:
+        part_keys, self._part_keys = self._part_keys, []
+        # A single request deletes up to 1000 objects
+        for start in range(0, len(part_keys), 1000):
+            objects = [{"Key": part_key} for part_key in part_keys[start:start + 1000]]
+            self.s3.delete_objects(Bucket=self.bucket_name, Delete={"Objects": objects, "Quiet": True})
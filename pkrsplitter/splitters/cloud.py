@@ -1,92 +1,343 @@
-"""This module defines the FileSplitter class, which is used to split poker history files."""
-import boto3
-from .abstract import AbstractFileSplitter
-
-
-class CloudFileSplitter(AbstractFileSplitter):
-    """
-    A class to split poker history files
-    """
-
-    def __init__(self, bucket_name: str):
-        """
-        Initializes the FileSplitter class
-        Args:
-            bucket_name: The name of the S3 bucket
-        """
-        self.bucket_name = bucket_name
-        self.s3 = boto3.client("s3")
-        self.data_dir = "data"
-        self.raw_dir = "data/histories/raw"
-        self.correction_raw_keys_path = "data/correction_raw_keys.txt"
-        self.correction_split_keys_path = "data/correction_split_keys.txt"
-
-    def list_raw_histories_keys(self, directory_key: str = None) -> list:
-        """
-        Lists all the history files in the bucket and returns a list of their keys
-
-        Returns:
-            list: A list of the keys of the history files
-        """
-        directory = directory_key or self.raw_dir
-        paginator = self.s3.get_paginator("list_objects_v2")
-        pages = paginator.paginate(Bucket=self.bucket_name, Prefix=directory)
-        keys = [obj["Key"] for page in pages for obj in page.get("Contents", [])]
-        return keys
-
-    def check_split_dir_exists(self, raw_key: str) -> bool:
-        """
-        Checks if the split directory for the history file already exists
-        Args:
-            raw_key: The full key of the history file
-
-        Returns:
-            split_dir_exists (bool): True if the split directory already exists, False otherwise
-        """
-        destination_dir = self.get_destination_dir(raw_key)
-        response = self.s3.list_objects_v2(Bucket=self.bucket_name, Prefix=destination_dir)
-        split_dir_exists = bool(response.get("Contents"))
-        return split_dir_exists
-
-    def get_file_content(self, file_key: str) -> str:
-        """
-        Returns the text of a raw history file
-        Args:
-            file_key (str): The full path of the history file
-
-        Returns:
-            raw_text (str): The raw text of the history file
-
-        """
-        response = self.s3.get_object(Bucket=self.bucket_name, Key=file_key)
-        raw_text = response["Body"].read().decode("utf-8")
-        return raw_text
-
-    def write_file(self, file_key: str, content: str) -> None:
-        """
-        Writes a file to the S3 bucket
-        Args:
-            file_key (str): The key of the file to write
-            content (str): The content of the file
-        """
-        self.s3.put_object(Bucket=self.bucket_name, Key=file_key, Body=content.encode('utf-8'))
-
-    def write_file_from_list(self, file_key: str, content: list) -> None:
-        """
-        Writes a file to the S3 bucket
-        Args:
-            file_key (str): The key of the file to write
-            content (list): The content of the file
-        """
-        content = "\n".join(content)
-        self.s3.put_object(Bucket=self.bucket_name, Key=file_key, Body=content.encode('utf-8'))
-
-    def write_new_split_files(self, raw_key: str):
-        destination_dir = self.get_destination_dir(raw_key)
-        print(f"Splitting {raw_key} to {destination_dir}")
-        for destination_key, hand_text in self.get_separated_hands_info(raw_key):
-            destination_response = self.s3.list_objects_v2(Bucket=self.bucket_name, Prefix=destination_key)
-            destination_exists = bool(destination_response.get("Contents"))
-            if hand_text and not destination_exists:
-                self.write_file(file_key=destination_key, content=hand_text)
-                print(f"Created {destination_key} from {raw_key}")
+"""This module defines the FileSplitter class, which is used to split poker history files."""
+import codecs
+import hashlib
+import logging
+import threading
+from typing import Iterable, Iterator
+from .abstract import AbstractFileSplitter
+from .engine import DEFAULT_CHUNK_SIZE
+from .manifest import S3Manifest
+from .metrics import increment
+from .checkpoint import S3Checkpoint
+from .partitions import PARTITION_DEPTH
+from .uploads import BatchUploader, DEFAULT_UPLOAD_WORKERS, DEFAULT_PREFIX_RATE, is_throttling_error
+
+logger = logging.getLogger(__name__)
+s3_client_lock = threading.Lock()
+
+
+def create_s3_client():
+    """
+    Creates a boto3 S3 client, importing boto3 only when a client is first needed
+    Returns:
+        s3: The boto3 S3 client
+    """
+    import boto3
+    return boto3.client("s3")
+
+
+class CloudFileSplitter(AbstractFileSplitter):
+    """
+    A class to split poker history files.
+    The split files are uploaded by a BatchUploader, which retries the throttled requests and adapts its concurrency.
+    """
+
+    def __init__(self, bucket_name: str, streaming: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 executor_type: str = "thread", max_workers: int = None, max_parser_workers: int = None,
+                 output_format: str = "files", s3_client=None, upload_workers: int = DEFAULT_UPLOAD_WORKERS,
+                 prefix_rate: float = DEFAULT_PREFIX_RATE, prefix_depth: int = None):
+        """
+        Initializes the FileSplitter class
+        Args:
+            bucket_name: The name of the S3 bucket
+            streaming: Whether raw histories are read from the S3 streaming body in chunks instead of all at once
+            chunk_size: The number of bytes read at once in streaming mode
+            executor_type: The executor backend running the splitting tasks: "thread", "process" or "hybrid"
+            max_workers: The maximum number of workers running the splitting tasks
+            max_parser_workers: The maximum number of parsing processes in hybrid mode
+            output_format: The format of the split files: "files", for an object per hand, or "packed"
+            s3_client: The S3 client to use, e.g. a fake S3 in tests, defaults to a boto3 client created on first use
+            upload_workers: The number of upload workers, which is also the maximum number of PUT requests in flight
+            prefix_rate: The maximum number of PUT requests per second to each key prefix
+            prefix_depth: The number of leading key components of the rate limited prefixes, defaults to the
+                split/YYYY/MM/DD partitions of the split files
+        """
+        super().__init__(streaming, chunk_size, executor_type, max_workers, max_parser_workers, output_format)
+        self.bucket_name = bucket_name
+        self._s3 = s3_client
+        self.data_dir = "data"
+        self.raw_dir = "data/histories/raw"
+        if prefix_depth is None:
+            prefix_depth = len(self.get_destination_dir(self.raw_dir).split("/")) + PARTITION_DEPTH
+        self.uploader = BatchUploader(self.put_object, max_workers=upload_workers, prefix_rate=prefix_rate,
+                                      prefix_depth=prefix_depth, on_retry=self.on_upload_retry)
+        self.correction_raw_keys_file_key = "data/correction_raw_keys.txt"
+        self.correction_split_keys_file_key = "data/correction_split_keys.txt"
+        self.manifest_file_key = "data/split_manifest.json.gz"
+        self.checkpoint_file_key = "data/split_checkpoint.jsonl"
+        self.quarantine_file_key = "data/split_quarantine.json"
+
+    def __getstate__(self) -> dict:
+        state = super().__getstate__()
+        state.pop("_s3")
+        uploader = state.pop("uploader")
+        state["upload_settings"] = uploader.max_workers, uploader.prefix_rate, uploader.prefix_depth
+        return state
+
+    def __setstate__(self, state: dict):
+        upload_workers, prefix_rate, prefix_depth = state.pop("upload_settings")
+        super().__setstate__(state)
+        self._s3 = None
+        self.uploader = BatchUploader(self.put_object, max_workers=upload_workers, prefix_rate=prefix_rate,
+                                      prefix_depth=prefix_depth, on_retry=self.on_upload_retry)
+
+    def close(self):
+        """
+        Stops the upload workers, which are started again by the next upload
+        """
+        self.uploader.shutdown()
+
+    def on_upload_retry(self, file_key: str, error: Exception):
+        """
+        Counts a retried upload in the metrics of the splitter
+        Args:
+            file_key (str): The key of the uploaded file
+            error (Exception): The error of the failed request
+        """
+        logger.debug("Retrying the upload of %s after %s", file_key, error)
+        increment(self.metrics, "retries")
+        if is_throttling_error(error):
+            increment(self.metrics, "throttles")
+
+    @property
+    def s3(self):
+        """
+        The S3 client of the splitter, created on first use so that importing and initializing the splitter is fast
+        """
+        if self._s3 is None:
+            with s3_client_lock:
+                if self._s3 is None:
+                    self._s3 = create_s3_client()
+        return self._s3
+
+    def list_raw_histories_keys(self, directory_key: str = None) -> list:
+        """
+        Lists all the history files in the bucket and returns a list of their keys
+
+        Returns:
+            list: A list of the keys of the history files
+        """
+        directory = directory_key or self.raw_dir
+        paginator = self.s3.get_paginator("list_objects_v2")
+        pages = paginator.paginate(Bucket=self.bucket_name, Prefix=directory)
+        keys = [obj["Key"] for page in pages for obj in page.get("Contents", [])]
+        return keys
+
+    def scan_raw_directory(self, directory_key: str) -> tuple:
+        """
+        Lists a single level of a raw directory with a delimited listing, whose common prefixes are the sub-directories
+        Args:
+            directory_key (str): The prefix to scan, listed as a directory even without its trailing slash
+
+        Returns:
+            sub_directory_keys, raw_stats (tuple): The sub-prefixes, and the (raw_key, size, version) tuples of the
+                history files directly under the prefix, the version being the ETag of the object
+        """
+        paginator = self.s3.get_paginator("list_objects_v2")
+        sub_directory_keys = []
+        raw_stats = []
+        pages = paginator.paginate(Bucket=self.bucket_name, Prefix=f"{directory_key.rstrip('/')}/", Delimiter="/")
+        for page in pages:
+            sub_directory_keys.extend(common_prefix["Prefix"] for common_prefix in page.get("CommonPrefixes", []))
+            raw_stats.extend((obj["Key"], obj["Size"], obj["ETag"]) for obj in page.get("Contents", [])
+                             if not obj["Key"].endswith("/"))
+        return sub_directory_keys, raw_stats
+
+    def create_manifest(self) -> S3Manifest:
+        """
+        Creates the default manifest of the splitter, a gzipped JSON object in the bucket
+        Returns:
+            manifest (S3Manifest): The manifest of the bucket
+        """
+        return S3Manifest(self.s3, self.bucket_name, self.manifest_file_key)
+
+    def create_checkpoint(self) -> S3Checkpoint:
+        """
+        Creates the default checkpoint of the splitter, a JSON lines object in the bucket
+        Returns:
+            checkpoint (S3Checkpoint): The checkpoint of the bucket
+        """
+        return S3Checkpoint(self.s3, self.bucket_name, self.checkpoint_file_key)
+
+    def check_split_file_exists(self, destination_key: str) -> bool:
+        """
+        Checks if a split file already exists
+        Args:
+            destination_key: The key of the split file
+
+        Returns:
+            split_file_exists (bool): True if the split file already exists, False otherwise
+        """
+        response = self.s3.list_objects_v2(Bucket=self.bucket_name, Prefix=destination_key)
+        split_file_exists = bool(response.get("Contents"))
+        return split_file_exists
+
+    def check_split_dir_exists(self, raw_key: str) -> bool:
+        """
+        Checks if the split directory for the history file already exists.
+        During a split run, the answer comes from the split keys listed in bulk by the split keys cache.
+        Args:
+            raw_key: The full key of the history file
+
+        Returns:
+            split_dir_exists (bool): True if the split directory already exists, False otherwise
+        """
+        destination_dir = self.get_destination_dir(raw_key)
+        if self.split_keys_cache is not None:
+            return bool(self.split_keys_cache.get_split_dir_keys(destination_dir))
+        response = self.s3.list_objects_v2(Bucket=self.bucket_name, Prefix=destination_dir, MaxKeys=1)
+        split_dir_exists = bool(response.get("Contents"))
+        return split_dir_exists
+
+    def list_split_keys(self, directory_key: str) -> list:
+        """
+        Lists all the split keys under a directory with a single paginated listing
+        Args:
+            directory_key: The directory containing split directories, or a single split directory
+
+        Returns:
+            split_keys (list): The keys of the split files
+        """
+        paginator = self.s3.get_paginator("list_objects_v2")
+        pages = paginator.paginate(Bucket=self.bucket_name, Prefix=f"{directory_key.rstrip('/')}/")
+        split_keys = [obj["Key"] for page in pages for obj in page.get("Contents", [])]
+        return split_keys
+
+    def list_split_fingerprints(self, directory_key: str) -> dict:
+        """
+        Lists all the split keys under a directory with their ETag, with a single paginated listing
+        Args:
+            directory_key: The directory containing split directories, or a single split directory
+
+        Returns:
+            split_fingerprints (dict): The ETag of each split file, without its quotes, by key
+        """
+        paginator = self.s3.get_paginator("list_objects_v2")
+        pages = paginator.paginate(Bucket=self.bucket_name, Prefix=f"{directory_key.rstrip('/')}/")
+        return {obj["Key"]: obj["ETag"].strip('"') for page in pages for obj in page.get("Contents", [])}
+
+    def matches_fingerprint(self, file_key: str, content: str, fingerprint) -> bool:
+        """
+        Checks if an existing split file has the given content by comparing its ETag with the MD5 of the content,
+        without downloading it. The split files are uploaded in a single part, so their ETag is their MD5.
+        Args:
+            file_key: The key of the split file
+            content: The text of the hand to write to the split file
+            fingerprint: The ETag of the split file
+
+        Returns:
+            matches (bool): True if the split file already has the content, False otherwise
+        """
+        return fingerprint is not None and hashlib.md5(content.encode("utf-8")).hexdigest() == fingerprint
+
+    def get_file_content(self, file_key: str) -> str:
+        """
+        Returns the text of a raw history file
+        Args:
+            file_key (str): The full path of the history file
+
+        Returns:
+            raw_text (str): The raw text of the history file
+
+        """
+        response = self.s3.get_object(Bucket=self.bucket_name, Key=file_key)
+        raw_text = response["Body"].read().decode("utf-8")
+        return raw_text
+
+    def iter_file_chunks(self, file_key: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+        """
+        Yields the text of a file from the S3 streaming body in chunks, without loading the whole object in memory
+        Args:
+            file_key (str): The key of the file
+            chunk_size (int): The number of bytes read at once
+
+        Returns:
+            chunks (Iterator[str]): The successive chunks of the content text
+        """
+        response = self.s3.get_object(Bucket=self.bucket_name, Key=file_key)
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        for chunk in response["Body"].iter_chunks(chunk_size):
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+    def get_file_bytes(self, file_key: str, start: int = 0, end: int = None) -> bytes:
+        """
+        Returns the raw bytes of a file from a byte offset with a ranged GET request
+        Args:
+            file_key (str): The key of the file
+            start (int): The byte offset to read from
+            end (int): The byte offset to read to, excluded, or None to read to the end of the object
+
+        Returns:
+            content (bytes): The bytes of the file from the offset
+        """
+        if end is not None and end <= start:
+            return b""
+        byte_range = f"bytes={start}-" if end is None else f"bytes={start}-{end - 1}"
+        try:
+            response = self.s3.get_object(Bucket=self.bucket_name, Key=file_key, Range=byte_range)
+        except self.s3.exceptions.ClientError as error:
+            if error.response["Error"]["Code"] == "InvalidRange":
+                return b""
+            raise
+        return response["Body"].read()
+
+    def decode_raw_bytes(self, raw_bytes: bytes) -> str:
+        """
+        Decodes raw bytes read from a history file from UTF-8, like get_file_content
+        Args:
+            raw_bytes (bytes): The raw bytes
+
+        Returns:
+            raw_text (str): The decoded text
+        """
+        return raw_bytes.decode("utf-8")
+
+    def write_file(self, file_key: str, content: str) -> None:
+        """
+        Writes a file to the S3 bucket
+        Args:
+            file_key (str): The key of the file to write
+            content (str): The content of the file
+        """
+        self.uploader.upload(file_key, content.encode("utf-8"))
+
+    def write_files(self, files: Iterable[tuple]) -> None:
+        """
+        Uploads many files concurrently from the upload workers, and waits for all of them
+        Args:
+            files (Iterable[tuple]): Tuples of the key and the content text of each file, consumed lazily
+        """
+        self.uploader.upload_many((file_key, content.encode("utf-8")) for file_key, content in files)
+
+    def write_file_from_list(self, file_key: str, content: Iterable[str]) -> None:
+        """
+        Writes a file to the S3 bucket
+        Args:
+            file_key (str): The key of the file to write
+            content (Iterable[str]): The lines of the file
+        """
+        content = "\n".join(content)
+        self.uploader.upload(file_key, content.encode("utf-8"))
+
+    def write_file_bytes(self, file_key: str, content: bytes) -> None:
+        """
+        Writes bytes to a file of the S3 bucket
+        Args:
+            file_key (str): The key of the file to write
+            content (bytes): The bytes of the file
+        """
+        self.uploader.upload(file_key, content)
+
+    def put_object(self, file_key: str, body: bytes) -> None:
+        """
+        Puts an object to the S3 bucket with a single request, without retries
+        Args:
+            file_key (str): The key of the object
+            body (bytes): The content of the object
+        """
+        self.s3.put_object(Bucket=self.bucket_name, Key=file_key, Body=body)
@@ -0,0 +1,199 @@
+"""This module defines the single-pass splitting engine used by the file splitters."""
+import re
+from array import array
+from itertools import repeat
+from typing import Iterable, Iterator
+from pkrsplitter.patterns.winamax import NEW_HAND_PATTERN, HAND_ID_PATTERN
+
+# The default patterns, the splitters pass the patterns of the room of each file
+NEW_HAND_REGEX = re.compile(NEW_HAND_PATTERN)
+HAND_ID_REGEX = re.compile(HAND_ID_PATTERN)
+NEW_HAND_BYTES_REGEX = re.compile(NEW_HAND_PATTERN.encode())
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+# A raw history file ends each hand with blank lines, so a trailing hand followed by one is complete
+HAND_END_MARKERS = (b"\n\n", b"\r\n\r\n")
+# Number of characters kept from the previous chunk so that a new hand marker cut by a chunk boundary is still found
+BOUNDARY_LOOKBACK = 64
+
+
+def iter_hand_spans(raw_text, new_hand_regex: re.Pattern = NEW_HAND_REGEX) -> Iterator[tuple]:
+    """
+    Yields the (start, end) offsets of each hand in a raw history text
+    Args:
+        raw_text (str | bytes-like): The raw text of the history file, or its raw bytes (bytes, mmap, memoryview)
+        new_hand_regex (re.Pattern): The compiled new hand pattern, a bytes pattern for a bytes-like raw text
+
+    Returns:
+        hand_spans (Iterator[tuple]): The offsets of each hand, the new hand marker being excluded
+    """
+    start = None
+    for match in new_hand_regex.finditer(raw_text):
+        if start is not None:
+            yield start, match.start()
+        start = match.end()
+    if start is not None:
+        yield start, len(raw_text)
+
+
+def find_hands(raw_text, new_hand_regex: re.Pattern = NEW_HAND_REGEX,
+               hand_id_regex: re.Pattern = HAND_ID_REGEX) -> tuple:
+    """
+    Finds the offsets and the id of every hand of a raw history in bulk: the boundaries in a single finditer pass,
+    then each id with a search bounded to its hand, so that no hand is sliced to read its id, and the hands are
+    only sliced when they are written
+    Args:
+        raw_text (str | bytes-like): The raw text of the history file, or its raw bytes (bytes, mmap, memoryview)
+        new_hand_regex (re.Pattern): The compiled new hand pattern, a bytes pattern for a bytes-like raw text
+        hand_id_regex (re.Pattern): The compiled hand id pattern, a bytes pattern for a bytes-like raw text
+
+    Returns:
+        hands_offsets (tuple): The start and end offsets of the hands, as two arrays, and the list of their ids,
+            the id of a hand without any being an empty string
+    """
+    starts, ends = array("q"), array("q")
+    for match in new_hand_regex.finditer(raw_text):
+        if starts:
+            ends.append(match.start())
+        starts.append(match.end())
+    if starts:
+        ends.append(len(raw_text))
+    search = hand_id_regex.search
+    hand_ids = [match.group("hand_id") if match else "" for match in map(search, repeat(raw_text), starts, ends)]
+    if not isinstance(raw_text, str):
+        hand_ids = [hand_id.decode("ascii") if hand_id else "" for hand_id in hand_ids]
+    return starts, ends, hand_ids
+
+
+def iter_hand_texts(raw_text: str, new_hand_regex: re.Pattern = NEW_HAND_REGEX) -> Iterator[str]:
+    """
+    Yields the text of each hand in a raw history text, like re.split(NEW_HAND_PATTERN) without the preamble
+    Args:
+        raw_text (str): The raw text of the history file
+        new_hand_regex (re.Pattern): The compiled new hand pattern
+
+    Returns:
+        hand_texts (Iterator[str]): The separate hand texts
+    """
+    for start, end in iter_hand_spans(raw_text, new_hand_regex):
+        yield raw_text[start:end]
+
+
+def iter_streamed_hand_texts(chunks: Iterable[str], new_hand_regex: re.Pattern = NEW_HAND_REGEX) -> Iterator[str]:
+    """
+    Yields the text of each hand from a raw history read in chunks.
+    Only the hand being read is kept in memory: a hand is emitted as soon as the next new hand marker is seen.
+    Args:
+        chunks (Iterable[str]): The successive chunks of the raw text of the history file
+        new_hand_regex (re.Pattern): The compiled new hand pattern
+
+    Returns:
+        hand_texts (Iterator[str]): The separate hand texts, identical to iter_hand_texts on the whole text
+    """
+    buffer = ""
+    in_hand = False
+    for chunk in chunks:
+        scan_start = max(0, len(buffer) - BOUNDARY_LOOKBACK)
+        buffer += chunk
+        hand_start = 0
+        for match in new_hand_regex.finditer(buffer, scan_start):
+            if in_hand:
+                yield buffer[hand_start:match.start()]
+            in_hand = True
+            hand_start = match.end()
+        buffer = buffer[hand_start:] if in_hand else buffer[-BOUNDARY_LOOKBACK:]
+    if in_hand:
+        yield buffer
+
+
+def get_complete_hands_end(raw_bytes: bytes, new_hand_bytes_regex: re.Pattern = NEW_HAND_BYTES_REGEX) -> int:
+    """
+    Returns the offset after the last complete hand of raw bytes read from a history file still being written.
+    Every hand followed by a new hand marker is complete, and the trailing hand is complete once followed by blank lines.
+    Args:
+        raw_bytes (bytes): The raw bytes of the history file, from the beginning of the file or of a hand
+        new_hand_bytes_regex (re.Pattern): The compiled bytes new hand pattern
+
+    Returns:
+        complete_end (int): The offset after the last complete hand, which is the start of the partial trailing hand
+    """
+    last_hand_start = None
+    for match in new_hand_bytes_regex.finditer(raw_bytes):
+        last_hand_start = match.start()
+    if last_hand_start is None:
+        return 0
+    if raw_bytes.endswith(HAND_END_MARKERS):
+        return len(raw_bytes)
+    return last_hand_start
+
+
+def extract_hand_id(hand_text: str, hand_id_regex: re.Pattern = HAND_ID_REGEX) -> str:
+    """
+    Extracts the hand id from a hand text
+    Args:
+        hand_text (str): The text of a hand
+        hand_id_regex (re.Pattern): The compiled hand id pattern
+
+    Returns:
+        hand_id (str): The id of the hand, or an empty string if none was found
+    """
+    match = hand_id_regex.search(hand_text)
+    return match.group("hand_id") if match else ""
+
+
+def iter_hands(raw_text: str, new_hand_regex: re.Pattern = NEW_HAND_REGEX,
+               hand_id_regex: re.Pattern = HAND_ID_REGEX) -> Iterator[tuple]:
+    """
+    Yields the hand id and the text of each hand in a raw history text, all the hands being found first by find_hands
+    Args:
+        raw_text (str): The raw text of the history file
+        new_hand_regex (re.Pattern): The compiled new hand pattern
+        hand_id_regex (re.Pattern): The compiled hand id pattern
+
+    Returns:
+        hands (Iterator[tuple]): Tuples of (hand_id, hand_text)
+    """
+    return iter_sliced_hands(raw_text, find_hands(raw_text, new_hand_regex, hand_id_regex))
+
+
+def iter_sliced_hands(raw_text: str, hands_offsets: tuple) -> Iterator[tuple]:
+    """
+    Yields the hand id and the text of each hand, sliced from the raw text at the offsets found by find_hands
+    Args:
+        raw_text (str): The raw text of the history file
+        hands_offsets (tuple): The start offsets, end offsets and ids of the hands
+
+    Returns:
+        hands (Iterator[tuple]): Tuples of (hand_id, hand_text)
+    """
+    starts, ends, hand_ids = hands_offsets
+    for start, end, hand_id in zip(starts, ends, hand_ids):
+        yield hand_id, raw_text[start:end]
+
+
+def get_hands(raw_text: str, new_hand_regex: re.Pattern = NEW_HAND_REGEX,
+              hand_id_regex: re.Pattern = HAND_ID_REGEX) -> list:
+    """
+    Returns the hand id and the text of each hand in a raw history text
+    Args:
+        raw_text (str): The raw text of the history file
+        new_hand_regex (re.Pattern): The compiled new hand pattern
+        hand_id_regex (re.Pattern): The compiled hand id pattern
+
+    Returns:
+        hands (list): Tuples of (hand_id, hand_text)
+    """
+    return list(iter_hands(raw_text, new_hand_regex, hand_id_regex))
+
+
+def iter_identified_hands(hand_texts: Iterable[str], hand_id_regex: re.Pattern = HAND_ID_REGEX) -> Iterator[tuple]:
+    """
+    Yields the hand id and the text of each hand text
+    Args:
+        hand_texts (Iterable[str]): The separate hand texts
+        hand_id_regex (re.Pattern): The compiled hand id pattern
+
+    Returns:
+        hands (Iterator[tuple]): Tuples of (hand_id, hand_text)
+    """
+    for hand_text in hand_texts:
+        yield extract_hand_id(hand_text, hand_id_regex), hand_text
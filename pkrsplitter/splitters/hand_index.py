@@ -0,0 +1,151 @@
+"""This module defines the compact indexes of the hands of a raw history file, which materialize them on demand."""
+from array import array
+from typing import Iterable, Iterator
+
+SPLIT_KEY_SUFFIX = ".txt"
+
+
+class SplitKeys:
+    """
+    The destination keys of the hands of a raw history file, stored as their shared destination directory and
+    a single string of their ids, so that the keys of many files can be kept at a fraction of the memory of a list.
+    It is a read-only sequence of the f"{destination_dir}/{hand_id}.txt" keys, built when iterated.
+
+    Attributes:
+        destination_dir (str): The destination directory of the hands
+        hand_ids (list): The ids of the hands, in the order of the raw history file
+
+    Examples:
+        split_keys = SplitKeys("data/histories/split/2024/01/15/20240115_Freeroll(1000)", ["1000-1-1", "1000-2-1"])
+        list(split_keys)  # [".../20240115_Freeroll(1000)/1000-1-1.txt", ".../20240115_Freeroll(1000)/1000-2-1.txt"]
+    """
+    __slots__ = ("destination_dir", "joined_ids", "count")
+
+    def __init__(self, destination_dir: str, hand_ids: Iterable[str]):
+        """
+        Initializes the SplitKeys class
+        Args:
+            destination_dir: The destination directory of the hands
+            hand_ids: The ids of the hands, which never contain a line break
+        """
+        hand_ids = list(hand_ids)
+        self.destination_dir = destination_dir
+        self.joined_ids = "\n".join(hand_ids)
+        self.count = len(hand_ids)
+
+    @property
+    def hand_ids(self) -> list:
+        return self.joined_ids.split("\n") if self.count else []
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[str]:
+        for hand_id in self.hand_ids:
+            yield f"{self.destination_dir}/{hand_id}{SPLIT_KEY_SUFFIX}"
+
+    def __getitem__(self, position: int) -> str:
+        return f"{self.destination_dir}/{self.hand_ids[position]}{SPLIT_KEY_SUFFIX}"
+
+    def __eq__(self, other) -> bool:
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return f"SplitKeys({self.destination_dir!r}, {self.count} hands)"
+
+
+class HandIndex:
+    """
+    The hands of a raw history file as offsets in its raw text, with their ids and their shared destination directory.
+    It is a read-only sequence of (destination_key, hand_text) tuples, like the separated hands info, whose keys and
+    texts are only built when iterated, so that a single copy of the raw text is kept while the hands are written.
+
+    Attributes:
+        destination_dir (str): The destination directory of the hands
+        raw_text (str): The raw text of the history file, or None once released
+        starts (array): The start offset of each hand
+        ends (array): The end offset of each hand
+        hand_ids (list): The id of each hand
+
+    Methods:
+        get_hand_text: Returns the text of a hand
+        get_split_keys: Returns the compact destination keys of the hands
+        release: Drops the raw text once the hands are written
+
+    Examples:
+        hand_index = HandIndex(destination_dir, raw_text, *find_hands(raw_text))
+        for destination_key, hand_text in hand_index:
+            write_file(destination_key, hand_text)
+        destination_keys = hand_index.get_split_keys()
+    """
+    __slots__ = ("destination_dir", "raw_text", "starts", "ends", "hand_ids")
+
+    def __init__(self, destination_dir: str, raw_text: str, starts: array, ends: array, hand_ids: list):
+        """
+        Initializes the HandIndex class
+        Args:
+            destination_dir: The destination directory of the hands
+            raw_text: The raw text of the history file
+            starts: The start offset of each hand, as found by find_hands
+            ends: The end offset of each hand
+            hand_ids: The id of each hand
+        """
+        self.destination_dir = destination_dir
+        self.raw_text = raw_text
+        self.starts = starts
+        self.ends = ends
+        self.hand_ids = hand_ids
+
+    def __len__(self) -> int:
+        return len(self.hand_ids)
+
+    def __iter__(self) -> Iterator[tuple]:
+        for position in range(len(self.hand_ids)):
+            yield self[position]
+
+    def __getitem__(self, position: int) -> tuple:
+        destination_key = f"{self.destination_dir}/{self.hand_ids[position]}{SPLIT_KEY_SUFFIX}"
+        return destination_key, self.get_hand_text(position)
+
+    def get_hand_text(self, position: int) -> str:
+        """
+        Returns the text of a hand, sliced from the raw text
+        Args:
+            position (int): The position of the hand in the raw history file
+
+        Returns:
+            hand_text (str): The text of the hand
+        """
+        return self.raw_text[self.starts[position]:self.ends[position]]
+
+    def get_split_keys(self) -> SplitKeys:
+        """
+        Returns the destination keys of the hands, which do not keep the raw text
+        Returns:
+            split_keys (SplitKeys): The compact destination keys
+        """
+        return SplitKeys(self.destination_dir, self.hand_ids)
+
+    def release(self):
+        """
+        Drops the raw text and the offsets, once the hands are written
+        """
+        self.raw_text = None
+        self.starts = self.ends = None
+
+    def __repr__(self) -> str:
+        return f"HandIndex({self.destination_dir!r}, {len(self)} hands)"
+
+
+def get_hand_ids(destination_keys: Iterable[str]) -> tuple:
+    """
+    Returns the hand ids of destination keys
+    Args:
+        destination_keys (Iterable[str]): The destination keys, as a list or as compact SplitKeys
+
+    Returns:
+        hand_ids (tuple): The id of each hand
+    """
+    if isinstance(destination_keys, SplitKeys):
+        return tuple(destination_keys.hand_ids)
+    return tuple(destination_key.rsplit("/", 1)[-1][:-len(SPLIT_KEY_SUFFIX)] for destination_key in destination_keys)
@@ -0,0 +1,34 @@
+"""This module defines the parallel listing of the raw histories, which yields the raw files as they are found."""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator
+
+DEFAULT_LISTING_WORKERS = 16
+
+
+def iter_parallel_walk(scan_directory: Callable[[str], tuple], directory_keys: Iterable[str],
+                       max_workers: int = DEFAULT_LISTING_WORKERS) -> Iterator:
+    """
+    Walks directory trees with a pool of workers, each worker scanning one directory at a time,
+    and yields the entries of each directory as soon as it is scanned, before the whole tree is listed.
+    The sub-directories are scanned in reverse order, so that the most recent date partitions tend to come first.
+    Args:
+        scan_directory (Callable): Returns the sub-directories and the entries of a directory
+        directory_keys (Iterable[str]): The roots of the trees to walk
+        max_workers (int): The maximum number of directories scanned at the same time
+
+    Returns:
+        entries (Iterator): The entries of all the directories, in the order their directories are scanned
+    """
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="listing") as executor:
+        pending = {executor.submit(scan_directory, directory_key) for directory_key in directory_keys}
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    sub_directory_keys, entries = future.result()
+                    pending.update(executor.submit(scan_directory, sub_directory_key)
+                                   for sub_directory_key in sorted(sub_directory_keys, reverse=True))
+                    yield from entries
+        finally:
+            for future in pending:
+                future.cancel()
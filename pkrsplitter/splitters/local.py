@@ -1,118 +1,415 @@
-"""This module defines the FileSplitter class, which is used to split poker history files."""
-import os
-from .abstract import AbstractFileSplitter
-from concurrent.futures import ThreadPoolExecutor, as_completed
-
-
-class LocalFileSplitter(AbstractFileSplitter):
-    """
-    A class to split poker history files
-    """
-
-    def __init__(self, data_dir: str):
-        """
-
-        """
-        self.data_dir = data_dir
-        self.raw_dir = os.path.join(data_dir, "histories", "raw")
-        self.correction_raw_keys_file_key = os.path.join(data_dir, "correction_raw_keys.txt")
-        self.correction_split_keys_file_key = os.path.join(data_dir, "correction_split_keys.txt")
-        print(f"Local File Splitter initialized with data directory: {data_dir}")
-
-    def list_raw_histories_keys(self, directory_key: str = None) -> list:
-        """
-        Lists all the history files in the raw directory and returns a list of their root, and file names
-
-        Returns:
-            list: A list of dictionaries containing the root and filename of the history files
-        """
-        directory = directory_key or self.raw_dir
-        histories_list = [os.path.join(root, file)
-                          for root, _, files in os.walk(directory)
-                          for file in files if file.endswith(".txt")]
-        return histories_list
-
-    def check_split_dir_exists(self, raw_key: str) -> bool:
-        """
-        Checks if the split directory for the history file already exists
-        Args:
-            raw_key: The full key of the history file
-
-        Returns:
-            split_dir_exists (bool): True if the split directory already exists, False otherwise
-        """
-        destination_dir = self.get_destination_dir(raw_key)
-        return os.path.exists(destination_dir)
-
-    def get_file_content(self, file_key: str) -> str:
-        """
-        Returns the text of a raw history file
-        Args:
-            file_key (str): The full path of the history file
-
-        Returns:
-            raw_text (str): The raw text of the history file
-
-        """
-        with open(file_key, "r", encoding="latin-1") as file:
-            try:
-                content = file.read()
-            except UnicodeDecodeError:
-                #Try to read the file with a different encoding
-                # with open(raw_key, "r", encoding="latin-1") as file:
-                #     raw_text = file.read()
-                # print(raw_text)
-                raise UnicodeDecodeError
-        return content
-
-    def write_file(self, file_key: str, content: str) -> None:
-        """
-        Writes the content to a file
-        Args:
-            file_key (str): The file key
-            content (str): The content to write
-        """
-        destination_dir = os.path.dirname(file_key)
-        os.makedirs(destination_dir, exist_ok=True)
-        with open(file_key, "w", encoding="latin-1") as file:
-            file.write(content)
-
-    def write_file_from_list(self, file_key: str, content: list) -> None:
-        """
-        Writes the content to a file
-        Args:
-            file_key (str): The file key
-            content (list): The content to write
-        """
-        destination_dir = os.path.dirname(file_key)
-        os.makedirs(destination_dir, exist_ok=True)
-        with open(file_key, "w", encoding="latin-1") as file:
-            for line in content:
-                file.write(line + "\n")
-
-    def write_new_split_files(self, raw_key: str):
-        for destination_key, hand_text in self.get_separated_hands_info(raw_key):
-            if hand_text and not os.path.exists(destination_key):
-                print(f"Creating {destination_key} from {raw_key} ")
-                self.write_file(content=hand_text, file_key=destination_key)
-
-    def split_correction_files(self):
-        """
-        Split the history files to correct. It takes the raw keys from the correction_raw_keys.txt file and splits them.
-        Returns:
-
-        """
-        print("Splitting correction files...\n")
-        raw_keys_content = self.get_file_content(self.correction_raw_keys_file_key)
-        raw_keys = raw_keys_content.split()
-        destination_keys = [hand_info[0]
-                            for raw_key in raw_keys
-                            for hand_info in self.get_separated_hands_info(raw_key)]
-        print(f"There are {len(raw_keys)} raw files to split.\n")
-        self.write_file_from_list(self.correction_split_keys_file_key, destination_keys)
-        with ThreadPoolExecutor() as executor:
-            futures = [executor.submit(self.write_new_split_files, raw_key) for raw_key in raw_keys]
-            for future in as_completed(futures):
-                future.result()
-        self.write_file(self.correction_raw_keys_file_key, "")
-        print("Raw history files to correct have been split.")
+"""This module defines the FileSplitter class, which is used to split poker history files."""
+import logging
+import mmap
+import os
+from typing import Iterable, Iterator
+from .abstract import AbstractFileSplitter
+from .engine import DEFAULT_CHUNK_SIZE, find_hands
+from .manifest import SqliteManifest
+from .checkpoint import FileCheckpoint
+from .hand_index import SplitKeys
+from .rooms import SNIFF_SIZE
+from .writes import BatchFileWriter, DEFAULT_BATCH_SIZE, TEMP_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+
+class LocalFileSplitter(AbstractFileSplitter):
+    """
+    A class to split poker history files
+    """
+
+    encoding = "latin-1"
+
+    def __init__(self, data_dir: str, streaming: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 use_mmap: bool = False, executor_type: str = "thread", max_workers: int = None,
+                 max_parser_workers: int = None, output_format: str = "files"):
+        """
+        Initializes the LocalFileSplitter class
+        Args:
+            data_dir: The data directory containing the histories directory
+            streaming: Whether raw histories are read in chunks instead of all at once
+            chunk_size: The number of characters read at once in streaming mode
+            use_mmap: Whether raw histories are memory-mapped and split as bytes, without any decoding
+            executor_type: The executor backend running the splitting tasks: "thread", "process" or "hybrid"
+            max_workers: The maximum number of workers running the splitting tasks
+            max_parser_workers: The maximum number of parsing processes in hybrid mode
+            output_format: The format of the split files: "files", for a file per hand, or "packed"
+        """
+        super().__init__(streaming, chunk_size, executor_type, max_workers, max_parser_workers, output_format)
+        self.data_dir = data_dir
+        self.use_mmap = use_mmap
+        self.raw_dir = os.path.join(data_dir, "histories", "raw")
+        self.correction_raw_keys_file_key = os.path.join(data_dir, "correction_raw_keys.txt")
+        self.correction_split_keys_file_key = os.path.join(data_dir, "correction_split_keys.txt")
+        self.manifest_file_key = os.path.join(data_dir, "split_manifest.sqlite")
+        self.checkpoint_file_key = os.path.join(data_dir, "split_checkpoint.jsonl")
+        self.quarantine_file_key = os.path.join(data_dir, "split_quarantine.json")
+        self.set_writer()
+        logger.debug("Local File Splitter initialized with data directory: %s", data_dir)
+
+    def set_writer(self, fsync: bool = False, batch_size: int = DEFAULT_BATCH_SIZE):
+        """
+        Sets the writer of the split files, which writes each file to a temporary file renamed into place, so that
+        a crash never leaves a partial split file.
+        Args:
+            fsync (bool): Whether the split files are synced to disk before being renamed, in batches
+            batch_size (int): The number of files renamed together before their directory is synced
+        """
+        self.writer = BatchFileWriter(fsync=fsync, batch_size=batch_size)
+
+    def list_raw_histories_keys(self, directory_key: str = None) -> list:
+        """
+        Lists all the history files in the raw directory and returns a list of their root, and file names
+
+        Returns:
+            list: A list of dictionaries containing the root and filename of the history files
+        """
+        directory = directory_key or self.raw_dir
+        histories_list = [os.path.join(root, file)
+                          for root, _, files in os.walk(directory)
+                          for file in files if file.endswith(".txt")]
+        return histories_list
+
+    def scan_raw_directory(self, directory_key: str) -> tuple:
+        """
+        Lists a single level of a raw directory with os.scandir
+        Args:
+            directory_key (str): The directory to scan
+
+        Returns:
+            sub_directory_keys, raw_stats (tuple): The sub-directories, and the (raw_key, size, version) tuples of
+                the history files directly in the directory, the version being the modification time in nanoseconds
+        """
+        sub_directory_keys = []
+        raw_stats = []
+        try:
+            with os.scandir(directory_key) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        sub_directory_keys.append(entry.path)
+                    elif entry.name.endswith(".txt"):
+                        stat = entry.stat()
+                        raw_stats.append((entry.path, stat.st_size, str(stat.st_mtime_ns)))
+        except FileNotFoundError:
+            pass
+        return sub_directory_keys, raw_stats
+
+    def create_manifest(self) -> SqliteManifest:
+        """
+        Creates the default manifest of the splitter, a SQLite database in the data directory
+        Returns:
+            manifest (SqliteManifest): The manifest of the data directory
+        """
+        return SqliteManifest(self.manifest_file_key)
+
+    def create_checkpoint(self) -> FileCheckpoint:
+        """
+        Creates the default checkpoint of the splitter, a JSON lines journal in the data directory
+        Returns:
+            checkpoint (FileCheckpoint): The checkpoint of the data directory
+        """
+        return FileCheckpoint(self.checkpoint_file_key)
+
+    def check_split_file_exists(self, destination_key: str) -> bool:
+        """
+        Checks if a split file already exists
+        Args:
+            destination_key: The path of the split file
+
+        Returns:
+            split_file_exists (bool): True if the split file already exists, False otherwise
+        """
+        return os.path.exists(destination_key)
+
+    def check_split_dir_exists(self, raw_key: str) -> bool:
+        """
+        Checks if the split directory for the history file already exists
+        Args:
+            raw_key: The full key of the history file
+
+        Returns:
+            split_dir_exists (bool): True if the split directory already exists, False otherwise
+        """
+        destination_dir = self.get_destination_dir(raw_key)
+        return os.path.exists(destination_dir)
+
+    def list_split_keys(self, directory_key: str) -> list:
+        """
+        Lists all the split keys under a directory
+        Args:
+            directory_key: The directory containing split directories, or a single split directory
+
+        Returns:
+            split_keys (list): The paths of the split files, in the f"{destination_dir}/{hand_id}.txt" format
+        """
+        return [f"{root}/{file}" for root, files in self.walk_split_files(directory_key) for file in files]
+
+    @staticmethod
+    def walk_split_files(directory_key: str) -> Iterator[tuple]:
+        """
+        Walks a directory of split files, skipping the temporary files and directories left by an interrupted write
+        Args:
+            directory_key: The directory containing split directories, or a single split directory
+
+        Returns:
+            split_files (Iterator[tuple]): Tuples of each directory and the names of its split files
+        """
+        for root, directories, files in os.walk(directory_key):
+            directories[:] = [directory for directory in directories if not directory.endswith(TEMP_SUFFIX)]
+            yield root, [file for file in files if not file.endswith(TEMP_SUFFIX)]
+
+    def list_split_fingerprints(self, directory_key: str) -> dict:
+        """
+        Lists all the split keys under a directory with their size
+        Args:
+            directory_key: The directory containing split directories, or a single split directory
+
+        Returns:
+            split_fingerprints (dict): The size in bytes of each split file, by path
+        """
+        split_fingerprints = {}
+        for root, files in self.walk_split_files(directory_key):
+            for file in files:
+                split_key = f"{root}/{file}"
+                split_fingerprints[split_key] = os.path.getsize(split_key)
+        return split_fingerprints
+
+    def matches_fingerprint(self, file_key: str, content: str, fingerprint) -> bool:
+        """
+        Checks if an existing split file has the given content, comparing the sizes first so that
+        the file is only read when they are equal
+        Args:
+            file_key: The path of the split file
+            content: The text of the hand to write to the split file
+            fingerprint: The size of the split file
+
+        Returns:
+            matches (bool): True if the split file already has the content, False otherwise
+        """
+        # The text files are written with the line endings of the platform
+        content_bytes = content.replace("\n", os.linesep).encode(self.encoding)
+        return self.matches_file_bytes(file_key, content_bytes, fingerprint)
+
+    @staticmethod
+    def matches_file_bytes(file_key: str, content_bytes, size: int) -> bool:
+        """
+        Checks if an existing file has the given bytes
+        Args:
+            file_key: The path of the file
+            content_bytes (bytes | memoryview): The bytes to compare with the file
+            size: The size of the file
+
+        Returns:
+            matches (bool): True if the file has the bytes, False otherwise
+        """
+        if size is None or size != len(content_bytes):
+            return False
+        try:
+            with open(file_key, "rb") as file:
+                return file.read() == content_bytes
+        except FileNotFoundError:
+            return False
+
+    def get_file_content(self, file_key: str) -> str:
+        """
+        Returns the text of a raw history file
+        Args:
+            file_key (str): The full path of the history file
+
+        Returns:
+            raw_text (str): The raw text of the history file
+
+        """
+        with open(file_key, "r", encoding="latin-1") as file:
+            try:
+                content = file.read()
+            except UnicodeDecodeError:
+                #Try to read the file with a different encoding
+                # with open(raw_key, "r", encoding="latin-1") as file:
+                #     raw_text = file.read()
+                # print(raw_text)
+                raise UnicodeDecodeError
+        return content
+
+    def iter_file_chunks(self, file_key: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+        """
+        Yields the text of a file in chunks, without loading the whole file in memory
+        Args:
+            file_key (str): The full path of the file
+            chunk_size (int): The number of characters read at once
+
+        Returns:
+            chunks (Iterator[str]): The successive chunks of the content text
+        """
+        with open(file_key, "r", encoding="latin-1") as file:
+            while chunk := file.read(chunk_size):
+                yield chunk
+
+    def get_file_bytes(self, file_key: str, start: int = 0, end: int = None) -> bytes:
+        """
+        Returns the raw bytes of a file from a byte offset
+        Args:
+            file_key (str): The full path of the file
+            start (int): The byte offset to seek to
+            end (int): The byte offset to read to, excluded, or None to read to the end of the file
+
+        Returns:
+            content (bytes): The bytes of the file from the offset
+        """
+        with open(file_key, "rb") as file:
+            file.seek(start)
+            return file.read(-1 if end is None else max(end - start, 0))
+
+    def decode_raw_bytes(self, raw_bytes: bytes) -> str:
+        """
+        Decodes raw bytes read from a history file from latin-1, translating the line endings like get_file_content
+        Args:
+            raw_bytes (bytes): The raw bytes
+
+        Returns:
+            raw_text (str): The decoded text
+        """
+        return raw_bytes.decode("latin-1").replace("\r\n", "\n").replace("\r", "\n")
+
+    def encode_text(self, content: str) -> bytes:
+        """
+        Encodes a text to write, with the line endings of the platform like a file opened in text mode
+        Args:
+            content (str): The text
+
+        Returns:
+            content_bytes (bytes): The encoded text
+        """
+        if os.linesep != "\n":
+            content = content.replace("\n", os.linesep)
+        return content.encode(self.encoding)
+
+    def write_file(self, file_key: str, content: str) -> None:
+        """
+        Writes the content to a file atomically
+        Args:
+            file_key (str): The file key
+            content (str): The content to write
+        """
+        self.writer.write(file_key, self.encode_text(content))
+
+    def write_files(self, files: Iterable[tuple]) -> None:
+        """
+        Writes many files atomically from the writer, which stages the files of a new split directory and renames
+        the directory into place once, instead of creating the directory and opening a text file for each hand
+        Args:
+            files (Iterable[tuple]): Tuples of the key and the content text of each file, consumed lazily
+        """
+        self.writer.write_many((file_key, self.encode_text(content)) for file_key, content in files)
+
+    def write_file_from_list(self, file_key: str, content: Iterable[str]) -> None:
+        """
+        Writes the content to a file atomically
+        Args:
+            file_key (str): The file key
+            content (Iterable[str]): The lines to write, consumed lazily
+        """
+        self.writer.write_chunks(file_key, (self.encode_text(f"{line}\n") for line in content))
+
+    def write_file_bytes(self, file_key: str, content: bytes) -> None:
+        """
+        Writes bytes to a file atomically
+        Args:
+            file_key (str): The file key
+            content (bytes): The bytes to write
+        """
+        self.writer.write(file_key, content)
+
+    def uses_mapped_files(self) -> bool:
+        """
+        Checks if raw files are split from their memory mapping, which only writes a file per hand
+        Returns:
+            mapped (bool): True if mmap is enabled and the output format is "files"
+        """
+        return self.use_mmap and self.output_format == "files"
+
+    def write_mapped_split_files(self, raw_key: str, only_new: bool = False) -> list:
+        """
+        Writes the split files from a memory-mapped raw history file.
+        Hand boundaries and ids are found in bulk with bytes patterns and each hand is written straight from
+        a memoryview slice of the mapped file, so the hands are never decoded nor copied. The hands of a file with
+        carriage returns are copied to translate their line endings, so that they are written as in text mode.
+        Args:
+            raw_key (str): The key of the raw history file
+            only_new (bool): Whether the split files that already exist are skipped
+
+        Returns:
+            destination_keys (SplitKeys): The destination keys of the hands found in the history file
+        """
+        destination_dir = self.get_destination_dir(raw_key)
+        check_existing = only_new or self.deduplicate_hands
+        existing_split_keys = self.get_existing_split_keys(raw_key) if check_existing else {}
+        if not os.path.getsize(raw_key):
+            return SplitKeys(destination_dir, ())
+        with open(raw_key, "rb") as raw_file, \
+                mmap.mmap(raw_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file, \
+                memoryview(mapped_file) as raw_view:
+            room = self.get_raw_room(raw_key, mapped_file[:SNIFF_SIZE])
+            starts, ends, hand_ids = find_hands(mapped_file, room.new_hand_bytes_regex, room.hand_id_bytes_regex)
+            translates_line_endings = os.linesep != "\n" or mapped_file.find(b"\r") != -1
+
+            new_keys = [] if self.split_keys_cache is not None else None
+
+            def iter_hand_files():
+                for start, end, hand_id in zip(starts, ends, hand_ids):
+                    destination_key = f"{destination_dir}/{hand_id}.txt"
+                    if start == end or (only_new and destination_key in existing_split_keys):
+                        continue
+                    if new_keys is not None and destination_key not in existing_split_keys:
+                        new_keys.append(destination_key)
+                    # The writer writes each view before the next one is taken, so it is released right after
+                    with raw_view[start:end] as hand_view:
+                        hand_bytes = hand_view
+                        if translates_line_endings:
+                            hand_bytes = self.encode_text(self.decode_raw_bytes(bytes(hand_view)))
+                        if destination_key in existing_split_keys and self.matches_file_bytes(
+                                destination_key, hand_bytes, existing_split_keys[destination_key]):
+                            continue
+                        yield destination_key, hand_bytes
+
+            self.writer.write_many(iter_hand_files())
+        if new_keys:
+            self.split_keys_cache.add_split_keys(new_keys)
+        return SplitKeys(destination_dir, hand_ids)
+
+    def uses_staged_pipeline(self) -> bool:
+        """
+        Checks if raw files are split through separate fetch, split and write stages, or by a single task per file.
+        In mmap mode, each raw file is split by a single task since its hands are written straight from the mapping.
+        Returns:
+            staged (bool): True if the fetch, split and write stages are separate
+        """
+        return not self.uses_mapped_files() and super().uses_staged_pipeline()
+
+    def write_split_files(self, raw_key: str) -> list:
+        """
+        Writes the split files to the split directory
+        Args:
+            raw_key (str): The path of the history file
+
+        Returns:
+            destination_keys (list): The destination keys of the hands found in the history file
+        """
+        if self.uses_mapped_files():
+            logger.info("Splitting %s to %s", raw_key, self.get_destination_dir(raw_key))
+            return self.write_mapped_split_files(raw_key)
+        return super().write_split_files(raw_key)
+
+    def write_new_split_files(self, raw_key: str) -> list:
+        """
+        Writes the split files that do not already exist
+        Args:
+            raw_key (str): The key of the raw history file
+
+        Returns:
+            destination_keys (list): The destination keys of the hands found in the history file
+        """
+        if self.uses_mapped_files():
+            return self.write_mapped_split_files(raw_key, only_new=True)
+        return super().write_new_split_files(raw_key)
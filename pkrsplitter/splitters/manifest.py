@@ -0,0 +1,362 @@
+"""This module defines the split manifests, which record the raw history files already split."""
+import hashlib
+import json
+import threading
+from abc import ABC, abstractmethod
+from typing import Iterable, Iterator, NamedTuple
+
+
+def get_content_hasher():
+    """
+    Returns a new hash object for the content of raw history files
+    Returns:
+        hasher: A blake2b hash object
+    """
+    return hashlib.blake2b(digest_size=16)
+
+
+def hash_content(content: str) -> str:
+    """
+    Returns the hash of the content of a raw history file
+    Args:
+        content (str): The raw text
+
+    Returns:
+        content_hash (str): The hexadecimal hash of the raw text
+    """
+    hasher = get_content_hasher()
+    hasher.update(content.encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def iter_hashed_chunks(chunks: Iterable[str], hasher) -> Iterator[str]:
+    """
+    Yields the chunks of a raw text while feeding them to a hash object
+    Args:
+        chunks (Iterable[str]): The chunks of the raw text
+        hasher: The hash object, whose digest equals hash_content of the whole text once the chunks are consumed
+
+    Returns:
+        chunks (Iterator[str]): The same chunks
+    """
+    for chunk in chunks:
+        hasher.update(chunk.encode("utf-8"))
+        yield chunk
+
+
+class ManifestEntry(NamedTuple):
+    """
+    The record of a split raw history file
+
+    Attributes:
+        raw_key (str): The key of the raw history file
+        size (int): The size of the raw history file when it was split
+        version (str): The modification time (local) or ETag (S3) of the raw history file when it was split
+        content_hash (str): The hash of the raw text, or None if it was not computed
+        hand_ids (tuple): The ids of the hands, the split keys being f"{destination_dir}/{hand_id}.txt"
+        offset (int): The byte offset after the last complete hand split incrementally, or None
+    """
+    raw_key: str
+    size: int
+    version: str
+    content_hash: str
+    hand_ids: tuple
+    offset: int = None
+
+    @property
+    def hand_count(self) -> int:
+        return len(self.hand_ids)
+
+    def get_split_keys(self, destination_dir: str) -> list:
+        """
+        Returns the split keys produced from the raw history file
+        Args:
+            destination_dir (str): The split directory of the raw history file
+
+        Returns:
+            split_keys (list): The keys of the split files
+        """
+        return [f"{destination_dir}/{hand_id}.txt" for hand_id in self.hand_ids]
+
+
+class AbstractManifest(ABC):
+    """
+    A persistent record of the raw history files already split, used to skip unchanged files in incremental runs
+
+    Methods:
+        get: Returns the entry of a raw history file
+        record: Records the splitting of a raw history file
+        is_current: Checks if a raw history file is unchanged since it was split
+        iter_changed: Yields the raw history files that are new or changed since they were split
+        find_content: Returns a raw history file recorded with the given content hash
+        record_same_content: Records the new size and version of a raw history file whose content is unchanged
+        record_duplicate: Records a raw history file identical to another one, without any hand of its own
+        get_offset: Returns the offset reached in a raw history file by the incremental runs
+        record_appended: Records the hands appended to a raw history file and the offset reached
+        save: Persists the recorded entries
+    """
+
+    @abstractmethod
+    def get(self, raw_key: str) -> ManifestEntry:
+        """
+        Returns the entry of a raw history file
+        Args:
+            raw_key (str): The key of the raw history file
+
+        Returns:
+            entry (ManifestEntry): The entry of the raw history file, or None if it was never recorded
+        """
+        pass
+
+    @abstractmethod
+    def record(self, entry: ManifestEntry) -> None:
+        """
+        Records the splitting of a raw history file
+        Args:
+            entry (ManifestEntry): The entry of the raw history file
+        """
+        pass
+
+    @abstractmethod
+    def save(self) -> None:
+        """
+        Persists the recorded entries
+        """
+        pass
+
+    @abstractmethod
+    def find_content(self, content_hash: str, exclude_raw_key: str = None) -> str:
+        """
+        Returns a raw history file recorded with the given content hash, to detect the files downloaded twice
+        Args:
+            content_hash (str): The hash of the raw text
+            exclude_raw_key (str): A raw key to ignore, usually the key of the file being checked
+
+        Returns:
+            raw_key (str): The key of a recorded file with the same content, or None
+        """
+        pass
+
+    def is_current(self, raw_key: str, size: int, version: str) -> bool:
+        """
+        Checks if a raw history file is unchanged since it was split
+        Args:
+            raw_key (str): The key of the raw history file
+            size (int): The current size of the raw history file
+            version (str): The current modification time or ETag of the raw history file
+
+        Returns:
+            is_current (bool): True if the file was split with the same size and version
+        """
+        entry = self.get(raw_key)
+        return entry is not None and entry.size == size and entry.version == version
+
+    def iter_changed(self, raw_stats: Iterable[tuple]) -> Iterator[tuple]:
+        """
+        Yields the raw history files that are new or changed since they were split
+        Args:
+            raw_stats (Iterable[tuple]): Tuples of (raw_key, size, version) from the listing of the raw files
+
+        Returns:
+            changed_stats (Iterator[tuple]): The tuples of the new or changed raw files
+        """
+        for raw_key, size, version in raw_stats:
+            if not self.is_current(raw_key, size, version):
+                yield raw_key, size, version
+
+    def record_same_content(self, raw_key: str, size: int, version: str, content_hash: str) -> bool:
+        """
+        Records the new size and version of a raw history file whose content is the recorded one, so that only its
+        metadata changed and its hands are already split
+        Args:
+            raw_key (str): The key of the raw history file
+            size (int): The current size of the raw history file
+            version (str): The current modification time or ETag of the raw history file
+            content_hash (str): The hash of the current raw text
+
+        Returns:
+            same_content (bool): True if the content is unchanged and the new metadata was recorded
+        """
+        entry = self.get(raw_key)
+        if entry is None or entry.content_hash != content_hash:
+            return False
+        self.record(entry._replace(size=size, version=version))
+        return True
+
+    def record_duplicate(self, raw_key: str, size: int, version: str, content_hash: str,
+                         run_content_keys: dict) -> str:
+        """
+        Records a raw history file identical to a recorded one, or to a raw file of the run, without any hand.
+        The raw files of a run are only recorded once written, so the content hashes fetched during the run are
+        claimed by the first raw file having them.
+        Args:
+            raw_key (str): The key of the raw history file
+            size (int): The size of the raw history file
+            version (str): The modification time or ETag of the raw history file
+            content_hash (str): The hash of the raw text
+            run_content_keys (dict): The raw key claiming each content hash fetched during the run
+
+        Returns:
+            duplicate_key (str): The key of the identical raw file, or None if the raw file is not a duplicate
+        """
+        duplicate_key = self.find_content(content_hash, raw_key) or run_content_keys.setdefault(content_hash, raw_key)
+        if duplicate_key == raw_key:
+            return None
+        self.record(ManifestEntry(raw_key, size, version, content_hash, ()))
+        return duplicate_key
+
+    def get_offset(self, raw_key: str) -> int:
+        """
+        Returns the offset reached in a raw history file by the incremental runs
+        Args:
+            raw_key (str): The key of the raw history file
+
+        Returns:
+            offset (int): The offset in bytes of the first hand not split yet, 0 if none was split incrementally
+        """
+        entry = self.get(raw_key)
+        return (entry.offset or 0) if entry is not None else 0
+
+    def record_appended(self, raw_key: str, size: int, version: str, hand_ids: Iterable[str], offset: int) -> None:
+        """
+        Records the hands appended to a raw history file, after the hands of the previous incremental runs
+        Args:
+            raw_key (str): The key of the raw history file
+            size (int): The size of the raw history file
+            version (str): The modification time or ETag of the raw history file
+            hand_ids (Iterable[str]): The ids of the appended hands
+            offset (int): The offset in bytes reached in the raw history file
+        """
+        entry = self.get(raw_key)
+        previous_hand_ids = entry.hand_ids if entry is not None and entry.offset is not None else ()
+        self.record(ManifestEntry(raw_key, size, version, None, previous_hand_ids + tuple(hand_ids), offset))
+
+
+class SqliteManifest(AbstractManifest):
+    """
+    A manifest stored in a local SQLite database, committed every few records so that it survives a crash
+    """
+
+    def __init__(self, path: str, commit_every: int = 1000):
+        """
+        Initializes the SqliteManifest class
+        Args:
+            path: The path of the SQLite database
+            commit_every: The number of records between two commits
+        """
+        import sqlite3
+        self.path = path
+        self.commit_every = commit_every
+        self._uncommitted = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS raw_histories (raw_key TEXT PRIMARY KEY, size INTEGER, "
+                                 "version TEXT, content_hash TEXT, hand_count INTEGER, hand_ids TEXT, "
+                                 "byte_offset INTEGER)")
+        columns = [row[1] for row in self._connection.execute("PRAGMA table_info(raw_histories)")]
+        if "byte_offset" not in columns:
+            self._connection.execute("ALTER TABLE raw_histories ADD COLUMN byte_offset INTEGER")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS raw_histories_content_hash "
+                                 "ON raw_histories (content_hash)")
+        self._connection.commit()
+
+    def get(self, raw_key: str) -> ManifestEntry:
+        with self._lock:
+            row = self._connection.execute("SELECT raw_key, size, version, content_hash, hand_ids, byte_offset "
+                                           "FROM raw_histories WHERE raw_key = ?", (raw_key,)).fetchone()
+        if row is None:
+            return None
+        return ManifestEntry(*row[:4], tuple(row[4].split()), row[5])
+
+    def record(self, entry: ManifestEntry) -> None:
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO raw_histories (raw_key, size, version, content_hash, "
+                                     "hand_count, hand_ids, byte_offset) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                     (entry.raw_key, entry.size, entry.version, entry.content_hash,
+                                      entry.hand_count, " ".join(entry.hand_ids), entry.offset))
+            self._uncommitted += 1
+            if self._uncommitted >= self.commit_every:
+                self._connection.commit()
+                self._uncommitted = 0
+
+    def save(self) -> None:
+        with self._lock:
+            self._connection.commit()
+            self._uncommitted = 0
+
+    def find_content(self, content_hash: str, exclude_raw_key: str = None) -> str:
+        with self._lock:
+            row = self._connection.execute("SELECT raw_key FROM raw_histories WHERE content_hash = ? AND raw_key != ? "
+                                           "LIMIT 1", (content_hash, exclude_raw_key or "")).fetchone()
+        return row[0] if row is not None else None
+
+    def iter_changed(self, raw_stats: Iterable[tuple]) -> Iterator[tuple]:
+        with self._lock:
+            versions = {raw_key: (size, version) for raw_key, size, version
+                        in self._connection.execute("SELECT raw_key, size, version FROM raw_histories")}
+        for raw_key, size, version in raw_stats:
+            if versions.get(raw_key) != (size, version):
+                yield raw_key, size, version
+
+
+class S3Manifest(AbstractManifest):
+    """
+    A manifest stored as a single gzipped JSON object in a S3 bucket, loaded once and written back on save
+    """
+
+    def __init__(self, s3, bucket_name: str, key: str):
+        """
+        Initializes the S3Manifest class
+        Args:
+            s3: The boto3 S3 client
+            bucket_name: The name of the S3 bucket
+            key: The key of the manifest object
+        """
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.key = key
+        self._lock = threading.Lock()
+        self._entries = self._load()
+        self._content_keys = {}
+        for raw_key, row in self._entries.items():
+            self._content_keys.setdefault(row[2], set()).add(raw_key)
+
+    def _load(self) -> dict:
+        import gzip
+        try:
+            response = self.s3.get_object(Bucket=self.bucket_name, Key=self.key)
+        except self.s3.exceptions.NoSuchKey:
+            return {}
+        return json.loads(gzip.decompress(response["Body"].read()))
+
+    def get(self, raw_key: str) -> ManifestEntry:
+        with self._lock:
+            row = self._entries.get(raw_key)
+        if row is None:
+            return None
+        size, version, content_hash, hand_ids, *offset = row
+        return ManifestEntry(raw_key, size, version, content_hash, tuple(hand_ids.split()), *offset)
+
+    def record(self, entry: ManifestEntry) -> None:
+        row = [entry.size, entry.version, entry.content_hash, " ".join(entry.hand_ids)]
+        if entry.offset is not None:
+            row.append(entry.offset)
+        with self._lock:
+            previous_row = self._entries.get(entry.raw_key)
+            if previous_row is not None:
+                self._content_keys.get(previous_row[2], set()).discard(entry.raw_key)
+            self._entries[entry.raw_key] = row
+            self._content_keys.setdefault(entry.content_hash, set()).add(entry.raw_key)
+
+    def find_content(self, content_hash: str, exclude_raw_key: str = None) -> str:
+        if content_hash is None:
+            return None
+        with self._lock:
+            raw_keys = self._content_keys.get(content_hash, set()) - {exclude_raw_key}
+        return next(iter(raw_keys), None)
+
+    def save(self) -> None:
+        import gzip
+        with self._lock:
+            body = gzip.compress(json.dumps(self._entries, separators=(",", ":")).encode("utf-8"))
+        self.s3.put_object(Bucket=self.bucket_name, Key=self.key, Body=body)
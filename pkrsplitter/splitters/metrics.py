@@ -0,0 +1,225 @@
+"""This module defines the metrics of the split runs: stage timings, counters and latency histograms."""
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from typing import Callable
+
+STAGES = ("list", "fetch", "split", "exists_check", "write")
+COUNTERS = ("files", "hands", "bytes", "skipped", "quarantined", "retries", "throttles")
+# The upper bounds in seconds of the buckets of the latency histograms, like the Prometheus client defaults
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_FORMATS = ("json", "prometheus")
+
+
+class Histogram:
+    """
+    A latency histogram with fixed buckets, which only keeps a count per bucket
+
+    Methods:
+        observe: Records a value
+        get_quantile: Returns an estimate of a quantile of the recorded values
+        to_dict: Returns the count, sum and buckets of the histogram
+    """
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        """
+        Initializes the Histogram class
+        Args:
+            buckets: The upper bounds of the buckets, in increasing order
+        """
+        self.buckets = buckets
+        # The last count is the one of the values above the last bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def get_quantile(self, quantile: float) -> float:
+        """
+        Returns an estimate of a quantile of the recorded values, as the upper bound of the bucket containing it
+        Args:
+            quantile (float): The quantile, between 0 and 1
+
+        Returns:
+            value (float): The upper bound of the bucket, infinity above the last bound, or 0.0 if nothing is recorded
+        """
+        if not self.count:
+            return 0.0
+        rank = quantile * self.count
+        cumulative_count = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative_count += count
+            if cumulative_count >= rank:
+                return bound
+        return float("inf")
+
+    def to_dict(self) -> dict:
+        """
+        Returns the count, sum and cumulative buckets of the histogram
+        Returns:
+            histogram (dict): The count, the sum, the p50 and p99 estimates and the cumulative count of each bucket
+        """
+        cumulative_counts, cumulative_count = {}, 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative_count += count
+            cumulative_counts["+Inf" if bound == float("inf") else str(bound)] = cumulative_count
+        return {"count": self.count, "sum": round(self.sum, 6), "p50": self.get_quantile(0.5),
+                "p99": self.get_quantile(0.99), "buckets": cumulative_counts}
+
+
+class SplitMetrics:
+    """
+    The metrics of split runs: the time spent in each stage, with a latency histogram per stage, and counters.
+    Hooks are called with each recorded value, to forward the metrics to a monitoring system while a run goes on.
+
+    Methods:
+        increment: Adds a value to a counter
+        observe: Records the duration of a stage
+        time_stage: Times the block of a stage
+        add_hook: Registers a callback called with each recorded value
+        get_snapshot: Returns the current metrics
+        to_json: Returns the current metrics as JSON
+        to_prometheus: Returns the current metrics in the Prometheus text format
+        reset: Clears the metrics
+
+    Examples:
+        metrics = SplitMetrics()
+        splitter.set_metrics(metrics)
+        splitter.split_files()
+        print(metrics.to_prometheus())
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        """
+        Initializes the SplitMetrics class
+        Args:
+            buckets: The upper bounds in seconds of the buckets of the latency histograms
+        """
+        self.buckets = buckets
+        self.hooks = []
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = dict.fromkeys(COUNTERS, 0)
+            self.histograms = {stage: Histogram(self.buckets) for stage in STAGES}
+            self.started_at = time.monotonic()
+
+    def add_hook(self, hook: Callable[[str, str, float], None]):
+        """
+        Registers a callback called with each recorded value
+        Args:
+            hook (Callable): Called with the kind of metric ("counter" or "stage"), its name and the value
+        """
+        self.hooks.append(hook)
+
+    def increment(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        for hook in self.hooks:
+            hook("counter", name, value)
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            if stage not in self.histograms:
+                self.histograms[stage] = Histogram(self.buckets)
+            self.histograms[stage].observe(seconds)
+        for hook in self.hooks:
+            hook("stage", stage, seconds)
+
+    @contextmanager
+    def time_stage(self, stage: str):
+        """
+        Times a block of code as a run of a stage
+        Args:
+            stage (str): The name of the stage, e.g. "fetch"
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def get_snapshot(self) -> dict:
+        """
+        Returns the current metrics
+        Returns:
+            snapshot (dict): The elapsed seconds, the counters and the histogram of each stage
+        """
+        with self._lock:
+            return {
+                "elapsed_seconds": round(time.monotonic() - self.started_at, 6),
+                "counters": dict(self.counters),
+                "stages": {stage: histogram.to_dict() for stage, histogram in self.histograms.items()},
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.get_snapshot())
+
+    def to_prometheus(self, prefix: str = "pkrsplitter") -> str:
+        """
+        Returns the current metrics in the Prometheus text exposition format
+        Args:
+            prefix (str): The prefix of the metric names
+
+        Returns:
+            text (str): A counter per counter, and a stage_seconds histogram labelled by stage
+        """
+        snapshot = self.get_snapshot()
+        lines = []
+        for name, value in snapshot["counters"].items():
+            lines.extend([f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {value}"])
+        lines.append(f"# TYPE {prefix}_stage_seconds histogram")
+        for stage, histogram in snapshot["stages"].items():
+            for bound, count in histogram["buckets"].items():
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {histogram["sum"]}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str, metrics_format: str = "json"):
+        """
+        Writes the current metrics to a file
+        Args:
+            path (str): The path of the file
+            metrics_format (str): "json" or "prometheus"
+        """
+        if metrics_format not in METRICS_FORMATS:
+            raise ValueError(f"Unknown metrics format {metrics_format}, expected one of {METRICS_FORMATS}")
+        with open(path, "w") as file:
+            file.write(self.to_json() if metrics_format == "json" else self.to_prometheus())
+
+
+def time_stage(metrics: SplitMetrics, stage: str):
+    """
+    Times a block of code as a run of a stage, without any overhead if there are no metrics
+    Args:
+        metrics (SplitMetrics): The metrics to record to, or None
+        stage (str): The name of the stage, e.g. "fetch"
+
+    Returns:
+        context_manager: The context manager timing the block
+    """
+    if metrics is None:
+        return nullcontext()
+    return metrics.time_stage(stage)
+
+
+def increment(metrics: SplitMetrics, name: str, value: float = 1):
+    """
+    Adds a value to a counter, without any overhead if there are no metrics
+    Args:
+        metrics (SplitMetrics): The metrics to record to, or None
+        name (str): The name of the counter, e.g. "hands"
+        value (float): The value added to the counter
+    """
+    if metrics is not None:
+        metrics.increment(name, value)
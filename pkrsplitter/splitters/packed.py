@@ -0,0 +1,189 @@
+"""This module defines the packed output format, which stores the hands of a raw history file in a single pack."""
+import json
+import logging
+from typing import TYPE_CHECKING, Iterable
+
+if TYPE_CHECKING:
+    from pkrsplitter.splitters.abstract import AbstractFileSplitter
+
+PACK_SUFFIX = ".pack"
+INDEX_SUFFIX = ".index.json"
+
+logger = logging.getLogger(__name__)
+
+
+def get_pack_key(destination_dir: str) -> str:
+    """
+    Returns the key of the pack holding the hands of a split directory
+    Args:
+        destination_dir (str): The split directory of a raw history file
+
+    Returns:
+        pack_key (str): The key of the pack, next to the split directory
+    """
+    return f"{destination_dir}{PACK_SUFFIX}"
+
+
+def get_index_key(destination_dir: str) -> str:
+    """
+    Returns the key of the index of the pack of a split directory
+    Args:
+        destination_dir (str): The split directory of a raw history file
+
+    Returns:
+        index_key (str): The key of the JSON index, next to the pack
+    """
+    return f"{destination_dir}{INDEX_SUFFIX}"
+
+
+def split_destination_key(destination_key: str) -> tuple:
+    """
+    Splits a destination key into its split directory and its hand id
+    Args:
+        destination_key (str): A key in the f"{destination_dir}/{hand_id}.txt" format
+
+    Returns:
+        destination_dir, hand_id (tuple): The split directory and the hand id
+    """
+    destination_dir, file_name = destination_key.rsplit("/", 1)
+    return destination_dir, file_name[:-len(".txt")]
+
+
+def load_pack_index(content: bytes) -> dict:
+    """
+    Loads the index of a pack
+    Args:
+        content (bytes): The content of the JSON index
+
+    Returns:
+        index (dict): The (offset, length) in bytes of each hand id in the pack
+    """
+    return {hand_id: tuple(span) for hand_id, span in json.loads(content).items()}
+
+
+class HandPack:
+    """
+    The hands of a raw history file encoded one after the other, with the index of their byte spans.
+    A single hand is then read from the pack with a ranged read of its span.
+
+    Methods:
+        add: Appends a hand to the pack
+        get_content: Returns the content of the pack
+        get_index_content: Returns the content of the JSON index of the pack
+    """
+
+    def __init__(self, encoding: str = "utf-8", content: bytes = b"", index: dict = None):
+        """
+        Initializes the HandPack class
+        Args:
+            encoding: The encoding of the hand texts
+            content: The content of an existing pack, to append hands to it
+            index: The index of the existing pack
+        """
+        self.encoding = encoding
+        self.parts = [content] if content else []
+        self.size = len(content)
+        self.index = dict(index or {})
+
+    def __contains__(self, hand_id: str) -> bool:
+        return hand_id in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def add(self, hand_id: str, hand_text: str):
+        """
+        Appends a hand to the pack
+        Args:
+            hand_id (str): The id of the hand
+            hand_text (str): The text of the hand
+        """
+        data = hand_text.encode(self.encoding)
+        self.index[hand_id] = (self.size, len(data))
+        self.parts.append(data)
+        self.size += len(data)
+
+    def get_content(self) -> bytes:
+        """
+        Returns the content of the pack
+        Returns:
+            content (bytes): The encoded hands, one after the other
+        """
+        return b"".join(self.parts)
+
+    def get_index_content(self) -> bytes:
+        """
+        Returns the content of the JSON index of the pack
+        Returns:
+            content (bytes): The JSON object mapping each hand id to its [offset, length] in the pack
+        """
+        return json.dumps(self.index, separators=(",", ":")).encode("utf-8")
+
+
+def write_packed_hands(splitter: "AbstractFileSplitter", raw_key: str, separated_hands_info: Iterable[tuple],
+                       only_new: bool = False) -> list:
+    """
+    Writes hands to the pack of their raw history file, then its index.
+    With only_new, the hands missing from an existing pack are appended to it, and nothing is written if there
+    are none.
+    Args:
+        splitter (AbstractFileSplitter): The splitter reading and writing the files
+        raw_key (str): The key of the raw history file the hands come from
+        separated_hands_info (Iterable[tuple]): Tuples containing the destination key and the text of each hand
+        only_new (bool): Whether the hands already in the pack are skipped
+
+    Returns:
+        destination_keys (list): The destination keys of the given hands
+    """
+    destination_dir = splitter.get_destination_dir(raw_key)
+    pack_key = get_pack_key(destination_dir)
+    pack = HandPack(splitter.encoding)
+    if only_new and splitter.check_split_file_exists(get_index_key(destination_dir)):
+        index = read_pack_index(splitter, destination_dir)
+        pack = HandPack(splitter.encoding, splitter.get_file_bytes(pack_key), index)
+    packed_hands_count = len(pack)
+    destination_keys = []
+    for destination_key, hand_text in separated_hands_info:
+        destination_keys.append(destination_key)
+        _, hand_id = split_destination_key(destination_key)
+        if hand_text and not (only_new and hand_id in pack):
+            pack.add(hand_id, hand_text)
+    if only_new and len(pack) == packed_hands_count:
+        return destination_keys
+    splitter.write_file_bytes(pack_key, pack.get_content())
+    # The index is written last, so that an index always points into a complete pack
+    splitter.write_file_bytes(get_index_key(destination_dir), pack.get_index_content())
+    if only_new:
+        logger.info("Packed %d new hands to %s from %s", len(pack) - packed_hands_count, pack_key, raw_key)
+    return destination_keys
+
+
+def read_pack_index(splitter: "AbstractFileSplitter", destination_dir: str) -> dict:
+    """
+    Reads the index of the pack of a split directory
+    Args:
+        splitter (AbstractFileSplitter): The splitter reading the files
+        destination_dir (str): The split directory of a raw history file
+
+    Returns:
+        index (dict): The (offset, length) in bytes of each hand id in the pack
+    """
+    return load_pack_index(splitter.get_file_bytes(get_index_key(destination_dir)))
+
+
+def read_packed_hand(splitter: "AbstractFileSplitter", destination_key: str, index: dict = None) -> str:
+    """
+    Reads the text of a hand from its pack, reading only its byte span
+    Args:
+        splitter (AbstractFileSplitter): The splitter reading the files
+        destination_key (str): The destination key of the hand, in the f"{destination_dir}/{hand_id}.txt" format
+        index (dict): The index of the pack, read from the index file if not given
+
+    Returns:
+        hand_text (str): The text of the hand
+    """
+    destination_dir, hand_id = split_destination_key(destination_key)
+    if index is None:
+        index = read_pack_index(splitter, destination_dir)
+    offset, length = index[hand_id]
+    return splitter.get_file_bytes(get_pack_key(destination_dir), offset, offset + length).decode(splitter.encoding)
@@ -0,0 +1,149 @@
+"""This module defines the partitions of the raw histories, which are stored by date in raw/YYYY/MM/DD directories."""
+import re
+from datetime import date, timedelta
+from typing import NamedTuple
+from pkrsplitter.patterns.winamax import FILENAME_PATTERN
+
+FILENAME_REGEX = re.compile(FILENAME_PATTERN)
+# The number of the YYYY/MM/DD directory levels of a partition
+PARTITION_DEPTH = 3
+
+
+class RawKeyInfo(NamedTuple):
+    """
+    The metadata of a raw history file, parsed from its key
+
+    Attributes:
+        raw_key (str): The key of the raw history file
+        date (date): The date of the partition of the file
+        tour_name (str): The name of the tournament or cash game table
+        tour_id (str): The id of the tournament or cash game table
+    """
+    raw_key: str
+    date: date
+    tour_name: str
+    tour_id: str
+
+
+def parse_raw_key(raw_key: str) -> RawKeyInfo:
+    """
+    Parses the key of a raw history file with FILENAME_PATTERN
+    Args:
+        raw_key (str): The key of the raw history file, e.g. ".../raw/2024/01/15/20240115_Freeroll(1000)_real.txt"
+
+    Returns:
+        raw_key_info (RawKeyInfo): The metadata of the file, or None if the key does not match the pattern
+    """
+    # Only the YYYY/MM/DD/file part of the key is parsed, whatever the digits of the parent directories
+    match = FILENAME_REGEX.search("/".join(raw_key.replace("\\", "/").split("/")[-4:]))
+    if match is None:
+        return None
+    try:
+        key_date = date(int(match.group("year")), int(match.group("month")), int(match.group("day")))
+    except ValueError:
+        return None
+    return RawKeyInfo(raw_key, key_date, match.group("tour_name"), match.group("tour_id"))
+
+
+def get_date_prefixes(start_date: date, end_date: date) -> list:
+    """
+    Returns the fewest partition prefixes covering a date range: a whole year or month is listed with a single prefix
+    Args:
+        start_date (date): The first date of the range
+        end_date (date): The last date of the range
+
+    Returns:
+        prefixes (list): The "YYYY/", "YYYY/MM/" and "YYYY/MM/DD/" prefixes, in chronological order
+    """
+    prefixes = []
+    current_date = start_date
+    while current_date <= end_date:
+        year_end = date(current_date.year, 12, 31)
+        next_month = date(current_date.year + current_date.month // 12, current_date.month % 12 + 1, 1)
+        month_end = next_month - timedelta(days=1)
+        if current_date.month == 1 and current_date.day == 1 and year_end <= end_date:
+            prefixes.append(f"{current_date.year:04d}/")
+            current_date = year_end + timedelta(days=1)
+        elif current_date.day == 1 and month_end <= end_date:
+            prefixes.append(f"{current_date.year:04d}/{current_date.month:02d}/")
+            current_date = next_month
+        else:
+            prefixes.append(f"{current_date.year:04d}/{current_date.month:02d}/{current_date.day:02d}/")
+            current_date += timedelta(days=1)
+    return prefixes
+
+
+def intersect_prefixes(prefix: str, partition_prefixes: list) -> list:
+    """
+    Returns the part of the partition prefixes of a date range under a sub-directory of the raw directory
+    Args:
+        prefix (str): The sub-directory, e.g. "2024/01"
+        partition_prefixes (list): The disjoint prefixes covering the date range, as returned by get_date_prefixes
+
+    Returns:
+        prefixes (list): The partition prefixes under the sub-directory, or the sub-directory itself if it is under
+            a partition prefix, empty if the sub-directory is outside the date range
+    """
+    prefix = f"{prefix.strip('/')}/"
+    prefixes = []
+    for partition_prefix in partition_prefixes:
+        if partition_prefix.startswith(prefix):
+            prefixes.append(partition_prefix)
+        elif prefix.startswith(partition_prefix):
+            # The partition prefixes are disjoint, so no other one is under the sub-directory
+            return [prefix]
+    return prefixes
+
+
+class PartitionFilter:
+    """
+    A selection of raw history files by date range and tournament id
+
+    Methods:
+        get_prefixes: Returns the partition prefixes to list
+        matches: Checks if a raw history file is selected
+
+    Examples:
+        partition_filter = PartitionFilter(start_date=date(2024, 1, 1), tour_ids={"1000"})
+        partition_filter.get_prefixes()  # ["2024/", "2025/01/", ..., "2025/06/01/", ...] up to today
+    """
+
+    def __init__(self, start_date: date = None, end_date: date = None, tour_ids: set = None):
+        """
+        Initializes the PartitionFilter class
+        Args:
+            start_date: The first date of the selected files, or None
+            end_date: The last date of the selected files, or None
+            tour_ids: The ids of the selected tournaments, or None for all of them
+        """
+        self.start_date = start_date
+        self.end_date = end_date
+        self.tour_ids = {str(tour_id) for tour_id in tour_ids} if tour_ids else None
+
+    def get_prefixes(self) -> list:
+        """
+        Returns the partition prefixes to list, relative to the raw directory
+        Returns:
+            prefixes (list): The prefixes covering the date range, or None if there is no start date to bound it
+        """
+        if self.start_date is None:
+            return None
+        return get_date_prefixes(self.start_date, self.end_date or date.today())
+
+    def matches(self, raw_key: str) -> bool:
+        """
+        Checks if a raw history file is selected
+        Args:
+            raw_key (str): The key of the raw history file
+
+        Returns:
+            matches (bool): True if the file is in the date range and of a selected tournament
+        """
+        raw_key_info = parse_raw_key(raw_key)
+        if raw_key_info is None:
+            return False
+        if self.start_date is not None and raw_key_info.date < self.start_date:
+            return False
+        if self.end_date is not None and raw_key_info.date > self.end_date:
+            return False
+        return self.tour_ids is None or raw_key_info.tour_id in self.tour_ids
@@ -0,0 +1,124 @@
+"""This module defines a bounded, multi-stage pipeline used to run the splitting of many raw history files."""
+import queue
+import threading
+from typing import Callable, Iterable
+
+DEFAULT_QUEUE_SIZE = 16
+_END = object()
+
+
+class Stage:
+    """
+    A stage of a pipeline, run by a fixed number of worker threads
+
+    Attributes:
+        name (str): The name of the stage
+        func (Callable): The function applied to each item. Returning None drops the item
+        workers (int): The number of worker threads running the stage
+        queue_size (int): The maximum number of items waiting for the stage
+    """
+
+    def __init__(self, name: str, func: Callable, workers: int = 1, queue_size: int = DEFAULT_QUEUE_SIZE):
+        """
+        Initializes the Stage class
+        Args:
+            name: The name of the stage
+            func: The function applied to each item. Returning None drops the item
+            workers: The number of worker threads running the stage
+            queue_size: The maximum number of items waiting for the stage
+        """
+        if workers < 1:
+            raise ValueError(f"Stage {name} needs at least one worker")
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue_size = queue_size
+
+
+class Pipeline:
+    """
+    A pipeline feeding the items of a source through successive stages connected by bounded queues.
+    When a stage is slower than the previous one, its queue fills up and the previous stage blocks,
+    so the number of items in flight never exceeds the sum of the queue sizes and workers,
+    whatever the size of the source.
+
+    Methods:
+        run: Feeds the source through the stages and waits for every item to be processed
+
+    Examples:
+        pipeline = Pipeline([Stage("fetch", fetch, 8), Stage("split", split, 4), Stage("write", write, 8)])
+        pipeline.run(raw_keys)
+    """
+
+    def __init__(self, stages: list):
+        """
+        Initializes the Pipeline class
+        Args:
+            stages: The stages of the pipeline, in order
+        """
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = stages
+        self._queues = [queue.Queue(maxsize=stage.queue_size) for stage in stages]
+        self._remaining_workers = [stage.workers for stage in stages]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._error = None
+
+    def _fail(self, error: BaseException):
+        with self._lock:
+            if self._error is None:
+                self._error = error
+        self._stop.set()
+
+    def _feed(self, source: Iterable):
+        try:
+            for item in source:
+                if self._stop.is_set():
+                    break
+                self._queues[0].put(item)
+        except BaseException as error:
+            self._fail(error)
+        finally:
+            for _ in range(self.stages[0].workers):
+                self._queues[0].put(_END)
+
+    def _work(self, index: int):
+        stage = self.stages[index]
+        input_queue = self._queues[index]
+        output_queue = self._queues[index + 1] if index + 1 < len(self.stages) else None
+        while (item := input_queue.get()) is not _END:
+            if self._stop.is_set():
+                continue
+            try:
+                result = stage.func(item)
+            except BaseException as error:
+                self._fail(error)
+                continue
+            if result is not None and output_queue is not None:
+                output_queue.put(result)
+        with self._lock:
+            self._remaining_workers[index] -= 1
+            last_worker = not self._remaining_workers[index]
+        if last_worker and output_queue is not None:
+            for _ in range(self.stages[index + 1].workers):
+                output_queue.put(_END)
+
+    def run(self, source: Iterable):
+        """
+        Feeds the source through the stages and waits for every item to be processed.
+        After a failure, the remaining items are drained without being processed and the first error is raised.
+        Args:
+            source (Iterable): The items fed to the first stage
+        """
+        threads = [threading.Thread(target=self._feed, args=(source,), name="pipeline-source", daemon=True)]
+        for index, stage in enumerate(self.stages):
+            threads.extend(threading.Thread(target=self._work, args=(index,), name=f"pipeline-{stage.name}-{n}",
+                                            daemon=True)
+                           for n in range(stage.workers))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self._error is not None:
+            raise self._error
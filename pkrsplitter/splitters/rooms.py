@@ -0,0 +1,94 @@
+"""This module defines the registry of the poker rooms, whose history format is sniffed from the head of a file."""
+import re
+from pkrsplitter.patterns import ggpoker, pokerstars, winamax
+
+# Number of bytes read from the beginning of a raw history file to recognize its room
+SNIFF_SIZE = 512
+DEFAULT_ROOM = "winamax"
+
+
+class Room:
+    """
+    The history format of a poker room, with its patterns compiled once for text and bytes
+
+    Attributes:
+        name (str): The name of the room
+        sniff_regex (re.Pattern): The pattern found at the beginning of the history files of the room
+        new_hand_regex (re.Pattern): The new hand marker
+        hand_id_regex (re.Pattern): The hand id, in a "hand_id" group, searched in a hand text
+        sniff_bytes_regex (re.Pattern): The bytes version of sniff_regex
+        new_hand_bytes_regex (re.Pattern): The bytes version of new_hand_regex
+        hand_id_bytes_regex (re.Pattern): The bytes version of hand_id_regex
+    """
+    __slots__ = ("name", "sniff_regex", "new_hand_regex", "hand_id_regex", "sniff_bytes_regex",
+                 "new_hand_bytes_regex", "hand_id_bytes_regex")
+
+    def __init__(self, name: str, sniff_pattern: str, new_hand_pattern: str, hand_id_pattern: str):
+        self.name = name
+        self.sniff_regex = re.compile(sniff_pattern)
+        self.new_hand_regex = re.compile(new_hand_pattern)
+        self.hand_id_regex = re.compile(hand_id_pattern)
+        self.sniff_bytes_regex = re.compile(sniff_pattern.encode())
+        self.new_hand_bytes_regex = re.compile(new_hand_pattern.encode())
+        self.hand_id_bytes_regex = re.compile(hand_id_pattern.encode())
+
+    def __repr__(self) -> str:
+        return f"Room({self.name!r})"
+
+
+ROOMS = {}
+
+
+def register_room(name: str, sniff_pattern: str, new_hand_pattern: str, hand_id_pattern: str) -> Room:
+    """
+    Registers the history format of a poker room, replacing any room with the same name
+    Args:
+        name (str): The name of the room
+        sniff_pattern (str): The pattern found at the beginning of the history files of the room
+        new_hand_pattern (str): The new hand marker, excluded from the hand texts
+        hand_id_pattern (str): The hand id, in a "hand_id" group, searched in a hand text
+
+    Returns:
+        room (Room): The registered room, with its compiled patterns
+    """
+    room = Room(name, sniff_pattern, new_hand_pattern, hand_id_pattern)
+    ROOMS[name] = room
+    return room
+
+
+def get_room(name: str) -> Room:
+    """
+    Returns a registered room
+    Args:
+        name (str): The name of the room
+
+    Returns:
+        room (Room): The room, with its compiled patterns
+    """
+    try:
+        return ROOMS[name]
+    except KeyError:
+        raise ValueError(f"Unknown room {name}, expected one of {tuple(ROOMS)}")
+
+
+def sniff_room(head) -> Room:
+    """
+    Recognizes the room of a raw history file from its first bytes
+    Args:
+        head (str | bytes-like): The beginning of the raw history file, SNIFF_SIZE bytes are enough
+
+    Returns:
+        room (Room): The room whose pattern is found first in the head, or the default room if none is found
+    """
+    is_text = isinstance(head, str)
+    sniffed_room, sniffed_start = ROOMS[DEFAULT_ROOM], None
+    for room in ROOMS.values():
+        match = (room.sniff_regex if is_text else room.sniff_bytes_regex).search(head)
+        if match is not None and (sniffed_start is None or match.start() < sniffed_start):
+            sniffed_room, sniffed_start = room, match.start()
+    return sniffed_room
+
+
+for room_patterns in (winamax, pokerstars, ggpoker):
+    register_room(room_patterns.__name__.rsplit(".", 1)[-1], room_patterns.SNIFF_PATTERN,
+                  room_patterns.NEW_HAND_PATTERN, room_patterns.HAND_ID_PATTERN)
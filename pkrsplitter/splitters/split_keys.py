@@ -0,0 +1,104 @@
+"""This module defines the SplitKeysCache class, which lists the existing split keys in bulk."""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Iterable
+
+DEFAULT_MAX_PARTITIONS = 8
+
+
+class SplitKeysCache:
+    """
+    A thread-safe cache of the existing split keys, grouped by split directory.
+    The keys of a whole partition (the parent directory of the split directories, e.g. a day) are listed
+    with a single paginated listing the first time one of its split directories is requested,
+    so that the existence of thousands of split files is checked in memory.
+
+    The listing function returns the split keys, or a dict mapping them to a fingerprint of their content
+    (an ETag or a size) to compare the existing files with the hands to write. The keys written during the run are
+    added to their listed partition, so that the later checks see them without listing the partition again.
+
+    Methods:
+        get_split_dir_keys: Returns the existing keys of a split directory
+        add_split_keys: Adds the keys of the split files written during the run
+
+    Examples:
+        cache = SplitKeysCache(splitter.list_split_keys)
+        existing_keys = cache.get_split_dir_keys(splitter.get_destination_dir(raw_key))
+    """
+
+    def __init__(self, list_split_keys: Callable[[str], Iterable], max_partitions: int = DEFAULT_MAX_PARTITIONS):
+        """
+        Initializes the SplitKeysCache class
+        Args:
+            list_split_keys: The function listing all the split keys under a directory, or their fingerprints
+            max_partitions: The maximum number of listed partitions kept in memory
+        """
+        self.list_split_keys = list_split_keys
+        self.max_partitions = max_partitions
+        self._partitions = OrderedDict()
+        # The keys written to each listed partition, by split directory
+        self._written_keys = {}
+        self._lock = threading.Lock()
+
+    def _list_partition(self, partition: str) -> dict:
+        split_keys = self.list_split_keys(partition)
+        if not isinstance(split_keys, dict):
+            split_keys = dict.fromkeys(split_keys)
+        split_dirs = {}
+        for split_key, fingerprint in split_keys.items():
+            split_dir = split_key.rsplit("/", 1)[0]
+            split_dirs.setdefault(split_dir, {})[split_key] = fingerprint
+        return split_dirs
+
+    def get_split_dir_keys(self, split_dir: str) -> dict:
+        """
+        Returns the existing keys of a split directory, listing its whole partition if needed
+        Args:
+            split_dir (str): The split directory of a raw history file
+
+        Returns:
+            split_keys (dict): The keys of the split files already in the directory, mapped to their fingerprint,
+                or to None if the listing has no fingerprints
+        """
+        partition = os.path.dirname(split_dir)
+        with self._lock:
+            future = self._partitions.get(partition)
+            owner = future is None
+            if owner:
+                future = self._partitions[partition] = Future()
+                self._written_keys[partition] = {}
+                while len(self._partitions) > self.max_partitions:
+                    evicted_partition, _ = self._partitions.popitem(last=False)
+                    self._written_keys.pop(evicted_partition, None)
+            else:
+                self._partitions.move_to_end(partition)
+        if owner:
+            try:
+                future.set_result(self._list_partition(partition))
+            except BaseException as error:
+                with self._lock:
+                    self._partitions.pop(partition, None)
+                    self._written_keys.pop(partition, None)
+                future.set_exception(error)
+        split_keys = future.result().get(split_dir, {})
+        with self._lock:
+            written_keys = self._written_keys.get(partition, {}).get(split_dir)
+            if written_keys:
+                split_keys = {**split_keys, **written_keys}
+        return split_keys
+
+    def add_split_keys(self, split_keys: Iterable[str]):
+        """
+        Adds the keys of split files written during the run to their partition, if it is listed. The keys of a
+        partition which is not listed are found by its listing.
+        Args:
+            split_keys (Iterable[str]): The keys of the written split files, whose fingerprint is unknown
+        """
+        with self._lock:
+            for split_key in split_keys:
+                split_dir = split_key.rsplit("/", 1)[0]
+                written_keys = self._written_keys.get(os.path.dirname(split_dir))
+                if written_keys is not None:
+                    written_keys.setdefault(split_dir, {})[split_key] = None
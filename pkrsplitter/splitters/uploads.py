@@ -0,0 +1,345 @@
+"""This module defines the BatchUploader class, which uploads many split files with retries and adaptive concurrency."""
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable
+
+DEFAULT_UPLOAD_WORKERS = 64
+DEFAULT_MIN_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 8
+DEFAULT_BASE_DELAY = 0.05
+DEFAULT_MAX_DELAY = 5.0
+# S3 supports at least 3,500 PUT requests per second per partitioned prefix
+DEFAULT_PREFIX_RATE = 3500.0
+THROTTLING_ERROR_CODES = ("SlowDown", "Throttling", "ThrottlingException", "RequestLimitExceeded",
+                          "TooManyRequestsException", "RequestThrottled")
+RETRYABLE_ERROR_CODES = THROTTLING_ERROR_CODES + ("InternalError", "ServiceUnavailable", "RequestTimeout")
+
+
+def get_error_code(error: Exception) -> str:
+    """
+    Returns the error code of a botocore ClientError, or of any error with the same response attribute
+    Args:
+        error (Exception): The error raised by a request
+
+    Returns:
+        error_code (str): The error code, or None if the error has no response
+    """
+    response = getattr(error, "response", None)
+    if not isinstance(response, dict):
+        return None
+    return response.get("Error", {}).get("Code")
+
+
+def get_error_status(error: Exception) -> int:
+    """
+    Returns the HTTP status code of a botocore ClientError
+    Args:
+        error (Exception): The error raised by a request
+
+    Returns:
+        status_code (int): The HTTP status code, or None if the error has no response
+    """
+    response = getattr(error, "response", None)
+    if not isinstance(response, dict):
+        return None
+    return response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+
+
+def is_throttling_error(error: Exception) -> bool:
+    """
+    Checks if a request failed because S3 throttled it, e.g. with a 503 SlowDown
+    Args:
+        error (Exception): The error raised by a request
+
+    Returns:
+        is_throttling (bool): True if the request was throttled
+    """
+    return get_error_code(error) in THROTTLING_ERROR_CODES or get_error_status(error) in (429, 503)
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Checks if a failed request can be retried: throttling, server errors and connection errors
+    Args:
+        error (Exception): The error raised by a request
+
+    Returns:
+        is_retryable (bool): True if the request can be retried
+    """
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    status_code = get_error_status(error)
+    return (get_error_code(error) in RETRYABLE_ERROR_CODES
+            or status_code is not None and (status_code == 429 or status_code >= 500))
+
+
+class AdaptiveConcurrency:
+    """
+    A semaphore whose limit follows an AIMD policy: it grows by one request after a full window of successes,
+    and is halved on throttling, so that the number of requests in flight settles under the throttling point.
+
+    Methods:
+        acquire: Waits for a slot under the current limit
+        release: Frees a slot
+        on_success: Increases the limit additively
+        on_throttle: Decreases the limit multiplicatively
+    """
+
+    def __init__(self, max_concurrency: int, min_concurrency: int = DEFAULT_MIN_CONCURRENCY):
+        """
+        Initializes the AdaptiveConcurrency class
+        Args:
+            max_concurrency: The maximum and initial number of requests in flight
+            min_concurrency: The minimum number of requests in flight
+        """
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min(min_concurrency, max_concurrency)
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def on_success(self):
+        with self._condition:
+            if self.limit < self.max_concurrency:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+                self._condition.notify()
+
+    def on_throttle(self):
+        with self._condition:
+            self.limit = max(self.min_concurrency, self.limit / 2)
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket limiting the rate of requests
+
+    Methods:
+        acquire: Waits for a token
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        Initializes the TokenBucket class
+        Args:
+            rate: The number of tokens added per second
+            capacity: The maximum number of tokens, i.e. the largest burst, defaults to one second of tokens
+        """
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+class BatchUploader:
+    """
+    Uploads split files to S3 from a dedicated pool of upload workers.
+    Each request is retried with jittered exponential backoff on throttling and server errors, the number of requests
+    in flight adapts to throttling, and the request rate of each key prefix is shaped by a token bucket.
+
+    Methods:
+        get_key_prefix: Returns the prefix of a key whose request rate is limited
+        upload: Uploads a file in the calling thread, with retries
+        submit: Queues the upload of a file to the upload workers
+        upload_many: Uploads files concurrently and waits for all of them
+        shutdown: Stops the upload workers
+
+    Examples:
+        uploader = BatchUploader(lambda key, body: s3.put_object(Bucket=BUCKET_NAME, Key=key, Body=body))
+        uploader.upload_many((key, text.encode("utf-8")) for key, text in split_files)
+    """
+
+    def __init__(self, put_object: Callable[[str, bytes], object], max_workers: int = DEFAULT_UPLOAD_WORKERS,
+                 min_concurrency: int = DEFAULT_MIN_CONCURRENCY, max_retries: int = DEFAULT_MAX_RETRIES,
+                 base_delay: float = DEFAULT_BASE_DELAY, max_delay: float = DEFAULT_MAX_DELAY,
+                 prefix_rate: float = DEFAULT_PREFIX_RATE, prefix_depth: int = None,
+                 on_retry: Callable[[str, Exception], None] = None):
+        """
+        Initializes the BatchUploader class
+        Args:
+            put_object: The function uploading the body of a key, in a single request
+            max_workers: The number of upload workers, which is also the maximum number of requests in flight
+            min_concurrency: The number of requests in flight under which throttling does not lower the limit
+            max_retries: The number of retries of a request before its error is raised
+            base_delay: The delay in seconds of the first retry, doubled at each retry
+            max_delay: The maximum delay in seconds between two retries
+            prefix_rate: The maximum number of requests per second to each key prefix, or None for no limit
+            prefix_depth: The number of leading key components forming the rate limited prefix, such as the date
+                partition of the split files, or None for the directory of each key
+            on_retry: Called with the key and the error of each retried request
+        """
+        self.put_object = put_object
+        self.max_workers = max_workers
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.prefix_rate = prefix_rate
+        self.prefix_depth = prefix_depth
+        self.on_retry = on_retry
+        self.concurrency = AdaptiveConcurrency(max_workers, min_concurrency)
+        self.retries_count = 0
+        self.throttles_count = 0
+        self._prefix_buckets = {}
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        for name in ("concurrency", "_prefix_buckets", "_lock", "_pool"):
+            state.pop(name)
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.concurrency = AdaptiveConcurrency(self.max_workers, self.min_concurrency)
+        self._prefix_buckets = {}
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def get_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="upload")
+            return self._pool
+
+    def get_key_prefix(self, file_key: str) -> str:
+        """
+        Returns the prefix of a key whose request rate is limited
+        Args:
+            file_key (str): The key of the file to upload
+
+        Returns:
+            prefix (str): The first prefix_depth components of the key, or its directory without a prefix depth
+        """
+        if self.prefix_depth is None:
+            return file_key.rsplit("/", 1)[0]
+        return "/".join(file_key.split("/")[:self.prefix_depth])
+
+    def wait_for_prefix(self, file_key: str):
+        """
+        Waits until a request to the prefix of a key fits in the prefix rate
+        Args:
+            file_key (str): The key of the file to upload
+        """
+        if not self.prefix_rate:
+            return
+        prefix = self.get_key_prefix(file_key)
+        with self._lock:
+            bucket = self._prefix_buckets.get(prefix)
+            if bucket is None:
+                bucket = self._prefix_buckets[prefix] = TokenBucket(self.prefix_rate)
+        bucket.acquire()
+
+    def get_retry_delay(self, attempt: int) -> float:
+        """
+        Returns the delay before a retry, with full jitter
+        Args:
+            attempt (int): The number of the failed attempt, starting at 0
+
+        Returns:
+            delay (float): A random delay in seconds, between 0 and the exponential backoff
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def put_with_retries(self, file_key: str, body: bytes):
+        attempt = 0
+        while True:
+            self.wait_for_prefix(file_key)
+            try:
+                self.put_object(file_key, body)
+            except Exception as error:
+                if attempt >= self.max_retries or not is_retryable_error(error):
+                    raise
+                with self._lock:
+                    self.retries_count += 1
+                    if is_throttling_error(error):
+                        self.throttles_count += 1
+                if is_throttling_error(error):
+                    self.concurrency.on_throttle()
+                if self.on_retry is not None:
+                    self.on_retry(file_key, error)
+                time.sleep(self.get_retry_delay(attempt))
+                attempt += 1
+            else:
+                self.concurrency.on_success()
+                return
+
+    def upload(self, file_key: str, body: bytes):
+        """
+        Uploads a file in the calling thread, with retries
+        Args:
+            file_key (str): The key of the file
+            body (bytes): The content of the file
+        """
+        self.concurrency.acquire()
+        try:
+            self.put_with_retries(file_key, body)
+        finally:
+            self.concurrency.release()
+
+    def submit(self, file_key: str, body: bytes) -> Future:
+        """
+        Queues the upload of a file to the upload workers, waiting first for a slot under the concurrency limit
+        so that the files waiting to be uploaded stay bounded
+        Args:
+            file_key (str): The key of the file
+            body (bytes): The content of the file
+
+        Returns:
+            future (Future): The future of the upload
+        """
+        self.concurrency.acquire()
+        try:
+            future = self.get_pool().submit(self.put_with_retries, file_key, body)
+        except BaseException:
+            self.concurrency.release()
+            raise
+        future.add_done_callback(lambda _: self.concurrency.release())
+        return future
+
+    def upload_many(self, files: Iterable[tuple]):
+        """
+        Uploads files concurrently and waits for all of them, raising the first error once they are done
+        Args:
+            files (Iterable[tuple]): Tuples of the key and the content bytes of each file, consumed lazily
+        """
+        futures = [self.submit(file_key, body) for file_key, body in files]
+        for future in futures:
+            future.exception()
+        for future in futures:
+            future.result()
+
+    def shutdown(self):
+        """
+        Stops the upload workers once the queued uploads are done
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
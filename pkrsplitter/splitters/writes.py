@@ -0,0 +1,233 @@
+"""This module defines the BatchFileWriter class, which writes many small local files atomically and in batches."""
+import os
+import shutil
+import threading
+from typing import Iterable
+
+DEFAULT_BATCH_SIZE = 256
+TEMP_SUFFIX = ".tmp"
+# O_BINARY only exists on Windows, where files are opened in text mode by default
+WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+# The files of a staging directory are opened relative to it, so that its path is only resolved once
+USE_DIR_FD = os.open in os.supports_dir_fd
+# os.sync flushes all the files of a batch at once, where it exists, instead of a fsync per file
+SYNC_ONCE = hasattr(os, "sync")
+
+
+def fsync_directory(directory: str):
+    """
+    Syncs a directory to disk, so that the files renamed into it survive a crash
+    Args:
+        directory (str): The path of the directory
+    """
+    if os.name == "nt":
+        # Directories cannot be opened on Windows, where renames are journaled by NTFS
+        return
+    directory_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(directory_fd)
+    finally:
+        os.close(directory_fd)
+
+
+class BatchFileWriter:
+    """
+    Writes many small files, such as the split hands of a raw file, so that a crash never leaves a partial file.
+    The files of a directory that does not exist yet, such as the split directory of a new raw file, are written to
+    a staging directory next to it, which is renamed into place once all of them are written: the directory is
+    created once, and a single rename publishes all its files. The files of an existing directory are each written
+    to a temporary file next to them, and renamed over them in batches. The files are written with raw file
+    descriptors, without the buffering and decoding layers of text files, and the files of a staging directory are
+    opened relative to it.
+    With fsync, the files of a batch are synced at once before being renamed, with a fsync per file where os.sync
+    does not exist, and each directory is synced once per batch, so that a crash keeps either the previous or the
+    new version of each file.
+
+    Methods:
+        write: Writes a single file atomically
+        write_chunks: Writes a single large file atomically from its chunks
+        write_many: Writes many files atomically, in batches
+    """
+
+    def __init__(self, fsync: bool = False, batch_size: int = DEFAULT_BATCH_SIZE):
+        """
+        Initializes the BatchFileWriter class
+        Args:
+            fsync: Whether the files are synced to disk before being renamed into place
+            batch_size: The number of files of an existing directory renamed together, after which it is synced
+        """
+        self.fsync = fsync
+        self.batch_size = batch_size
+
+    @staticmethod
+    def get_temp_key(file_key: str, index: int = 0) -> str:
+        """
+        Returns the key of the temporary file, or staging directory, of a file or directory. It is unique per process,
+        thread and index in a batch, so that concurrent workers, or a file written twice in a batch, never share it.
+        Args:
+            file_key (str): The key of the file or directory
+            index (int): The index of the file in its batch
+
+        Returns:
+            temp_key (str): The key of the temporary file or directory
+        """
+        return f"{file_key}.{os.getpid()}-{threading.get_ident()}-{index}{TEMP_SUFFIX}"
+
+    def write_temp_file(self, temp_key: str, content: bytes, dir_fd: int = None):
+        """
+        Writes the content of a file to its temporary file, which is removed if the write fails
+        Args:
+            temp_key (str): The key of the temporary file, relative to dir_fd if given
+            content (bytes): The content of the file, or any bytes-like object such as a memoryview
+            dir_fd (int): The descriptor of the directory of the temporary file, or None
+        """
+        file_fd = os.open(temp_key, WRITE_FLAGS, 0o666, dir_fd=dir_fd)
+        try:
+            with memoryview(content) as view:
+                while view:
+                    view = view[os.write(file_fd, view):]
+            if self.fsync and not SYNC_ONCE:
+                os.fsync(file_fd)
+        except BaseException:
+            os.close(file_fd)
+            os.remove(temp_key, dir_fd=dir_fd)
+            raise
+        os.close(file_fd)
+
+    def sync_batch(self):
+        """
+        Syncs the temporary files written since the last batch to disk at once, before they are renamed into place
+        """
+        if self.fsync and SYNC_ONCE:
+            os.sync()
+
+    def write(self, file_key: str, content: bytes):
+        """
+        Writes a single file atomically, creating its directory if needed
+        Args:
+            file_key (str): The key of the file
+            content (bytes): The content of the file
+        """
+        self.write_many([(file_key, content)])
+
+    def write_chunks(self, file_key: str, chunks: Iterable[bytes]):
+        """
+        Writes a single large file atomically from its chunks, so that its content is never held whole in memory
+        Args:
+            file_key (str): The key of the file
+            chunks (Iterable[bytes]): The chunks of the content of the file, consumed lazily
+        """
+        os.makedirs(os.path.dirname(file_key) or ".", exist_ok=True)
+        temp_key = self.get_temp_key(file_key)
+        try:
+            with open(temp_key, "wb") as file:
+                file.writelines(chunks)
+                if self.fsync:
+                    file.flush()
+                    os.fsync(file.fileno())
+        except BaseException:
+            os.remove(temp_key)
+            raise
+        self.commit_renames([(temp_key, file_key)])
+
+    def write_many(self, files: Iterable[tuple]) -> int:
+        """
+        Writes many files atomically, staging the files of the directories that do not exist yet
+        Args:
+            files (Iterable[tuple]): Tuples of the key and the content bytes of each file, consumed lazily
+
+        Returns:
+            files_count (int): The number of files written
+        """
+        files_count = 0
+        existing_dirs = set()
+        staging_dirs = {}
+        staging_fds = {}
+        renames = []
+        try:
+            for file_key, content in files:
+                directory, file_name = os.path.split(file_key)
+                directory = directory or "."
+                if directory not in existing_dirs and directory not in staging_dirs:
+                    if os.path.isdir(directory):
+                        existing_dirs.add(directory)
+                    else:
+                        staging_dirs[directory] = self.get_temp_key(directory)
+                        os.makedirs(staging_dirs[directory])
+                        if USE_DIR_FD:
+                            staging_fds[directory] = os.open(staging_dirs[directory], os.O_RDONLY)
+                files_count += 1
+                if directory in staging_fds:
+                    self.write_temp_file(file_name, content, staging_fds[directory])
+                    continue
+                if directory in staging_dirs:
+                    self.write_temp_file(os.path.join(staging_dirs[directory], file_name), content)
+                    continue
+                temp_key = self.get_temp_key(file_key, len(renames))
+                self.write_temp_file(temp_key, content)
+                renames.append((temp_key, file_key))
+                if len(renames) >= self.batch_size:
+                    self.sync_batch()
+                    self.commit_renames(renames)
+                    renames = []
+            self.close_dir_fds(staging_fds)
+            self.sync_batch()
+            self.commit_renames(renames)
+            renames = []
+            for directory, staging_dir in list(staging_dirs.items()):
+                self.commit_staging_dir(staging_dir, directory)
+                del staging_dirs[directory]
+        except BaseException:
+            self.close_dir_fds(staging_fds)
+            for temp_key, _ in renames:
+                if os.path.exists(temp_key):
+                    os.remove(temp_key)
+            for staging_dir in staging_dirs.values():
+                shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+        return files_count
+
+    @staticmethod
+    def close_dir_fds(dir_fds: dict):
+        """
+        Closes the descriptors of the staging directories
+        Args:
+            dir_fds (dict): The descriptor of each staging directory, emptied once they are closed
+        """
+        for dir_fd in dir_fds.values():
+            os.close(dir_fd)
+        dir_fds.clear()
+
+    def commit_renames(self, renames: list):
+        """
+        Renames temporary files into place, then syncs each of their directories once
+        Args:
+            renames (list): Tuples of the temporary key and the key of each file
+        """
+        for temp_key, file_key in renames:
+            os.replace(temp_key, file_key)
+        if self.fsync:
+            for directory in {os.path.dirname(file_key) or "." for _, file_key in renames}:
+                fsync_directory(directory)
+
+    def commit_staging_dir(self, staging_dir: str, directory: str):
+        """
+        Renames a staging directory into place. If the directory was created in the meantime, e.g. by another
+        worker, the staged files are renamed into it one by one instead.
+        Args:
+            staging_dir (str): The staging directory holding the written files
+            directory (str): The directory of the files
+        """
+        if self.fsync:
+            fsync_directory(staging_dir)
+        try:
+            os.rename(staging_dir, directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+            with os.scandir(staging_dir) as entries:
+                self.commit_renames([(entry.path, os.path.join(directory, entry.name)) for entry in entries])
+            os.rmdir(staging_dir)
+            return
+        if self.fsync:
+            fsync_directory(os.path.dirname(directory) or ".")
@@ -0,0 +1,65 @@
+"""This module tests the incremental splitting of the hands appended to history files still being written."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from history_generator import RAW_HISTORY_DIR, generate_raw_text, get_raw_key
+from pkrsplitter.splitters.engine import NEW_HAND_BYTES_REGEX, get_complete_hands_end
+from pkrsplitter.splitters.local import LocalFileSplitter
+
+RAW_BYTES = generate_raw_text(0, hands_count=6, hand_size=1).encode("utf-8")
+HAND_STARTS = [match.start() for match in NEW_HAND_BYTES_REGEX.finditer(RAW_BYTES)]
+
+
+def write_raw_bytes(raw_key: str, raw_bytes: bytes):
+    os.makedirs(os.path.dirname(raw_key), exist_ok=True)
+    with open(raw_key, "wb") as file:
+        file.write(raw_bytes)
+
+
+def test_complete_hands_end():
+    assert len(HAND_STARTS) == 6
+    # A trailing hand is complete once followed by blank lines
+    assert RAW_BYTES.endswith(b"\n\n")
+    assert get_complete_hands_end(RAW_BYTES) == len(RAW_BYTES)
+    assert get_complete_hands_end(RAW_BYTES.replace(b"\n", b"\r\n")) == len(RAW_BYTES.replace(b"\n", b"\r\n"))
+    # A hand cut in the middle, or whose next marker is only partly written, is left for the next run
+    assert get_complete_hands_end(RAW_BYTES[:HAND_STARTS[3] + 40]) == HAND_STARTS[3]
+    assert get_complete_hands_end(RAW_BYTES[:HAND_STARTS[3] + 5]) == HAND_STARTS[2]
+    # Bytes read up to a new hand marker end with the blank lines of the hand before it
+    assert get_complete_hands_end(RAW_BYTES[:HAND_STARTS[3]]) == HAND_STARTS[3]
+    assert get_complete_hands_end(RAW_BYTES[:HAND_STARTS[0] + 5]) == 0
+    assert get_complete_hands_end(b"") == 0
+
+
+def test_appended_hands_are_split_from_the_recorded_offset(tmp_path):
+    data_dir = str(tmp_path)
+    raw_key = get_raw_key(os.path.join(data_dir, RAW_HISTORY_DIR), 0, os.sep)
+    write_raw_bytes(raw_key, RAW_BYTES[:HAND_STARTS[3] + 40])
+    splitter = LocalFileSplitter(data_dir)
+    split_jobs = []
+    splitter.split_appended_files(on_split=split_jobs.append)
+    assert [len(job.destination_keys) for job in split_jobs] == [3]
+    # The offset is the start of the partial hand, in bytes
+    assert splitter.manifest.get(raw_key).offset == HAND_STARTS[3]
+
+    write_raw_bytes(raw_key, RAW_BYTES)
+    split_jobs.clear()
+    splitter.split_appended_files(on_split=split_jobs.append)
+    assert [len(job.destination_keys) for job in split_jobs] == [3]
+    entry = splitter.manifest.get(raw_key)
+    assert entry.offset == len(RAW_BYTES)
+    assert len(entry.hand_ids) == 6
+    expected_hands = LocalFileSplitter(data_dir).get_separated_hands_info(raw_key)
+    assert all(splitter.read_split_hand(destination_key) == hand_text for destination_key, hand_text in expected_hands)
+
+    split_jobs.clear()
+    splitter.split_appended_files(on_split=split_jobs.append)
+    assert split_jobs == []
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
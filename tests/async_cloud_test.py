@@ -0,0 +1,74 @@
+"""This module tests the AsyncCloudFileSplitter against a fake S3: listing, splitting and skipping the split files."""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_s3
+from fake_s3 import AsyncFakeS3, FakeS3
+from upload_test import BUCKET_NAME, RAW_DIR, fill_bucket
+from pkrsplitter.splitters.async_cloud import AsyncCloudFileSplitter
+
+FILES_COUNT = 5
+HANDS_COUNT = 4
+
+
+def create_splitter(s3: FakeS3, get_concurrency: int = 8) -> AsyncCloudFileSplitter:
+    splitter = AsyncCloudFileSplitter(BUCKET_NAME, get_concurrency=get_concurrency)
+    splitter.s3 = AsyncFakeS3(s3)
+    return splitter
+
+
+def count_puts(splitter: AsyncCloudFileSplitter) -> int:
+    return sum(operation_name == "put_object" for operation_name, _ in splitter.s3.requests)
+
+
+def test_async_listing_and_split():
+    s3 = FakeS3()
+    fill_bucket(s3, FILES_COUNT, HANDS_COUNT)
+    splitter = create_splitter(s3)
+    raw_keys = asyncio.run(splitter.list_raw_histories_keys())
+    assert len(raw_keys) == FILES_COUNT
+    assert all(raw_key.startswith(f"{RAW_DIR}/") for raw_key in raw_keys)
+    asyncio.run(splitter.split_files())
+    split_keys = asyncio.run(splitter.list_split_keys("data/histories/split"))
+    assert len(split_keys) == FILES_COUNT * HANDS_COUNT
+    assert count_puts(splitter) == FILES_COUNT * HANDS_COUNT
+    split_key = f"{splitter.get_destination_dir(raw_keys[0])}/1000-1-1705348800.txt"
+    assert "HandId: #1000-1-1705348800 " in asyncio.run(splitter.get_file_content(split_key))
+
+
+def test_async_split_skips_existing_files():
+    s3 = FakeS3()
+    fill_bucket(s3, FILES_COUNT, HANDS_COUNT)
+    asyncio.run(create_splitter(s3).split_files())
+    splitter = create_splitter(s3)
+    asyncio.run(splitter.split_new_histories())
+    asyncio.run(splitter.split_new_files())
+    assert count_puts(splitter) == 0
+
+
+def test_async_listing_holds_semaphore_per_page(monkeypatch):
+    monkeypatch.setattr(fake_s3, "LIST_PAGE_SIZE", 2)
+    s3 = FakeS3()
+    fill_bucket(s3, FILES_COUNT, HANDS_COUNT)
+    s3.put_object(Bucket=BUCKET_NAME, Key="data/correction_raw_keys.txt", Body=b"")
+    splitter = create_splitter(s3, get_concurrency=1)
+
+    async def list_while_reading():
+        return await asyncio.gather(splitter.list_raw_histories_keys(),
+                                    splitter.get_file_content(splitter.correction_raw_keys_file_key))
+
+    raw_keys, _ = asyncio.run(list_while_reading())
+    assert len(raw_keys) == FILES_COUNT
+    operation_names = [operation_name for operation_name, _ in splitter.s3.requests]
+    assert operation_names.count("list_objects_v2") == 3
+    # With a single request slot, the read is sent between two pages instead of after the whole listing
+    assert operation_names.index("get_object") < len(operation_names) - 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,241 @@
+"""This module benchmarks the split runs on generated histories, on local and fake S3 backends, and saves the results."""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from history_generator import (write_local_histories, put_bucket_histories, DEFAULT_FILES_COUNT, DEFAULT_HANDS_COUNT,
+                               DEFAULT_HAND_SIZE, DEFAULT_SEED)
+from reports import BASE_DIR, REPORTS_DIR, get_results_path
+
+BENCHMARK_RESULTS_PATH = os.path.join(REPORTS_DIR, "benchmark_results.json")
+BACKENDS = ("local", "s3")
+RUNS = ("split", "split-new", "correct")
+BUCKET_NAME = "benchmark-bucket"
+# Share of the files added after a first split, which split-new has to split
+NEW_FILES_RATIO = 0.1
+# A result is a regression when its throughput drops, or its peak memory grows, by more than this share
+REGRESSION_TOLERANCE = 0.1
+
+
+def get_rss_mb() -> float:
+    """
+    Returns the peak resident set size of the current process
+    Returns:
+        peak_rss_mb (float): The peak RSS in megabytes
+    """
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak_rss / 1024 ** 2 if sys.platform == "darwin" else peak_rss / 1024
+
+
+def create_splitter(backend: str, data_dir: str, s3, executor_type: str):
+    if backend == "s3":
+        from pkrsplitter.splitters.cloud import CloudFileSplitter
+        return CloudFileSplitter(BUCKET_NAME, s3_client=s3, executor_type=executor_type)
+    from pkrsplitter.splitters.local import LocalFileSplitter
+    return LocalFileSplitter(data_dir, executor_type=executor_type)
+
+
+def prepare_run(backend: str, run: str, data_dir: str, generator_options: dict):
+    """
+    Generates the histories of a run, and splits them first for the split-new and correction runs
+    Args:
+        backend (str): "local" or "s3"
+        run (str): "split", "split-new" or "correct"
+        data_dir (str): The local data directory
+        generator_options (dict): The files_count, hands_count, hand_size and seed options of the generator
+
+    Returns:
+        s3: The FakeS3 holding the histories, or None for the local backend
+    """
+    s3 = None
+    files_count = generator_options["files_count"]
+    if backend == "s3":
+        from fake_s3 import FakeS3
+        s3 = FakeS3(seed=generator_options["seed"])
+        raw_keys = put_bucket_histories(s3, BUCKET_NAME, **generator_options)
+    else:
+        raw_keys = write_local_histories(data_dir, **generator_options)
+    if run == "split":
+        return s3
+    splitter = create_splitter(backend, data_dir, s3, "thread")
+    splitter.split_files()
+    if run == "split-new":
+        new_files_options = dict(generator_options, files_count=max(1, int(files_count * NEW_FILES_RATIO)),
+                                 first_file_number=files_count)
+        if backend == "s3":
+            put_bucket_histories(s3, BUCKET_NAME, **new_files_options)
+        else:
+            write_local_histories(data_dir, **new_files_options)
+    else:
+        splitter.write_file(splitter.correction_raw_keys_file_key, "\n".join(raw_keys))
+    return s3
+
+
+def run_benchmark(backend: str, run: str, executor_type: str = "thread", **generator_options) -> dict:
+    """
+    Runs a benchmark in the current process, whose peak memory is only the one of this benchmark
+    Args:
+        backend (str): "local" or "s3"
+        run (str): "split", "split-new" or "correct"
+        executor_type (str): The executor of the splitter
+        generator_options: The files_count, hands_count, hand_size and seed options of the generator
+
+    Returns:
+        result (dict): The counts, duration, throughputs and peak memory of the run
+    """
+    from pkrsplitter.cli import COMMANDS, ProgressReporter
+    data_dir = tempfile.mkdtemp(prefix="pkrsplitter_benchmark_")
+    try:
+        s3 = prepare_run(backend, run, data_dir, generator_options)
+        setup_rss_mb = get_rss_mb()
+        splitter = create_splitter(backend, data_dir, s3, executor_type)
+        progress = ProgressReporter(float("inf"))
+        start = time.perf_counter()
+        getattr(splitter, COMMANDS[run])(on_split=progress.on_split)
+        seconds = time.perf_counter() - start
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    # The sizes of the raw files are not listed by correction runs
+    megabytes = progress.bytes_count / 1024 ** 2 if progress.bytes_count else None
+    return {
+        "backend": backend,
+        "run": run,
+        "executor": executor_type,
+        "files": progress.files_count,
+        "hands": progress.hands_count,
+        "megabytes": round(megabytes, 3) if megabytes is not None else None,
+        "seconds": round(seconds, 4),
+        "files_per_second": round(progress.files_count / seconds, 2),
+        "hands_per_second": round(progress.hands_count / seconds, 1),
+        "megabytes_per_second": round(megabytes / seconds, 3) if megabytes is not None else None,
+        "setup_rss_mb": round(setup_rss_mb, 1),
+        "peak_rss_mb": round(get_rss_mb(), 1),
+    }
+
+
+def run_benchmark_process(backend: str, run: str, executor_type: str, generator_options: dict) -> dict:
+    """
+    Runs a benchmark in a new interpreter, so that its peak memory is not shared with the other benchmarks
+    Args:
+        backend (str): "local" or "s3"
+        run (str): "split", "split-new" or "correct"
+        executor_type (str): The executor of the splitter
+        generator_options (dict): The files_count, hands_count, hand_size and seed options of the generator
+
+    Returns:
+        result (dict): The result of run_benchmark
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--child", backend, run, "--executor", executor_type,
+               "--files", str(generator_options["files_count"]), "--hands", str(generator_options["hands_count"]),
+               "--hand-size", str(generator_options["hand_size"]), "--seed", str(generator_options["seed"])]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (BASE_DIR, os.environ.get("PYTHONPATH")))))
+    output = subprocess.run(command, capture_output=True, text=True, check=True, env=env).stdout
+    # The splitters print their progress, the result is the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def get_environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=BASE_DIR).stdout.strip()
+    except OSError:
+        commit = ""
+    with open(os.path.join(BASE_DIR, "config", "version.json")) as file:
+        version = json.load(file)
+    return {
+        "version": f"{version['major']}.{version['minor']}.{version['patch']}",
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare_results(baseline: dict, results: dict, tolerance: float = REGRESSION_TOLERANCE) -> list:
+    """
+    Compares benchmark results with the results of a baseline version
+    Args:
+        baseline (dict): The results of the baseline version, as saved by test_benchmark
+        results (dict): The results of the current version
+        tolerance (float): The share of throughput drop or memory growth tolerated
+
+    Returns:
+        regressions (list): The descriptions of the regressions
+    """
+    if baseline.get("parameters") != results["parameters"]:
+        print("The baseline was run with other parameters, the comparison is only indicative")
+    baseline_results = {(result["backend"], result["run"], result["executor"]): result
+                        for result in baseline["results"]}
+    regressions = []
+    for result in results["results"]:
+        baseline_result = baseline_results.get((result["backend"], result["run"], result["executor"]))
+        if baseline_result is None:
+            continue
+        name = f"{result['backend']} {result['run']} ({result['executor']})"
+        speed_ratio = result["hands_per_second"] / max(baseline_result["hands_per_second"], 1e-9)
+        memory_ratio = result["peak_rss_mb"] / max(baseline_result["peak_rss_mb"], 1e-9)
+        print(f"{name}: {speed_ratio:.2f}x hands/s, {memory_ratio:.2f}x peak RSS")
+        if speed_ratio < 1 - tolerance:
+            regressions.append(f"{name} is {1 - speed_ratio:.0%} slower")
+        if memory_ratio > 1 + tolerance:
+            regressions.append(f"{name} uses {memory_ratio - 1:.0%} more memory")
+    return regressions
+
+
+def test_benchmark(backends: tuple = BACKENDS, runs: tuple = RUNS, executor_type: str = "thread",
+                   files_count: int = DEFAULT_FILES_COUNT, hands_count: int = DEFAULT_HANDS_COUNT,
+                   hand_size: int = DEFAULT_HAND_SIZE, seed: int = DEFAULT_SEED,
+                   results_path: str = None, baseline_path: str = None):
+    results_path = get_results_path(results_path, BENCHMARK_RESULTS_PATH)
+    generator_options = {"files_count": files_count, "hands_count": hands_count, "hand_size": hand_size, "seed": seed}
+    results = {"environment": get_environment(), "parameters": generator_options, "results": []}
+    for backend in backends:
+        for run in runs:
+            result = run_benchmark_process(backend, run, executor_type, generator_options)
+            print(f"{backend} {run}: {result['files']} files, {result['hands']} hands in {result['seconds']:.2f} s, "
+                  f"{result['files_per_second']:.1f} files/s, {result['hands_per_second']:.0f} hands/s, "
+                  f"peak RSS {result['peak_rss_mb']:.0f} MB")
+            results["results"].append(result)
+    os.makedirs(os.path.dirname(results_path), exist_ok=True)
+    print(f"Writing results to {results_path}")
+    with open(results_path, "w") as file:
+        json.dump(results, file, indent=2)
+    if baseline_path is not None:
+        with open(baseline_path) as file:
+            regressions = compare_results(json.load(file), results)
+        assert not regressions, f"Regressions: {', '.join(regressions)}"
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark the split runs on generated histories")
+    parser.add_argument("--child", nargs=2, metavar=("BACKEND", "RUN"), help=argparse.SUPPRESS)
+    parser.add_argument("--backend", choices=BACKENDS, action="append", dest="backends")
+    parser.add_argument("--run", choices=RUNS, action="append", dest="runs")
+    parser.add_argument("--executor", default="thread")
+    parser.add_argument("--files", type=int, default=DEFAULT_FILES_COUNT)
+    parser.add_argument("--hands", type=int, default=DEFAULT_HANDS_COUNT)
+    parser.add_argument("--hand-size", type=int, default=DEFAULT_HAND_SIZE)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--output", default=BENCHMARK_RESULTS_PATH)
+    parser.add_argument("--baseline", help="The results of a previous version to compare with")
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    if args.child:
+        print(json.dumps(run_benchmark(*args.child, executor_type=args.executor, files_count=args.files,
+                                       hands_count=args.hands, hand_size=args.hand_size, seed=args.seed)))
+    else:
+        test_benchmark(tuple(args.backends or BACKENDS), tuple(args.runs or RUNS), args.executor, args.files,
+                       args.hands, args.hand_size, args.seed, args.output, args.baseline)
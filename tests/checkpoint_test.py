@@ -0,0 +1,222 @@
+"""This module tests the checkpoints of the split runs: resuming, quarantining and the selection of the resumed run."""
+import json
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_s3 import FakeS3
+from history_generator import write_local_histories
+from pkrsplitter.splitters.checkpoint import FileCheckpoint, S3Checkpoint, get_run_filter
+from pkrsplitter.splitters.local import LocalFileSplitter
+
+FILES_COUNT = 6
+HANDS_COUNT = 20
+
+
+class Crash(BaseException):
+    """
+    An interruption of a run, like a killed process, which is not quarantined since it is not an Exception
+    """
+
+
+class FlakySplitter(LocalFileSplitter):
+    """
+    A local splitter with a worker per stage, counting its reads and scans, and failing on a corrupted file
+    """
+
+    def __init__(self, data_dir: str, bad_key: str = None):
+        super().__init__(data_dir)
+        self.set_pipeline({"fetch": 1, "split": 1, "write": 1}, queue_size=1)
+        self.bad_key = bad_key
+        self.reads_count = 0
+        self.scans_count = 0
+
+    def read_raw_history(self, raw_key: str) -> str:
+        if raw_key == self.bad_key:
+            raise ValueError("corrupted file")
+        self.reads_count += 1
+        return super().read_raw_history(raw_key)
+
+    def scan_raw_directory(self, directory_key: str) -> tuple:
+        self.scans_count += 1
+        return super().scan_raw_directory(directory_key)
+
+
+def count_split_files(data_dir: str) -> int:
+    return sum(len(files) for _, _, files in os.walk(os.path.join(data_dir, "histories", "split")))
+
+
+def record_complete_listing(splitter: LocalFileSplitter, done_keys: list) -> FileCheckpoint:
+    """
+    Records a previous split_files run of the splitter which listed all its raw files and split some of them
+    Args:
+        splitter (LocalFileSplitter): The splitter, whose raw filter is the one of the previous run
+        done_keys (list): The raw files split by the previous run
+
+    Returns:
+        checkpoint (FileCheckpoint): The checkpoint of the data directory
+    """
+    checkpoint = splitter.create_checkpoint()
+    run_filter = get_run_filter(splitter.raw_dir, splitter.raw_prefix, splitter.partition_filter,
+                                splitter.raw_key_filter)
+    checkpoint.start("split_files", run_filter)
+    checkpoint.record_listing_started()
+    for raw_key, size, version in splitter.iter_raw_histories_stats(splitter.get_raw_directory_keys()):
+        checkpoint.record_listed(raw_key, size, version)
+    checkpoint.record_listing_complete()
+    for raw_key in done_keys:
+        checkpoint.mark_done(raw_key)
+    checkpoint.save()
+    return checkpoint
+
+
+def test_resume_skips_split_and_quarantined_files(tmp_path):
+    data_dir = str(tmp_path)
+    raw_keys = write_local_histories(data_dir, FILES_COUNT, hands_count=HANDS_COUNT)
+    bad_key = raw_keys[1]
+    splitter = FlakySplitter(data_dir, bad_key=bad_key)
+    splitter.set_checkpoint()
+    split_jobs = []
+
+    def crash_after_two_files(job):
+        split_jobs.append(job)
+        if len(split_jobs) == 2:
+            raise Crash()
+
+    with pytest.raises(Crash):
+        splitter.split_files(on_split=crash_after_two_files)
+    assert os.path.exists(splitter.checkpoint_file_key)
+
+    resumed_splitter = FlakySplitter(data_dir, bad_key=bad_key)
+    resumed_splitter.set_checkpoint()
+    resumed_splitter.split_files()
+    # The two files split before the crash are not read again, and the corrupted file is not retried
+    assert resumed_splitter.reads_count == FILES_COUNT - 3
+    assert count_split_files(data_dir) == (FILES_COUNT - 1) * HANDS_COUNT
+    with open(resumed_splitter.quarantine_file_key) as file:
+        assert json.load(file) == {bad_key: "ValueError: corrupted file"}
+    assert not os.path.exists(resumed_splitter.checkpoint_file_key)
+
+
+def test_quarantine_does_not_stop_the_run(tmp_path):
+    data_dir = str(tmp_path)
+    raw_keys = write_local_histories(data_dir, FILES_COUNT, hands_count=HANDS_COUNT)
+    splitter = FlakySplitter(data_dir, bad_key=raw_keys[0])
+    splitter.set_checkpoint()
+    splitter.split_files()
+    assert count_split_files(data_dir) == (FILES_COUNT - 1) * HANDS_COUNT
+    with open(splitter.quarantine_file_key) as file:
+        assert list(json.load(file)) == [raw_keys[0]]
+
+
+def test_clean_run_keeps_the_quarantine_file(tmp_path):
+    data_dir = str(tmp_path)
+    raw_keys = write_local_histories(data_dir, FILES_COUNT, hands_count=HANDS_COUNT)
+    splitter = FlakySplitter(data_dir, bad_key=raw_keys[0])
+    splitter.set_checkpoint()
+    splitter.split_files()
+    clean_splitter = FlakySplitter(data_dir)
+    clean_splitter.set_checkpoint()
+    clean_splitter.split_files()
+    assert clean_splitter.reads_count == FILES_COUNT
+    with open(clean_splitter.quarantine_file_key) as file:
+        assert list(json.load(file)) == [raw_keys[0]]
+
+
+def test_resume_replays_the_recorded_listing(tmp_path):
+    data_dir = str(tmp_path)
+    raw_keys = write_local_histories(data_dir, FILES_COUNT, hands_count=HANDS_COUNT)
+    record_complete_listing(FlakySplitter(data_dir), raw_keys[:2])
+    splitter = FlakySplitter(data_dir)
+    splitter.set_checkpoint()
+    splitter.split_files()
+    assert splitter.scans_count == 0
+    assert splitter.reads_count == FILES_COUNT - 2
+
+
+def test_listing_is_journaled_without_saves(tmp_path):
+    checkpoint = FileCheckpoint(str(tmp_path / "split_checkpoint.jsonl"), save_every=10, save_interval=3600)
+    checkpoint.start("split_files")
+    appended_lines = []
+    append_lines = checkpoint.append_lines
+    checkpoint.append_lines = lambda lines: appended_lines.append(len(lines)) or append_lines(lines)
+    checkpoint.record_listing_started()
+    for file_number in range(100):
+        checkpoint.record_listed(f"raw/file{file_number}.txt", file_number, None)
+    # The listed files are neither saved on their own nor kept by the running run
+    assert appended_lines == []
+    assert checkpoint.listed_stats == {}
+    for file_number in range(8):
+        checkpoint.mark_done(f"raw/file{file_number}.txt")
+    # The tenth counted record, with the start of the listing, saves all the records
+    checkpoint.quarantine("raw/file8.txt", ValueError("corrupted file"))
+    assert appended_lines == [110]
+    checkpoint.record_listing_complete()
+    checkpoint.save()
+    # A resumed run only keeps the listed files which are not settled
+    resumed_checkpoint = FileCheckpoint(checkpoint.path)
+    assert resumed_checkpoint.start("split_files")
+    assert resumed_checkpoint.listing_complete
+    assert list(resumed_checkpoint.listed_stats) == [f"raw/file{file_number}.txt" for file_number in range(9, 100)]
+    assert next(resumed_checkpoint.iter_listed_stats()) == ("raw/file9.txt", 9, None)
+
+
+def test_resume_with_another_filter_starts_a_new_run(tmp_path):
+    data_dir = str(tmp_path)
+    raw_keys = write_local_histories(data_dir, FILES_COUNT, hands_count=HANDS_COUNT)
+    previous_splitter = FlakySplitter(data_dir)
+    previous_splitter.set_raw_filter(start_date=date(2024, 1, 1))
+    # The previous run listed all the files and split those of the new selection
+    record_complete_listing(previous_splitter, raw_keys[3:])
+
+    splitter = FlakySplitter(data_dir)
+    splitter.set_raw_filter(start_date=date(2024, 1, 4))
+    splitter.set_checkpoint()
+    assert splitter.checkpoint.run_filter["start_date"] == "2024-01-01"
+    splitter.split_files()
+    # The files of the new selection are listed and split again, and only them
+    assert splitter.scans_count > 0
+    assert splitter.checkpoint.run_name is None
+    assert splitter.reads_count == FILES_COUNT - 3
+    assert count_split_files(data_dir) == (FILES_COUNT - 3) * HANDS_COUNT
+
+
+def test_resume_with_another_prefix_starts_a_new_run(tmp_path):
+    checkpoint = FileCheckpoint(str(tmp_path / "split_checkpoint.jsonl"))
+    assert not checkpoint.start("split_files", {"prefix": "2024/01"})
+    checkpoint.mark_done("raw/2024/01/01/file.txt")
+    checkpoint.save()
+    assert FileCheckpoint(checkpoint.path).start("split_files", {"prefix": "2024/01"})
+    new_checkpoint = FileCheckpoint(checkpoint.path)
+    assert not new_checkpoint.start("split_files", {"prefix": "2024/02"})
+    assert not new_checkpoint.is_settled("raw/2024/01/01/file.txt")
+
+
+def test_s3_checkpoint_saves_parts(tmp_path):
+    s3 = FakeS3()
+    checkpoint = S3Checkpoint(s3, "bucket", "data/split_checkpoint.jsonl", save_every=10)
+    checkpoint.start("split_files")
+    for file_number in range(95):
+        checkpoint.mark_done(f"raw/file{file_number}.txt")
+    checkpoint.save()
+    part_bodies = [body for (_, key), body in s3.objects.items() if key.startswith("data/split_checkpoint.jsonl/")]
+    # Each part only holds the records saved with it, so the journal is written once in total
+    assert len(part_bodies) == 11
+    assert sum(body.count(b"\n") for body in part_bodies) == 96
+    resumed_checkpoint = S3Checkpoint(s3, "bucket", "data/split_checkpoint.jsonl")
+    assert resumed_checkpoint.start("split_files")
+    assert len(resumed_checkpoint.done_keys) == 95
+    resumed_checkpoint.mark_done("raw/file95.txt")
+    resumed_checkpoint.save()
+    assert len(S3Checkpoint(s3, "bucket", "data/split_checkpoint.jsonl").done_keys) == 96
+    resumed_checkpoint.clear()
+    assert not s3.objects
+    assert S3Checkpoint(s3, "bucket", "data/split_checkpoint.jsonl").run_name is None
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
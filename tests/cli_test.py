@@ -0,0 +1,85 @@
+"""This module tests the pkrsplitter command line interface on a local data directory."""
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from history_generator import write_local_histories
+from pkrsplitter.cli import main
+
+FILES_COUNT = 4
+HANDS_COUNT = 5
+
+
+def count_split_files(data_dir: str) -> int:
+    return sum(len(files) for _, _, files in os.walk(os.path.join(data_dir, "histories", "split")))
+
+
+@pytest.fixture
+def data_dir(tmp_path) -> str:
+    data_dir = str(tmp_path)
+    write_local_histories(data_dir, FILES_COUNT, hands_count=HANDS_COUNT)
+    return data_dir
+
+
+@pytest.mark.parametrize("command", ["split", "split-new", "split-new-histories", "split-appended"])
+def test_command_splits_the_files(data_dir, command):
+    assert main([command, "--data-dir", data_dir, "-q"]) is None
+    assert count_split_files(data_dir) == FILES_COUNT * HANDS_COUNT
+
+
+def test_correct_splits_the_correction_files(data_dir):
+    raw_keys = sorted(os.path.join(root, file) for root, _, files in os.walk(os.path.join(data_dir, "histories"))
+                      for file in files)
+    with open(os.path.join(data_dir, "correction_raw_keys.txt"), "w") as file:
+        file.write("\n".join(raw_keys[:2]))
+    main(["correct", "--data-dir", data_dir, "-q"])
+    assert count_split_files(data_dir) == 2 * HANDS_COUNT
+    with open(os.path.join(data_dir, "correction_split_keys.txt")) as file:
+        assert len(file.read().split()) == 2 * HANDS_COUNT
+
+
+def test_dry_run_lists_without_splitting(data_dir, capsys):
+    main(["split", "--data-dir", data_dir, "--since", "2024-01-02", "--dry-run", "-q"])
+    output_lines = capsys.readouterr().out.splitlines()
+    assert output_lines[-1].startswith(f"{FILES_COUNT - 1} raw files")
+    assert len([line for line in output_lines if line.endswith(".txt")]) == FILES_COUNT - 1
+    assert count_split_files(data_dir) == 0
+
+
+def test_metrics_and_packed_options(data_dir, tmp_path):
+    metrics_path = str(tmp_path / "metrics.json")
+    main(["split", "--data-dir", data_dir, "--output-format", "packed", "--manifest", "--metrics", metrics_path,
+          "-q"])
+    with open(metrics_path) as file:
+        assert json.load(file)["counters"]["files"] == FILES_COUNT
+    # A pack and its index per raw file
+    assert count_split_files(data_dir) == 2 * FILES_COUNT
+
+
+@pytest.mark.parametrize("argv", [
+    [],
+    ["unknown-command"],
+    ["split", "--since", "2024-13-01"],
+    ["split", "--backend", "ftp"],
+])
+def test_invalid_arguments_exit_with_an_error(argv, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main(argv)
+    assert exit_info.value.code == 2
+    assert "pkrsplitter" in capsys.readouterr().err
+
+
+def test_missing_data_dir_exits_with_an_error(monkeypatch, capsys):
+    monkeypatch.delenv("POKER_DATA_DIR", raising=False)
+    with pytest.raises(SystemExit) as exit_info:
+        main(["split"])
+    assert exit_info.value.code == 2
+    assert "POKER_DATA_DIR" in capsys.readouterr().err
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
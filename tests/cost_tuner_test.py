@@ -0,0 +1,383 @@
+"""This module tunes the memory, record workers and batch size of the splitting lambda from measured runs, and saves
+their cost."""
+import argparse
+import csv
+import importlib
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark_test import get_rss_mb
+from fake_s3 import FakeS3
+from history_generator import (put_bucket_histories, get_raw_key, get_sqs_record, DEFAULT_HANDS_COUNT,
+                               DEFAULT_HAND_SIZE, DEFAULT_SEED)
+from reports import BASE_DIR, REPORTS_DIR, benchmark, get_results_path
+
+FINANCIARY_COST_PATH = os.path.join(REPORTS_DIR, "financiary_cost.csv")
+LAMBDA_PARAMS_PATH = os.path.join(BASE_DIR, "config", "lambda_params.json")
+BUCKET_NAME = "tuning-bucket"
+RAW_DIR = "data/histories/raw"
+WORKER_COUNTS = (1, 2, 4, 8, 16, 32)
+# The memory sizes in MB of the lambda, a full vCPU being allocated at 1769 MB
+MEMORY_TIERS = (128, 256, 512, 1024, 1769, 2048, 3008)
+FULL_VCPU_MEMORY = 1769
+GB_SECOND_PRICE = 0.0000166667
+REQUEST_PRICE = 0.2 / 1e6
+# A batch must be split in this share of the timeout of the lambda, to leave room for slower S3 requests
+TIMEOUT_SHARE = 0.5
+# The maximum batch size of a SQS event source, and the maximum size of the event of an invocation
+MAX_SQS_BATCH_SIZE = 10000
+MAX_PAYLOAD_BYTES = 6 * 1024 ** 2
+MAX_CONCURRENCY = 1000
+# The predicted peak memory must stay under this share of the memory of the lambda
+MEMORY_SHARE = 0.9
+# The latency of each request to the fake S3, close to the latency of S3 requests from a lambda
+S3_LATENCY = 0.01
+DEFAULT_FILES_COUNT = 64
+DEFAULT_ARCHIVE_GB = 10.0
+DEFAULT_DEADLINE_MINUTES = 60.0
+WATCHDOG_INTERVAL = 0.005
+OUT_OF_MEMORY_EXIT_CODE = 137
+
+
+class InvocationS3(FakeS3):
+    """
+    A FakeS3 which does not keep the split objects, as the objects put by a lambda are not in its memory
+    """
+
+    def put_object(self, Bucket: str, Key: str, Body, **kwargs) -> dict:
+        response = super().put_object(Bucket=Bucket, Key=Key, Body=Body, **kwargs)
+        if not Key.startswith(RAW_DIR):
+            with self._lock:
+                self.objects.pop((Bucket, Key), None)
+        return response
+
+
+def get_lambda_params(path: str = LAMBDA_PARAMS_PATH) -> dict:
+    """
+    Returns the deployment parameters of the splitting lambda
+    Args:
+        path (str): The path of the lambda parameters file
+
+    Returns:
+        lambda_params (dict): The parameters of the history_splitter function, with its timeout and memorySize
+    """
+    with open(path) as file:
+        functions = json.load(file)["functions"]
+    return next(function for function in functions if function["functionName"] == "history_splitter")
+
+
+def get_max_batch_size(raw_keys: list) -> int:
+    """
+    Returns the largest batch of raw files a SQS event source can send to the lambda in a single invocation
+    Args:
+        raw_keys (list): The keys of raw history files, whose largest record sets the size of the event
+
+    Returns:
+        max_batch_size (int): The number of records within the SQS batch size limit and the payload size limit
+    """
+    record_bytes = max(len(json.dumps(get_sqs_record(str(MAX_SQS_BATCH_SIZE), BUCKET_NAME, raw_key)))
+                       for raw_key in raw_keys)
+    # Each record is followed by a separator in the {"Records": [...]} event
+    payload_batch_size = (MAX_PAYLOAD_BYTES - len(json.dumps({"Records": []}))) // (record_bytes + 2)
+    return min(MAX_SQS_BATCH_SIZE, payload_batch_size)
+
+
+def watch_memory(memory_limit_mb: float, stored_mb: float):
+    """
+    Kills the current process once its peak memory exceeds the memory of the lambda, like the lambda runtime does.
+    The address space of the process cannot be capped instead, as its thread stacks and allocator arenas reserve
+    much more address space than they use.
+    Args:
+        memory_limit_mb (float): The memory of the lambda in MB
+        stored_mb (float): The size of the raw objects kept by the fake S3, which are not in the memory of a lambda
+    """
+    while True:
+        if get_rss_mb() - stored_mb > memory_limit_mb:
+            sys.stdout.flush()
+            os._exit(OUT_OF_MEMORY_EXIT_CODE)
+        time.sleep(WATCHDOG_INTERVAL)
+
+
+def run_invocation(workers: int, memory_limit_mb: float = None, files_count: int = DEFAULT_FILES_COUNT,
+                   hands_count: int = DEFAULT_HANDS_COUNT, hand_size: int = DEFAULT_HAND_SIZE,
+                   seed: int = DEFAULT_SEED) -> dict:
+    """
+    Runs the lambda handler on a batch of generated raw history files, in the current process
+    Args:
+        workers (int): The number of records split concurrently by the lambda
+        memory_limit_mb (float): The memory of the lambda in MB, over which the process is killed, or None
+        files_count (int): The number of raw history files of the batch
+        hands_count (int): The number of hands of each file
+        hand_size (int): The number of action lines of each street
+        seed (int): The seed of the generator
+
+    Returns:
+        result (dict): The counts, duration, CPU time and peak memory of the invocation
+    """
+    os.environ["POKER_SPLITTER_RECORD_WORKERS"] = str(workers)
+    os.environ.setdefault("POKER_SPLITTER_LOG_LEVEL", "WARNING")
+    history_splitter = importlib.import_module("pkrsplitter.lambda.history_splitter")
+    from pkrsplitter.splitters.cloud import CloudFileSplitter
+    s3 = InvocationS3(latency=S3_LATENCY, seed=seed)
+    raw_keys = put_bucket_histories(s3, BUCKET_NAME, files_count=files_count, hands_count=hands_count,
+                                    hand_size=hand_size, seed=seed)
+    stored_mb = sum(len(body) for body in s3.objects.values()) / 1024 ** 2
+    splitter = history_splitter.splitters[BUCKET_NAME] = CloudFileSplitter(BUCKET_NAME, s3_client=s3)
+    splitter.set_metrics(history_splitter.metrics)
+    if memory_limit_mb is not None:
+        threading.Thread(target=watch_memory, args=(memory_limit_mb, stored_mb), daemon=True).start()
+    event = {"Records": [get_sqs_record(str(number), BUCKET_NAME, raw_key) for number, raw_key in enumerate(raw_keys)]}
+    start_usage = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    response = history_splitter.lambda_handler(event, None)
+    seconds = time.perf_counter() - start
+    end_usage = resource.getrusage(resource.RUSAGE_SELF)
+    assert not response["batchItemFailures"], f"Failed records: {response['batchItemFailures']}"
+    cpu_seconds = end_usage.ru_utime + end_usage.ru_stime - start_usage.ru_utime - start_usage.ru_stime
+    return {
+        "workers": workers,
+        "memory_limit_mb": memory_limit_mb,
+        "files": files_count,
+        "hands": history_splitter.metrics.counters["hands"],
+        "megabytes": round(stored_mb, 3),
+        "seconds": round(seconds, 4),
+        "cpu_seconds": round(cpu_seconds, 4),
+        "peak_rss_mb": round(get_rss_mb() - stored_mb, 1),
+    }
+
+
+def run_invocation_process(workers: int, memory_limit_mb: float, generator_options: dict):
+    """
+    Runs an invocation in a new interpreter, so that its peak memory is not shared with the other invocations
+    Args:
+        workers (int): The number of records split concurrently by the lambda
+        memory_limit_mb (float): The memory of the lambda in MB
+        generator_options (dict): The files_count, hands_count, hand_size and seed options of the generator
+
+    Returns:
+        result (dict | None): The result of run_invocation, or None if the invocation ran out of memory
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--child", str(workers), str(memory_limit_mb),
+               "--files", str(generator_options["files_count"]), "--hands", str(generator_options["hands_count"]),
+               "--hand-size", str(generator_options["hand_size"]), "--seed", str(generator_options["seed"])]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (BASE_DIR, os.environ.get("PYTHONPATH")))))
+    process = subprocess.run(command, capture_output=True, text=True, env=env)
+    if process.returncode == OUT_OF_MEMORY_EXIT_CODE:
+        return None
+    if process.returncode:
+        raise RuntimeError(f"The invocation with {workers} workers failed:\n{process.stderr}")
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def measure_invocations(generator_options: dict, worker_counts: tuple = WORKER_COUNTS,
+                        memory_tiers: tuple = MEMORY_TIERS) -> tuple:
+    """
+    Runs the invocations of each worker count under increasing memory tiers, until one does not run out of memory
+    Args:
+        generator_options (dict): The files_count, hands_count, hand_size and seed options of the generator
+        worker_counts (tuple): The numbers of records split concurrently to measure
+        memory_tiers (tuple): The memory sizes of the lambda in MB, in increasing order
+
+    Returns:
+        results, min_memory_tiers (tuple): The results of the complete invocations, and the smallest memory tier
+            each worker count fits in
+    """
+    results, min_memory_tiers = [], {}
+    for workers in worker_counts:
+        for memory_tier in memory_tiers:
+            result = run_invocation_process(workers, memory_tier, generator_options)
+            if result is None:
+                print(f"{workers} workers: out of memory with {memory_tier} MB")
+                continue
+            print(f"{workers} workers: {result['files'] / result['seconds']:.1f} files/s, "
+                  f"peak RSS {result['peak_rss_mb']:.0f} MB with {memory_tier} MB")
+            results.append(result)
+            min_memory_tiers[workers] = memory_tier
+            break
+    return results, min_memory_tiers
+
+
+def fit_line(xs: list, ys: list) -> tuple:
+    """
+    Fits a line to points with the least squares
+    Args:
+        xs (list): The x values
+        ys (list): The y values
+
+    Returns:
+        intercept, slope (tuple): The coefficients of the line, flat if the x values are all the same
+    """
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    variance = sum((x - mean_x) ** 2 for x in xs)
+    if not variance:
+        return mean_y, 0.0
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance
+    return mean_y - slope * mean_x, slope
+
+
+class InvocationModel:
+    """
+    The throughput and the memory of an invocation, fitted on measured invocations.
+    The throughput follows Amdahl's law, X(w) = X1 * w / (1 + s * (w - 1)), which is fitted as the line
+    1 / X(w) = s / X1 + (1 - s) / X1 * (1 / w). The peak memory is fitted as a line of the number of workers.
+
+    Methods:
+        get_files_per_second: Returns the throughput of a number of workers on a full vCPU
+        get_file_seconds: Returns the lambda time per file of a number of workers and a memory tier
+        get_peak_memory: Returns the peak memory of a number of workers
+    """
+
+    def __init__(self, results: list):
+        """
+        Initializes the InvocationModel class
+        Args:
+            results: The results of the measured invocations
+        """
+        workers = [result["workers"] for result in results]
+        intercept, slope = fit_line([1 / count for count in workers],
+                                    [result["seconds"] / result["files"] for result in results])
+        intercept, slope = max(intercept, 0.0), max(slope, 0.0)
+        self.single_files_per_second = 1 / (intercept + slope)
+        self.serial_share = intercept / (intercept + slope)
+        self.cpu_seconds_per_file = (sum(result["cpu_seconds"] for result in results)
+                                     / sum(result["files"] for result in results))
+        self.base_memory, self.worker_memory = fit_line(workers, [result["peak_rss_mb"] for result in results])
+        self.megabytes_per_file = results[0]["megabytes"] / results[0]["files"]
+
+    def get_files_per_second(self, workers: int) -> float:
+        return self.single_files_per_second * workers / (1 + self.serial_share * (workers - 1))
+
+    def get_file_seconds(self, workers: int, memory_tier: int) -> float:
+        """
+        Returns the lambda time per file. Under 1769 MB, the lambda only has a share of a vCPU, so that its throughput
+        is also bounded by its CPU time divided by the share. Above it, the extra vCPUs are not used by the threads of
+        a single interpreter.
+        Args:
+            workers (int): The number of records split concurrently
+            memory_tier (int): The memory of the lambda in MB
+
+        Returns:
+            file_seconds (float): The duration of the invocation divided by its number of files
+        """
+        vcpu_share = min(memory_tier / FULL_VCPU_MEMORY, 1.0)
+        return max(1 / self.get_files_per_second(workers), self.cpu_seconds_per_file / vcpu_share)
+
+    def get_peak_memory(self, workers: int) -> float:
+        return self.base_memory + self.worker_memory * workers
+
+
+def get_cost_rows(model: InvocationModel, min_memory_tiers: dict, archive_gb: float, deadline_minutes: float,
+                  lambda_params: dict, max_batch_size: int, worker_counts: tuple = WORKER_COUNTS,
+                  memory_tiers: tuple = MEMORY_TIERS) -> list:
+    """
+    Returns the cost of splitting an archive with each worker count and memory tier
+    Args:
+        model (InvocationModel): The fitted model of the invocations
+        min_memory_tiers (dict): The smallest memory tier each measured worker count fits in
+        archive_gb (float): The size of the raw history files to split, in GB
+        deadline_minutes (float): The time in which the archive must be split, which sets the concurrency
+        lambda_params (dict): The deployment parameters of the lambda, whose timeout bounds the batches
+        max_batch_size (int): The largest batch of records the event source can send in an invocation
+        worker_counts (tuple): The numbers of records split concurrently
+        memory_tiers (tuple): The memory sizes of the lambda in MB
+
+    Returns:
+        rows (list): A dict per worker count and memory tier, the cheapest fitting one being recommended
+    """
+    max_batch_seconds = lambda_params["timeout"] * TIMEOUT_SHARE
+    files_count = math.ceil(archive_gb * 1024 / model.megabytes_per_file)
+    rows = []
+    for memory_tier in memory_tiers:
+        for workers in worker_counts:
+            file_seconds = model.get_file_seconds(workers, memory_tier)
+            peak_memory = model.get_peak_memory(workers)
+            batch_size = max(1, min(max_batch_size, int(max_batch_seconds / file_seconds)))
+            invocations = math.ceil(files_count / batch_size)
+            lambda_seconds = files_count * file_seconds
+            cost = lambda_seconds * memory_tier / 1024 * GB_SECOND_PRICE + invocations * REQUEST_PRICE
+            rows.append({
+                "memory_mb": memory_tier,
+                "record_workers": workers,
+                "batch_size": batch_size,
+                "files_per_second": round(1 / file_seconds, 2),
+                "peak_memory_mb": round(peak_memory, 1),
+                "fits": (peak_memory <= memory_tier * MEMORY_SHARE
+                         and memory_tier >= min_memory_tiers.get(workers, 0)
+                         and batch_size * file_seconds <= max_batch_seconds),
+                "deployed": memory_tier == lambda_params["memorySize"],
+                "invocation_seconds": round(batch_size * file_seconds, 1),
+                "concurrency": min(MAX_CONCURRENCY, math.ceil(lambda_seconds / (deadline_minutes * 60))),
+                "lambda_hours": round(lambda_seconds / 3600, 3),
+                "cost_usd": round(cost, 4),
+                "recommended": False,
+            })
+    fitting_rows = [row for row in rows if row["fits"]]
+    if fitting_rows:
+        min(fitting_rows, key=lambda row: (row["cost_usd"], -row["files_per_second"]))["recommended"] = True
+    return rows
+
+
+@benchmark
+def test_cost_tuning(files_count: int = DEFAULT_FILES_COUNT, hands_count: int = DEFAULT_HANDS_COUNT,
+                     hand_size: int = DEFAULT_HAND_SIZE, seed: int = DEFAULT_SEED,
+                     archive_gb: float = DEFAULT_ARCHIVE_GB, deadline_minutes: float = DEFAULT_DEADLINE_MINUTES,
+                     results_path: str = None):
+    results_path = get_results_path(results_path, FINANCIARY_COST_PATH)
+    generator_options = {"files_count": files_count, "hands_count": hands_count, "hand_size": hand_size, "seed": seed}
+    results, min_memory_tiers = measure_invocations(generator_options)
+    assert results, "All the invocations ran out of memory"
+    model = InvocationModel(results)
+    print(f"Throughput: {model.single_files_per_second:.1f} files/s with a worker, serial share "
+          f"{model.serial_share:.3f}, memory: {model.base_memory:.0f} MB + {model.worker_memory:.2f} MB per worker")
+    lambda_params = get_lambda_params()
+    raw_keys = [get_raw_key(RAW_DIR, file_number) for file_number in range(files_count)]
+    max_batch_size = get_max_batch_size(raw_keys)
+    print(f"Deployed lambda: {lambda_params['memorySize']} MB, {lambda_params['timeout']} s timeout, "
+          f"batches of at most {max_batch_size} records")
+    rows = get_cost_rows(model, min_memory_tiers, archive_gb, deadline_minutes, lambda_params, max_batch_size)
+    recommended_rows = [row for row in rows if row["recommended"]]
+    assert recommended_rows, "No memory tier fits the invocations"
+    recommended = recommended_rows[0]
+    print(f"Recommended for {archive_gb:g} GB in {deadline_minutes:g} minutes: {recommended['memory_mb']} MB, "
+          f"{recommended['record_workers']} record workers, batches of {recommended['batch_size']} files, "
+          f"{recommended['concurrency']} concurrent lambdas, ${recommended['cost_usd']:.4f}")
+    if recommended["memory_mb"] != lambda_params["memorySize"]:
+        print(f"The memorySize of {LAMBDA_PARAMS_PATH} should be set to {recommended['memory_mb']} MB")
+    os.makedirs(os.path.dirname(results_path), exist_ok=True)
+    print(f"Writing results to {results_path}")
+    with open(results_path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Tune the memory, workers and batch size of the splitting lambda")
+    parser.add_argument("--child", nargs=2, metavar=("WORKERS", "MEMORY_MB"), help=argparse.SUPPRESS)
+    parser.add_argument("--files", type=int, default=DEFAULT_FILES_COUNT, help="The number of files of a batch")
+    parser.add_argument("--hands", type=int, default=DEFAULT_HANDS_COUNT)
+    parser.add_argument("--hand-size", type=int, default=DEFAULT_HAND_SIZE)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--archive-gb", type=float, default=DEFAULT_ARCHIVE_GB, help="The size of the archive to split")
+    parser.add_argument("--deadline", type=float, default=DEFAULT_DEADLINE_MINUTES,
+                        help="The minutes in which the archive must be split")
+    parser.add_argument("--output", default=FINANCIARY_COST_PATH)
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    if args.child:
+        print(json.dumps(run_invocation(int(args.child[0]), float(args.child[1]), files_count=args.files,
+                                        hands_count=args.hands, hand_size=args.hand_size, seed=args.seed)))
+    else:
+        test_cost_tuning(args.files, args.hands, args.hand_size, args.seed, args.archive_gb, args.deadline,
+                         args.output)
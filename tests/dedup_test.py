@@ -0,0 +1,97 @@
+"""This module tests the deduplication of the raw files with the same content and of the unchanged hands."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_s3 import FakeS3
+from history_generator import put_bucket_histories, write_local_histories
+from pkrsplitter.splitters.cloud import CloudFileSplitter
+from pkrsplitter.splitters.local import LocalFileSplitter
+
+BUCKET_NAME = "dedup-bucket"
+HANDS_COUNT = 10
+
+
+def put_duplicate_histories(s3: FakeS3) -> list:
+    """
+    Puts two raw files with the same content under different keys
+    Args:
+        s3 (FakeS3): The fake S3 client
+
+    Returns:
+        raw_keys (list): The keys of the two raw files
+    """
+    raw_keys = put_bucket_histories(s3, BUCKET_NAME, files_count=2, hands_count=HANDS_COUNT)
+    s3.put_object(Bucket=BUCKET_NAME, Key=raw_keys[1], Body=s3.objects[(BUCKET_NAME, raw_keys[0])])
+    s3.put_count = 0
+    return raw_keys
+
+
+def count_split_objects(s3: FakeS3) -> int:
+    return sum(key.startswith("data/histories/split/") for _, key in s3.objects)
+
+
+def test_identical_raw_files_are_split_once():
+    s3 = FakeS3()
+    raw_keys = put_duplicate_histories(s3)
+    splitter = CloudFileSplitter(BUCKET_NAME, s3_client=s3)
+    splitter.set_deduplication(hands=False)
+    splitter.split_files()
+    # The hands of the first raw file are written, then the manifest
+    assert s3.put_count == HANDS_COUNT + 1
+    assert count_split_objects(s3) == HANDS_COUNT
+    # The raw files are listed in parallel, so either of them can be the one split
+    split_keys = [raw_key for raw_key in raw_keys if splitter.check_split_dir_exists(raw_key)]
+    assert len(split_keys) == 1
+    duplicate_key = next(raw_key for raw_key in raw_keys if raw_key not in split_keys)
+    assert splitter.manifest.get(duplicate_key).hand_ids == ()
+    # The duplicate is recorded, so the next run reads and writes the manifest only
+    s3.get_count = s3.put_count = 0
+    new_splitter = CloudFileSplitter(BUCKET_NAME, s3_client=s3)
+    new_splitter.set_deduplication(hands=False)
+    new_splitter.split_new_files()
+    assert s3.get_count == 1
+    assert s3.put_count == 1
+
+
+def test_unchanged_hands_are_not_written_again():
+    s3 = FakeS3()
+    raw_keys = put_bucket_histories(s3, BUCKET_NAME, files_count=2, hands_count=HANDS_COUNT)
+    CloudFileSplitter(BUCKET_NAME, s3_client=s3).split_files()
+    splitter = CloudFileSplitter(BUCKET_NAME, s3_client=s3)
+    splitter.set_deduplication(raw=False)
+    s3.put_count = 0
+    splitter.split_files()
+    assert s3.put_count == 0
+    # Only the last hand of the first file changes
+    raw_body = s3.objects[(BUCKET_NAME, raw_keys[0])]
+    s3.put_object(Bucket=BUCKET_NAME, Key=raw_keys[0], Body=raw_body + b"Changed line\n\n")
+    s3.put_count = 0
+    splitter.split_files()
+    assert s3.put_count == 1
+    assert count_split_objects(s3) == 2 * HANDS_COUNT
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_unchanged_local_hands_are_not_written_again(tmp_path, use_mmap):
+    data_dir = str(tmp_path)
+    raw_keys = write_local_histories(data_dir, files_count=2, hands_count=HANDS_COUNT)
+    LocalFileSplitter(data_dir).split_files()
+    with open(raw_keys[0], "a", encoding="utf-8") as file:
+        file.write("Changed line\n\n")
+    splitter = LocalFileSplitter(data_dir, use_mmap=use_mmap)
+    splitter.set_deduplication(raw=False)
+    written_keys = []
+    write_many = splitter.writer.write_many
+    splitter.writer.write_many = lambda files: write_many(
+        (written_keys.append(file_key) or file_key, content) for file_key, content in files)
+    splitter.split_files()
+    last_key = splitter.get_separated_hands_info(raw_keys[0])[-1][0]
+    assert written_keys == [last_key]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,74 @@
+"""This module tests the executor backends: the pickling of the splitters sent to the processes, and their output."""
+import os
+import pickle
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_s3 import FakeS3
+from history_generator import write_local_histories
+from pkrsplitter.splitters.cloud import CloudFileSplitter
+from pkrsplitter.splitters.local import LocalFileSplitter
+from pkrsplitter.splitters.metrics import SplitMetrics
+from pkrsplitter.splitters.split_keys import SplitKeysCache
+
+FILES_COUNT = 4
+HANDS_COUNT = 10
+
+
+def read_split_files(data_dir: str) -> dict:
+    split_files = {}
+    split_dir = os.path.join(data_dir, "histories", "split")
+    for root, _, files in os.walk(split_dir):
+        for file_name in files:
+            with open(os.path.join(root, file_name), "rb") as file:
+                split_files[os.path.relpath(os.path.join(root, file_name), split_dir)] = file.read()
+    return split_files
+
+
+def test_local_splitter_pickles_without_its_run_state(tmp_path):
+    splitter = LocalFileSplitter(str(tmp_path), executor_type="process", max_workers=2)
+    splitter.set_manifest()
+    splitter.set_checkpoint()
+    splitter.set_metrics(SplitMetrics())
+    splitter.split_keys_cache = SplitKeysCache(splitter.list_split_keys)
+    with ThreadPoolExecutor() as parser_pool:
+        splitter.parser_pool = parser_pool
+        state = splitter.__getstate__()
+        unpickled_splitter = pickle.loads(pickle.dumps(splitter))
+    assert not {"parser_pool", "split_keys_cache", "manifest", "checkpoint", "metrics"} & set(state)
+    # The dropped attributes fall back to their class defaults in the worker processes
+    assert unpickled_splitter.manifest is None and unpickled_splitter.checkpoint is None
+    assert unpickled_splitter.metrics is None and unpickled_splitter.parser_pool is None
+    assert unpickled_splitter.data_dir == splitter.data_dir
+    assert unpickled_splitter.executor_type == "process"
+
+
+def test_cloud_splitter_pickles_without_its_client():
+    splitter = CloudFileSplitter("bucket", s3_client=FakeS3(), upload_workers=8)
+    unpickled_splitter = pickle.loads(pickle.dumps(splitter))
+    assert unpickled_splitter._s3 is None
+    assert unpickled_splitter.uploader is not splitter.uploader
+    assert unpickled_splitter.uploader.max_workers == 8
+    assert unpickled_splitter.bucket_name == "bucket"
+
+
+@pytest.mark.parametrize("executor_type", ["process", "hybrid"])
+def test_executors_write_the_same_files(tmp_path, executor_type):
+    thread_dir, executor_dir = str(tmp_path / "thread"), str(tmp_path / executor_type)
+    write_local_histories(thread_dir, FILES_COUNT, hands_count=HANDS_COUNT)
+    write_local_histories(executor_dir, FILES_COUNT, hands_count=HANDS_COUNT)
+    LocalFileSplitter(thread_dir).split_files()
+    with LocalFileSplitter(executor_dir, executor_type=executor_type, max_workers=2,
+                           max_parser_workers=2) as splitter:
+        splitter.split_files()
+    thread_files = read_split_files(thread_dir)
+    assert len(thread_files) == FILES_COUNT * HANDS_COUNT
+    assert read_split_files(executor_dir) == thread_files
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
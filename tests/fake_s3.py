@@ -0,0 +1,213 @@
+"""This module defines a fake S3 client, which keeps the objects in memory and injects throttling like S3 does."""
+import asyncio
+import hashlib
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+LIST_PAGE_SIZE = 1000
+
+
+class FakeClientError(Exception):
+    """
+    An error with the same response attribute as a botocore ClientError
+    """
+
+    def __init__(self, code: str, status_code: int, operation_name: str):
+        self.response = {"Error": {"Code": code, "Message": code}, "ResponseMetadata": {"HTTPStatusCode": status_code}}
+        super().__init__(f"An error occurred ({code}) when calling the {operation_name} operation")
+
+
+class FakeNoSuchKey(FakeClientError):
+    def __init__(self):
+        super().__init__("NoSuchKey", 404, "GetObject")
+
+
+class FakeBody:
+    """
+    A streaming body holding the content of an object
+    """
+
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def read(self) -> bytes:
+        return self.content
+
+    def iter_chunks(self, chunk_size: int = 1024):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+
+class FakePaginator:
+    def __init__(self, s3: "FakeS3"):
+        self.s3 = s3
+
+    def paginate(self, Bucket: str, Prefix: str = "", Delimiter: str = None, **kwargs):
+        token = None
+        while True:
+            page = self.s3.list_objects_v2(Bucket=Bucket, Prefix=Prefix, Delimiter=Delimiter, ContinuationToken=token)
+            yield page
+            token = page.get("NextContinuationToken")
+            if token is None:
+                return
+
+
+class FakeS3:
+    """
+    A fake boto3 S3 client keeping the objects in memory, for benchmarks and tests without a bucket.
+    PUT requests are throttled with a 503 SlowDown when more than max_concurrency are in flight, or at random
+    with the probability throttle_rate.
+
+    Examples:
+        s3 = FakeS3(max_concurrency=16, latency=0.005)
+        splitter = CloudFileSplitter(BUCKET_NAME, s3_client=s3)
+    """
+    exceptions = SimpleNamespace(ClientError=FakeClientError, NoSuchKey=FakeNoSuchKey)
+
+    def __init__(self, throttle_rate: float = 0.0, max_concurrency: int = None, latency: float = 0.0,
+                 seed: int = None):
+        """
+        Initializes the FakeS3 class
+        Args:
+            throttle_rate: The probability of throttling a PUT request
+            max_concurrency: The number of PUT requests in flight over which the requests are throttled
+            latency: The duration in seconds of each request
+            seed: The seed of the random throttling
+        """
+        self.throttle_rate = throttle_rate
+        self.max_concurrency = max_concurrency
+        self.latency = latency
+        self.objects = {}
+        self.put_count = 0
+        self.get_count = 0
+        self.list_count = 0
+        self.throttled_count = 0
+        self.in_flight = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket: str, Key: str, Body, **kwargs) -> dict:
+        body = Body.encode("utf-8") if isinstance(Body, str) else bytes(Body)
+        with self._lock:
+            self.put_count += 1
+            self.in_flight += 1
+            throttled = (self.max_concurrency is not None and self.in_flight > self.max_concurrency
+                         or self._random.random() < self.throttle_rate)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            if throttled:
+                with self._lock:
+                    self.throttled_count += 1
+                raise FakeClientError("SlowDown", 503, "PutObject")
+            with self._lock:
+                self.objects[(Bucket, Key)] = body
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        return {"ETag": f'"{hashlib.md5(body).hexdigest()}"'}
+
+    def get_object(self, Bucket: str, Key: str, Range: str = None, **kwargs) -> dict:
+        with self._lock:
+            self.get_count += 1
+            content = self.objects.get((Bucket, Key))
+        if self.latency:
+            time.sleep(self.latency)
+        if content is None:
+            raise FakeNoSuchKey()
+        if Range is not None:
+            start, end = Range[len("bytes="):].split("-")
+            if int(start) >= len(content):
+                raise FakeClientError("InvalidRange", 416, "GetObject")
+            content = content[int(start):int(end) + 1 if end else None]
+        return {"Body": FakeBody(content), "ContentLength": len(content)}
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = "", MaxKeys: int = LIST_PAGE_SIZE, Delimiter: str = None,
+                        ContinuationToken: str = None, **kwargs) -> dict:
+        with self._lock:
+            self.list_count += 1
+            objects = {key: body for (bucket, key), body in self.objects.items()
+                       if bucket == Bucket and key.startswith(Prefix)}
+        if self.latency:
+            time.sleep(self.latency)
+        common_prefixes = set()
+        if Delimiter:
+            for key in list(objects):
+                delimiter_index = key.find(Delimiter, len(Prefix))
+                if delimiter_index >= 0:
+                    common_prefixes.add(key[:delimiter_index + 1])
+                    del objects[key]
+        keys = sorted(set(objects) | common_prefixes)
+        if ContinuationToken is not None:
+            keys = [key for key in keys if key > ContinuationToken]
+        page_keys = keys[:min(MaxKeys, LIST_PAGE_SIZE)]
+        contents = [{"Key": key, "Size": len(objects[key]), "ETag": f'"{hashlib.md5(objects[key]).hexdigest()}"'}
+                    for key in page_keys if key in objects]
+        page = {"KeyCount": len(page_keys)}
+        if contents:
+            page["Contents"] = contents
+        if common_prefixes:
+            page["CommonPrefixes"] = [{"Prefix": key} for key in page_keys if key in common_prefixes]
+        if len(keys) > len(page_keys):
+            page["IsTruncated"] = True
+            page["NextContinuationToken"] = page_keys[-1]
+        return page
+
+    def delete_objects(self, Bucket: str, Delete: dict, **kwargs) -> dict:
+        keys = [deleted_object["Key"] for deleted_object in Delete["Objects"]]
+        with self._lock:
+            for key in keys:
+                self.objects.pop((Bucket, key), None)
+        return {"Deleted": [{"Key": key} for key in keys]}
+
+    def get_paginator(self, operation_name: str) -> FakePaginator:
+        return FakePaginator(self)
+
+
+class AsyncFakeBody:
+    """
+    An aiobotocore streaming body holding the content of an object
+    """
+
+    def __init__(self, content: bytes):
+        self.content = content
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        pass
+
+    async def read(self) -> bytes:
+        return self.content
+
+
+class AsyncFakeS3:
+    """
+    A fake aiobotocore S3 client over a FakeS3, whose requests each yield to the event loop like network requests.
+
+    Examples:
+        splitter = AsyncCloudFileSplitter(BUCKET_NAME)
+        splitter.s3 = AsyncFakeS3(FakeS3())
+    """
+
+    def __init__(self, s3: FakeS3):
+        self.s3 = s3
+        self.requests = []
+
+    async def request(self, operation_name: str, **kwargs) -> dict:
+        self.requests.append((operation_name, kwargs.get("Key", kwargs.get("Prefix"))))
+        await asyncio.sleep(0)
+        return getattr(self.s3, operation_name)(**kwargs)
+
+    async def put_object(self, **kwargs) -> dict:
+        return await self.request("put_object", **kwargs)
+
+    async def get_object(self, **kwargs) -> dict:
+        response = await self.request("get_object", **kwargs)
+        return {**response, "Body": AsyncFakeBody(response["Body"].read())}
+
+    async def list_objects_v2(self, **kwargs) -> dict:
+        return await self.request("list_objects_v2", **kwargs)
@@ -0,0 +1,112 @@
+"""This module tests the bulk search of the hands of a raw history and the compact indexes built from it."""
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from history_generator import generate_raw_text
+from pkrsplitter.patterns.winamax import HAND_ID_PATTERN, NEW_HAND_PATTERN
+from pkrsplitter.splitters.engine import NEW_HAND_BYTES_REGEX, find_hands
+from pkrsplitter.splitters.hand_index import HandIndex, SplitKeys
+
+RAW_TEXT = generate_raw_text(0, hands_count=5, hand_size=1)
+DESTINATION_DIR = "data/histories/split/2024/01/01/20240101_Freeroll(100000)"
+HAND_ID_BYTES_REGEX = re.compile(HAND_ID_PATTERN.encode())
+
+
+def split_with_regex(raw_text: str) -> list:
+    """
+    Splits a raw history like the splitters did before the bulk search, with re.split and a search per hand
+    Args:
+        raw_text (str): The raw text of the history file
+
+    Returns:
+        hands (list): The (hand_id, hand_text) tuple of each hand
+    """
+    hands = []
+    for hand_text in re.split(NEW_HAND_PATTERN, raw_text)[1:]:
+        match = re.search(HAND_ID_PATTERN, hand_text)
+        hands.append((match.group("hand_id") if match else "", hand_text))
+    return hands
+
+
+def get_found_hands(raw_text: str) -> list:
+    starts, ends, hand_ids = find_hands(raw_text)
+    assert starts.typecode == ends.typecode == "q"
+    return [(hand_id, raw_text[start:end]) for start, end, hand_id in zip(starts, ends, hand_ids)]
+
+
+@pytest.mark.parametrize("raw_text", [
+    RAW_TEXT,
+    "",
+    "A file without any hand header\n",
+    f"A preamble\n{RAW_TEXT}",
+    # A trailing hand cut before its id, then inside its first line
+    f"{RAW_TEXT}Winamax Poker - Tournament",
+    f"{RAW_TEXT}Winamax Poker - Tournament \"Freeroll\" buyIn: 0€ + 0€ level: 1 - HandId: #1-2",
+    # Multi-byte characters before and inside the hands
+    f"é€\n{RAW_TEXT.replace('player', 'jöueur€')}",
+])
+def test_found_hands_match_the_regex_split(raw_text):
+    assert get_found_hands(raw_text) == split_with_regex(raw_text)
+
+
+def test_found_hands_of_encoded_text():
+    raw_text = f"é€\n{RAW_TEXT.replace('player', 'jöueur€')}"
+    raw_bytes = raw_text.encode("utf-8")
+    starts, ends, hand_ids = find_hands(raw_bytes, NEW_HAND_BYTES_REGEX, HAND_ID_BYTES_REGEX)
+    # The offsets of the bytes are those of the encoded characters, and the ids are decoded
+    assert [raw_bytes[start:end].decode("utf-8") for start, end in zip(starts, ends)] == \
+           [hand_text for _, hand_text in split_with_regex(raw_text)]
+    assert hand_ids == [hand_id for hand_id, _ in split_with_regex(raw_text)]
+    assert all(isinstance(hand_id, str) for hand_id in hand_ids)
+
+
+def test_hand_index_builds_the_hands():
+    hand_index = HandIndex(DESTINATION_DIR, RAW_TEXT, *find_hands(RAW_TEXT))
+    expected_hands = [(f"{DESTINATION_DIR}/{hand_id}.txt", hand_text) for hand_id, hand_text
+                      in split_with_regex(RAW_TEXT)]
+    assert len(hand_index) == 5
+    assert list(hand_index) == expected_hands
+    assert hand_index[-1] == expected_hands[-1]
+    assert hand_index.get_hand_text(2) == expected_hands[2][1]
+    split_keys = hand_index.get_split_keys()
+    hand_index.release()
+    assert hand_index.raw_text is None
+    # The split keys do not depend on the released raw text
+    assert list(split_keys) == [destination_key for destination_key, _ in expected_hands]
+    assert repr(hand_index) == f"HandIndex({DESTINATION_DIR!r}, 5 hands)"
+
+
+def test_split_keys_sequence():
+    hand_ids = ["100000-1-1", "100000-2-1", "100000-3-1"]
+    split_keys = SplitKeys(DESTINATION_DIR, iter(hand_ids))
+    destination_keys = [f"{DESTINATION_DIR}/{hand_id}.txt" for hand_id in hand_ids]
+    assert len(split_keys) == 3
+    assert split_keys.hand_ids == hand_ids
+    assert list(split_keys) == destination_keys
+    assert split_keys[1] == destination_keys[1]
+    assert split_keys[-1] == destination_keys[-1]
+    assert split_keys == destination_keys
+    assert repr(split_keys) == f"SplitKeys({DESTINATION_DIR!r}, 3 hands)"
+    empty_split_keys = SplitKeys(DESTINATION_DIR, [])
+    assert len(empty_split_keys) == 0
+    assert empty_split_keys.hand_ids == []
+    assert list(empty_split_keys) == []
+
+
+@pytest.mark.parametrize("compact_object", [
+    SplitKeys(DESTINATION_DIR, ["100000-1-1"]),
+    HandIndex(DESTINATION_DIR, RAW_TEXT, *find_hands(RAW_TEXT)),
+])
+def test_compact_objects_have_no_dict(compact_object):
+    assert not hasattr(compact_object, "__dict__")
+    with pytest.raises(AttributeError):
+        compact_object.extra_attribute = None
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
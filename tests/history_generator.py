@@ -0,0 +1,227 @@
+"""This module generates synthetic Winamax history files, the same for a given seed, and their SQS notifications."""
+import json
+import os
+import random
+from datetime import date, datetime, timedelta, timezone
+
+DEFAULT_SEED = 0
+DEFAULT_FILES_COUNT = 100
+DEFAULT_HANDS_COUNT = 200
+# The number of action lines of each street, which sets the size of a hand
+DEFAULT_HAND_SIZE = 4
+START_DATE = date(2024, 1, 1)
+DAYS_COUNT = 31
+RAW_HISTORY_DIR = os.path.join("histories", "raw")
+PLAYERS = [f"player{number}" for number in range(1, 10)]
+RANKS = "23456789TJQKA"
+SUITS = "cdhs"
+ACTIONS = ("folds", "checks", "calls {amount}", "bets {amount}", "raises {amount} to {total}")
+STREETS = ("PRE-FLOP", "FLOP", "TURN", "RIVER")
+
+
+def get_raw_file_info(file_number: int) -> tuple:
+    """
+    Returns the partition date, the name and the tournament id of a generated raw history file
+    Args:
+        file_number (int): The number of the file
+
+    Returns:
+        raw_file_info (tuple): The date, the file name and the tournament id of the file
+    """
+    file_date = START_DATE + timedelta(days=file_number % DAYS_COUNT)
+    tournament_id = 100000 + file_number
+    file_name = f"{file_date:%Y%m%d}_Freeroll({tournament_id})_real_holdem_no-limit.txt"
+    return file_date, file_name, tournament_id
+
+
+def get_raw_key(raw_dir: str, file_number: int, separator: str = "/") -> str:
+    """
+    Returns the key of a generated raw history file in its raw/YYYY/MM/DD partition
+    Args:
+        raw_dir (str): The raw histories directory
+        file_number (int): The number of the file
+        separator (str): The separator of the key, os.sep for a local path
+
+    Returns:
+        raw_key (str): The key of the raw history file
+    """
+    file_date, file_name, _ = get_raw_file_info(file_number)
+    return separator.join((raw_dir, f"{file_date:%Y}", f"{file_date:%m}", f"{file_date:%d}", file_name))
+
+
+def generate_cards(rng: random.Random, count: int) -> str:
+    return " ".join(rng.choice(RANKS) + rng.choice(SUITS) for _ in range(count))
+
+
+def generate_hand_text(rng: random.Random, tournament_id: int, hand_number: int, hand_datetime: datetime,
+                       hand_size: int = DEFAULT_HAND_SIZE) -> str:
+    """
+    Generates the text of a Winamax tournament hand, ending with the blank lines separating hands
+    Args:
+        rng (random.Random): The random generator of the file
+        tournament_id (int): The id of the tournament
+        hand_number (int): The number of the hand in the tournament
+        hand_datetime (datetime): The date and time of the hand
+        hand_size (int): The number of action lines of each street
+
+    Returns:
+        hand_text (str): The text of the hand
+    """
+    level = hand_number // 20 + 1
+    small_blind, big_blind = 10 * level, 20 * level
+    players = PLAYERS[:rng.randint(2, 6)]
+    lines = [
+        f'Winamax Poker - Tournament "Freeroll" buyIn: 0€ + 0€ level: {level} - '
+        f"HandId: #{tournament_id}-{hand_number}-{int(hand_datetime.timestamp())} - "
+        f"Holdem no limit ({small_blind}/{big_blind}) - {hand_datetime:%Y/%m/%d %H:%M:%S} UTC",
+        f"Table: 'Freeroll({tournament_id})#001' 6-max (real money) Seat #1 is the button",
+    ]
+    lines.extend(f"Seat {seat}: {player} ({rng.randint(1000, 40000)})" for seat, player in enumerate(players, 1))
+    lines.extend(["*** ANTE/BLINDS ***", f"{players[0]} posts small blind {small_blind}",
+                  f"{players[1]} posts big blind {big_blind}", f"Dealt to {players[0]} [{generate_cards(rng, 2)}]"])
+    pot = small_blind + big_blind
+    for street_number, street in enumerate(STREETS):
+        board = f" [{generate_cards(rng, street_number + 2)}]" if street_number else ""
+        lines.append(f"*** {street} ***{board}")
+        for _ in range(hand_size):
+            amount = big_blind * rng.randint(1, 10)
+            action = rng.choice(ACTIONS).format(amount=amount, total=amount * 2)
+            lines.append(f"{rng.choice(players)} {action}")
+            pot += amount if action[0] in "cbr" else 0
+    winner = rng.choice(players)
+    lines.extend([f"{winner} collected {pot} from pot", "*** SUMMARY ***", f"Total pot {pot} | No rake",
+                  f"Board: [{generate_cards(rng, 5)}]", f"Seat 1: {winner} won {pot}"])
+    return "\n".join(lines) + "\n\n\n"
+
+
+def generate_raw_text(file_number: int, hands_count: int = DEFAULT_HANDS_COUNT, hand_size: int = DEFAULT_HAND_SIZE,
+                      seed: int = DEFAULT_SEED) -> str:
+    """
+    Generates the text of a raw history file, which only depends on the seed and on the file number
+    Args:
+        file_number (int): The number of the file
+        hands_count (int): The number of hands of the file
+        hand_size (int): The number of action lines of each street
+        seed (int): The seed of the generator
+
+    Returns:
+        raw_text (str): The text of the raw history file
+    """
+    rng = random.Random(f"{seed}-{file_number}")
+    file_date, _, tournament_id = get_raw_file_info(file_number)
+    start = datetime(file_date.year, file_date.month, file_date.day, 20, tzinfo=timezone.utc)
+    return "".join(generate_hand_text(rng, tournament_id, hand_number, start + timedelta(seconds=30 * hand_number),
+                                      hand_size)
+                   for hand_number in range(hands_count))
+
+
+def iter_raw_histories(files_count: int = DEFAULT_FILES_COUNT, hands_count: int = DEFAULT_HANDS_COUNT,
+                       hand_size: int = DEFAULT_HAND_SIZE, seed: int = DEFAULT_SEED, first_file_number: int = 0):
+    """
+    Yields the file number and the text of each generated raw history file
+    Args:
+        files_count (int): The number of files
+        hands_count (int): The number of hands of each file
+        hand_size (int): The number of action lines of each street
+        seed (int): The seed of the generator
+        first_file_number (int): The number of the first file, to generate files added to a previous set
+
+    Returns:
+        raw_histories (Iterator[tuple]): Tuples of (file_number, raw_text)
+    """
+    for file_number in range(first_file_number, first_file_number + files_count):
+        yield file_number, generate_raw_text(file_number, hands_count, hand_size, seed)
+
+
+def write_local_histories(data_dir: str, files_count: int = DEFAULT_FILES_COUNT, **generator_options) -> list:
+    """
+    Writes generated raw history files to the raw histories directory of a data directory
+    Args:
+        data_dir (str): The data directory
+        files_count (int): The number of files
+        generator_options: The hands_count, hand_size, seed and first_file_number options of iter_raw_histories
+
+    Returns:
+        raw_keys (list): The paths of the written files
+    """
+    raw_dir = os.path.join(data_dir, RAW_HISTORY_DIR)
+    raw_keys = []
+    for file_number, raw_text in iter_raw_histories(files_count, **generator_options):
+        raw_key = get_raw_key(raw_dir, file_number, os.sep)
+        os.makedirs(os.path.dirname(raw_key), exist_ok=True)
+        with open(raw_key, "w", encoding="utf-8") as file:
+            file.write(raw_text)
+        raw_keys.append(raw_key)
+    return raw_keys
+
+
+def put_bucket_histories(s3, bucket_name: str, data_dir: str = "data", files_count: int = DEFAULT_FILES_COUNT,
+                         **generator_options) -> list:
+    """
+    Puts generated raw history files to the raw histories directory of a bucket
+    Args:
+        s3: The S3 client, e.g. a FakeS3
+        bucket_name (str): The name of the bucket
+        data_dir (str): The data directory of the bucket
+        files_count (int): The number of files
+        generator_options: The hands_count, hand_size, seed and first_file_number options of iter_raw_histories
+
+    Returns:
+        raw_keys (list): The keys of the put objects
+    """
+    raw_dir = f"{data_dir}/histories/raw"
+    raw_keys = []
+    for file_number, raw_text in iter_raw_histories(files_count, **generator_options):
+        raw_key = get_raw_key(raw_dir, file_number)
+        s3.put_object(Bucket=bucket_name, Key=raw_key, Body=raw_text.encode("utf-8"))
+        raw_keys.append(raw_key)
+    return raw_keys
+
+
+def get_sqs_record(message_id: str, bucket_name: str, key: str) -> dict:
+    """
+    Returns a SQS record notifying a raw history file, as received by the lambda, with all the attributes set by
+    S3, SNS and SQS so that its size is the one of a real record
+    Args:
+        message_id (str): The id of the SQS message
+        bucket_name (str): The name of the bucket
+        key (str): The key of the raw history file
+
+    Returns:
+        record (dict): The SQS record, whose body is a SNS message wrapping a S3 event
+    """
+    s3_event = {"Records": [{
+        "eventVersion": "2.1", "eventSource": "aws:s3", "awsRegion": "eu-west-3",
+        "eventTime": "2024-01-15T20:00:00.000Z", "eventName": "ObjectCreated:Put",
+        "userIdentity": {"principalId": "AWS:AIDAJDPLRKLG7UEXAMPLE"},
+        "requestParameters": {"sourceIPAddress": "127.0.0.1"},
+        "responseElements": {"x-amz-request-id": "C3D13FE58DE4C810",
+                             "x-amz-id-2": "FMyUVURIY8/IgAtTv8xRjskZQpcIZ9KG4V5Wp6S7S/JRWeUWerMUE5JgHvANOjpD"},
+        "s3": {"s3SchemaVersion": "1.0", "configurationId": "raw-history-created",
+               "bucket": {"name": bucket_name, "ownerIdentity": {"principalId": "A3NL1KOZZKExample"},
+                          "arn": f"arn:aws:s3:::{bucket_name}"},
+               "object": {"key": key, "size": 1048576, "eTag": "d41d8cd98f00b204e9800998ecf8427e",
+                          "sequencer": "0055AED6DCD90281E5"}},
+    }]}
+    sns_message = {
+        "Type": "Notification", "MessageId": "95df01b4-ee98-5cb9-9903-4c221d41eb5e",
+        "TopicArn": "arn:aws:sns:eu-west-3:123456789012:raw-histories", "Subject": "Amazon S3 Notification",
+        "Message": json.dumps(s3_event), "Timestamp": "2024-01-15T20:00:00.000Z", "SignatureVersion": "1",
+        "Signature": "A" * 344,
+        "SigningCertURL": "https://sns.eu-west-3.amazonaws.com/SimpleNotificationService-0000000000000000000000.pem",
+        "UnsubscribeURL": "https://sns.eu-west-3.amazonaws.com/?Action=Unsubscribe&SubscriptionArn="
+                          "arn:aws:sns:eu-west-3:123456789012:raw-histories:00000000-0000-0000-0000-000000000000",
+    }
+    return {
+        "messageId": message_id, "receiptHandle": "R" * 400, "body": json.dumps(sns_message),
+        "attributes": {"ApproximateReceiveCount": "1", "SentTimestamp": "1705348800000",
+                       "SenderId": "AIDAIENQZJOLO23YVJ4VO", "ApproximateFirstReceiveTimestamp": "1705348800001"},
+        "messageAttributes": {}, "md5OfBody": "e4e68fb7bd0e697a0ae8f1bb342846b3", "eventSource": "aws:sqs",
+        "eventSourceARN": "arn:aws:sqs:eu-west-3:123456789012:raw-histories", "awsRegion": "eu-west-3",
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    written_keys = write_local_histories(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_FILES_COUNT)
+    print(f"Generated {len(written_keys)} raw history files in {sys.argv[1]}")
@@ -0,0 +1,71 @@
+"""This module tests the time needed to import the entry points of the package, which adds to Lambda cold starts."""
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from reports import BASE_DIR, REPORTS_DIR, benchmark, get_results_path
+
+IMPORT_TIME_RESULTS_PATH = os.path.join(REPORTS_DIR, "import_time_results.txt")
+ENTRY_POINTS = [
+    "pkrsplitter.settings",
+    "pkrsplitter.splitters.local",
+    "pkrsplitter.splitters.cloud",
+    "pkrsplitter.lambda.history_splitter",
+    "pkrsplitter.cli",
+]
+# Modules that must only be imported when they are used
+DEFERRED_MODULES = ["boto3", "botocore", "multiprocessing", "sqlite3", "gzip"]
+IMPORT_TIME_PATTERN = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+MAX_IMPORT_TIME_MS = 100
+
+
+def get_import_times(module_name: str) -> dict:
+    """
+    Imports a module in a new interpreter with `python -X importtime` and returns the cumulative time of each import
+    Args:
+        module_name (str): The name of the module to import
+
+    Returns:
+        import_times (dict): The cumulative import time in microseconds of each imported module
+    """
+    # __import__ rather than an import statement, since pkrsplitter.lambda is not a valid name in an import statement
+    command = f"__import__({module_name!r})"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", command],
+                            capture_output=True, text=True, cwd=BASE_DIR, check=True)
+    return {match.group(4): int(match.group(2)) for match in IMPORT_TIME_PATTERN.finditer(result.stderr)}
+
+
+@pytest.mark.parametrize("module_name", ENTRY_POINTS)
+def test_deferred_imports(module_name):
+    deferred_modules = [name for name in DEFERRED_MODULES if name in get_import_times(module_name)]
+    assert not deferred_modules, f"{module_name} imports {deferred_modules} eagerly"
+
+
+@benchmark
+def test_import_time(runs: int = 5, results_path: str = None):
+    results_path = get_results_path(results_path, IMPORT_TIME_RESULTS_PATH)
+    lines = []
+    for module_name in ENTRY_POINTS:
+        import_times = [get_import_times(module_name) for _ in range(runs)]
+        best_time_ms = min(times[module_name] for times in import_times) / 1000
+        deferred_modules = [name for name in DEFERRED_MODULES if name in import_times[0]]
+        line = f"{module_name}: {best_time_ms:.1f} ms"
+        if deferred_modules:
+            line += f", imports {', '.join(deferred_modules)}"
+        print(line)
+        lines.append(line)
+        assert not deferred_modules, f"{module_name} imports {deferred_modules} eagerly"
+        assert best_time_ms < MAX_IMPORT_TIME_MS, f"{module_name} takes {best_time_ms:.1f} ms to import"
+    os.makedirs(os.path.dirname(results_path), exist_ok=True)
+    print(f"Writing results to {results_path}")
+    with open(results_path, "w") as file:
+        file.write("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    test_import_time(results_path=IMPORT_TIME_RESULTS_PATH)
@@ -0,0 +1,51 @@
+"""This module tests the partial batch responses of the splitting lambda, which only retry the failed records."""
+import importlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_s3 import FakeS3
+from history_generator import get_sqs_record, put_bucket_histories
+from pkrsplitter.splitters.cloud import CloudFileSplitter
+
+history_splitter = importlib.import_module("pkrsplitter.lambda.history_splitter")
+
+BUCKET_NAME = "lambda-bucket"
+FILES_COUNT = 3
+HANDS_COUNT = 5
+
+
+@pytest.fixture
+def s3(monkeypatch) -> FakeS3:
+    s3 = FakeS3()
+    splitter = CloudFileSplitter(BUCKET_NAME, s3_client=s3)
+    splitter.set_metrics(history_splitter.metrics)
+    monkeypatch.setitem(history_splitter.splitters, BUCKET_NAME, splitter)
+    return s3
+
+
+def test_failed_records_are_reported(s3):
+    raw_keys = put_bucket_histories(s3, BUCKET_NAME, files_count=FILES_COUNT, hands_count=HANDS_COUNT)
+    malformed_record = {**get_sqs_record("malformed", BUCKET_NAME, raw_keys[0]), "body": "{}"}
+    records = [get_sqs_record(f"record-{number}", BUCKET_NAME, raw_key) for number, raw_key in enumerate(raw_keys)]
+    records[1:1] = [get_sqs_record("missing", BUCKET_NAME, "data/histories/raw/2024/01/15/missing.txt"),
+                    malformed_record]
+    response = history_splitter.lambda_handler({"Records": records}, None)
+    assert response == {"batchItemFailures": [{"itemIdentifier": "missing"}, {"itemIdentifier": "malformed"}]}
+    # The other records of the batch are split, and not reported for a retry
+    assert history_splitter.metrics.counters["files"] == FILES_COUNT
+    splitter = history_splitter.splitters[BUCKET_NAME]
+    assert len(splitter.list_split_keys("data/histories/split")) == FILES_COUNT * HANDS_COUNT
+
+
+def test_successful_batch_reports_no_failure(s3):
+    raw_keys = put_bucket_histories(s3, BUCKET_NAME, files_count=FILES_COUNT, hands_count=HANDS_COUNT)
+    records = [get_sqs_record(f"record-{number}", BUCKET_NAME, raw_key) for number, raw_key in enumerate(raw_keys)]
+    assert history_splitter.lambda_handler({"Records": records}, None) == {"batchItemFailures": []}
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,73 @@
+"""This module tests the parallel walk listing the raw histories, against a serial walk of the same trees."""
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from history_generator import RAW_HISTORY_DIR, write_local_histories
+from pkrsplitter.splitters.listing import iter_parallel_walk
+from pkrsplitter.splitters.local import LocalFileSplitter
+
+FILES_COUNT = 40
+
+
+def get_listing_threads() -> list:
+    return [thread for thread in threading.enumerate() if thread.name.startswith("listing")]
+
+
+def walk_serially(directory_key: str) -> list:
+    return sorted(os.path.join(root, file) for root, _, files in os.walk(directory_key)
+                  for file in files if file.endswith(".txt"))
+
+
+@pytest.mark.parametrize("max_workers", [1, 4, 16])
+def test_parallel_walk_lists_every_file(tmp_path, max_workers):
+    data_dir = str(tmp_path)
+    write_local_histories(data_dir, FILES_COUNT, hands_count=1)
+    raw_dir = os.path.join(data_dir, RAW_HISTORY_DIR)
+    # Empty directories at every level, and a file which is not a history
+    os.makedirs(os.path.join(raw_dir, "2023", "12", "31"))
+    os.makedirs(os.path.join(raw_dir, "2024", "02"))
+    with open(os.path.join(raw_dir, "2024", "notes.md"), "w") as file:
+        file.write("notes")
+    scan = LocalFileSplitter(data_dir).scan_raw_directory
+    raw_stats = list(iter_parallel_walk(scan, [raw_dir], max_workers))
+    raw_keys = [raw_key for raw_key, _, _ in raw_stats]
+    assert len(raw_keys) == FILES_COUNT
+    assert sorted(raw_keys) == walk_serially(raw_dir)
+    assert all(size == os.path.getsize(raw_key) for raw_key, size, _ in raw_stats)
+    assert not get_listing_threads()
+
+
+def test_parallel_walk_of_empty_trees(tmp_path):
+    os.makedirs(tmp_path / "empty" / "sub" / "sub")
+    scan = LocalFileSplitter(str(tmp_path)).scan_raw_directory
+    assert list(iter_parallel_walk(scan, [str(tmp_path / "empty"), str(tmp_path / "missing")])) == []
+    assert list(iter_parallel_walk(scan, [])) == []
+
+
+def test_parallel_walk_of_several_roots():
+    tree = {"a": (["a/1", "a/2"], ["a.txt"]), "a/1": ([], ["a1.txt"]), "a/2": ([], []),
+            "b": (["b/1"], []), "b/1": ([], ["b1.txt", "b2.txt"])}
+    entries = list(iter_parallel_walk(tree.__getitem__, ["a", "b"], max_workers=2))
+    assert sorted(entries) == ["a.txt", "a1.txt", "b1.txt", "b2.txt"]
+
+
+def test_parallel_walk_raises_the_scan_error():
+    def scan_directory(directory_key: str) -> tuple:
+        if directory_key == "root/3":
+            raise PermissionError(directory_key)
+        if directory_key == "root":
+            return [f"root/{number}" for number in range(8)], []
+        return [], [f"{directory_key}/file.txt"]
+
+    with pytest.raises(PermissionError, match="root/3"):
+        list(iter_parallel_walk(scan_directory, ["root"], max_workers=2))
+    assert not get_listing_threads()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,146 @@
+"""This module compares the local writes of split files per hand with the batched atomic writer."""
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from history_generator import write_local_histories
+from reports import REPORTS_DIR, benchmark, get_results_path
+from pkrsplitter.splitters.abstract import AbstractFileSplitter
+from pkrsplitter.splitters.local import LocalFileSplitter
+
+WRITE_RESULTS_PATH = os.path.join(REPORTS_DIR, "local_write_results.txt")
+# The per-hand writes are the ones of the splitter before the batched writer, which creates the directory and opens
+# a text file for each hand
+WRITE_MODES = ("per-hand", "batched", "batched-fsync")
+
+
+class PerHandFileSplitter(LocalFileSplitter):
+    """
+    A local splitter writing each hand on its own, creating its directory and opening it in text mode
+    """
+
+    def write_file(self, file_key: str, content: str) -> None:
+        os.makedirs(os.path.dirname(file_key), exist_ok=True)
+        with open(file_key, "w", encoding="latin-1") as file:
+            file.write(content)
+
+    def write_files(self, files) -> None:
+        AbstractFileSplitter.write_files(self, files)
+
+
+def create_splitter(mode: str, data_dir: str) -> LocalFileSplitter:
+    if mode == "per-hand":
+        return PerHandFileSplitter(data_dir)
+    splitter = LocalFileSplitter(data_dir)
+    splitter.set_writer(fsync=mode == "batched-fsync")
+    return splitter
+
+
+def get_split_hands(data_dir: str, files_count: int, hands_count: int) -> list:
+    """
+    Generates raw histories and splits their hands in memory, so that only their writes are timed
+    Args:
+        data_dir (str): The data directory of the generated histories
+        files_count (int): The number of raw files
+        hands_count (int): The number of hands per raw file
+
+    Returns:
+        split_hands (list): A list of the (destination_key, hand_text) tuples of each raw file
+    """
+    splitter = LocalFileSplitter(data_dir)
+    raw_keys = write_local_histories(data_dir, files_count=files_count, hands_count=hands_count)
+    return [list(splitter.get_separated_hands_info(raw_key)) for raw_key in raw_keys]
+
+
+def time_writes(mode: str, data_dir: str, split_hands: list, run_name: str) -> float:
+    """
+    Writes the split hands of each raw file to new split directories with a write mode. Each run writes to its own
+    split directory, since deleting the files of a previous run slows the next writes down on some file systems.
+    Args:
+        mode (str): One of WRITE_MODES
+        data_dir (str): The data directory of the generated histories
+        split_hands (list): A list of the (destination_key, hand_text) tuples of each raw file
+        run_name (str): The name of the split directory of the run
+
+    Returns:
+        seconds (float): The duration of the writes
+    """
+    splitter = create_splitter(mode, data_dir)
+    split_dir = os.path.join(data_dir, "histories", "split")
+    run_split_dir = os.path.join(data_dir, "runs", run_name)
+    run_hands = [[(destination_key.replace(split_dir, run_split_dir, 1), hand_text)
+                  for destination_key, hand_text in hands] for hands in split_hands]
+    if hasattr(os, "sync"):
+        # The files written by the previous runs are flushed first, so that their writeback is not timed with this run
+        os.sync()
+    start = time.perf_counter()
+    for hands in run_hands:
+        splitter.write_files(hands)
+    seconds = time.perf_counter() - start
+    assert len(splitter.list_split_keys(run_split_dir)) == sum(len(hands) for hands in split_hands)
+    return seconds
+
+
+def read_split_files(split_dir: str) -> dict:
+    split_files = {}
+    for root, _, file_names in os.walk(split_dir):
+        for file_name in file_names:
+            with open(os.path.join(root, file_name), "rb") as file:
+                split_files[os.path.relpath(os.path.join(root, file_name), split_dir)] = file.read()
+    return split_files
+
+
+@pytest.mark.parametrize("mode", WRITE_MODES)
+def test_write_modes_write_the_same_files(tmp_path, mode):
+    data_dir = str(tmp_path)
+    split_hands = get_split_hands(data_dir, files_count=2, hands_count=20)
+    splitter = create_splitter(mode, data_dir)
+    split_dir = os.path.join(data_dir, "histories", "split")
+    for hands in split_hands:
+        splitter.write_files(hands)
+    expected_files = {os.path.relpath(destination_key, split_dir): hand_text.encode("latin-1")
+                      for hands in split_hands for destination_key, hand_text in hands}
+    assert read_split_files(split_dir) == expected_files
+    # Writing the hands again replaces the files of the existing directories, without leaving temporary files
+    for hands in split_hands:
+        splitter.write_files((destination_key, f"{hand_text}rewritten") for destination_key, hand_text in hands)
+    assert read_split_files(split_dir) == {key: content + b"rewritten" for key, content in expected_files.items()}
+
+
+@benchmark
+def test_local_write(files_count: int = 20, hands_count: int = 200, repeats: int = 7, results_path: str = None):
+    results_path = get_results_path(results_path, WRITE_RESULTS_PATH)
+    data_dir = tempfile.mkdtemp(prefix="pkrsplitter_write_")
+    try:
+        split_hands = get_split_hands(data_dir, files_count, hands_count)
+        durations = {mode: [] for mode in WRITE_MODES}
+        # The modes take turns, so that a slowdown of the disk weighs on all of them
+        for run_number in range(repeats):
+            for mode in WRITE_MODES:
+                durations[mode].append(time_writes(mode, data_dir, split_hands, f"{mode}-{run_number}"))
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    hands_total = files_count * hands_count
+    seconds = {mode: statistics.median(mode_durations) for mode, mode_durations in durations.items()}
+    lines = [f"Wrote {hands_total} hands of {files_count} files, median of {repeats} runs"]
+    for mode in WRITE_MODES:
+        lines.append(f"{mode:>13}: {seconds[mode]:.3f} seconds, {hands_total / seconds[mode]:.0f} hands per second, "
+                     f"{seconds['per-hand'] / seconds[mode]:.2f} times as fast as per-hand")
+    text = "\n".join(lines) + "\n"
+    print(text)
+    os.makedirs(os.path.dirname(results_path), exist_ok=True)
+    print(f"Writing results to {results_path}")
+    with open(results_path, "w") as file:
+        file.write(text)
+    assert seconds["batched"] < seconds["per-hand"]
+
+
+if __name__ == "__main__":
+    test_local_write(results_path=WRITE_RESULTS_PATH)
@@ -0,0 +1,159 @@
+"""This module tests the manifests recording the split raw files, and the incremental runs which rely on them."""
+import hashlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_s3 import FakeS3
+from history_generator import put_bucket_histories, write_local_histories
+from pkrsplitter.splitters.cloud import CloudFileSplitter
+from pkrsplitter.splitters.local import LocalFileSplitter
+from pkrsplitter.splitters.manifest import ManifestEntry, S3Manifest, SqliteManifest
+
+BUCKET_NAME = "manifest-bucket"
+MANIFEST_KEY = "data/split_manifest.json.gz"
+FILES_COUNT = 4
+HANDS_COUNT = 10
+
+
+@pytest.fixture(params=["sqlite", "s3"])
+def create_manifest(request, tmp_path):
+    """
+    Returns a function creating a new instance of a manifest over the same storage, for each backend
+    """
+    if request.param == "sqlite":
+        path = str(tmp_path / "split_manifest.sqlite")
+        return lambda: SqliteManifest(path)
+    s3 = FakeS3()
+    return lambda: S3Manifest(s3, BUCKET_NAME, MANIFEST_KEY)
+
+
+def test_manifest_round_trip(create_manifest):
+    manifest = create_manifest()
+    assert manifest.get("raw/a.txt") is None
+    entries = [ManifestEntry("raw/a.txt", 100, "v1", "hash-a", ("1-1", "1-2")),
+               ManifestEntry("raw/b.txt", 200, "v2", "hash-b", ("2-1",), 150)]
+    for entry in entries:
+        manifest.record(entry)
+    assert [manifest.get(entry.raw_key) for entry in entries] == entries
+    assert manifest.get("raw/a.txt").get_split_keys("split/a") == ["split/a/1-1.txt", "split/a/1-2.txt"]
+    # The entries are only persisted on save
+    manifest.save()
+    new_manifest = create_manifest()
+    assert [new_manifest.get(entry.raw_key) for entry in entries] == entries
+    assert new_manifest.find_content("hash-b") == "raw/b.txt"
+
+
+def test_manifest_versions(create_manifest):
+    manifest = create_manifest()
+    manifest.record(ManifestEntry("raw/a.txt", 100, "v1", "hash-a", ()))
+    manifest.record(ManifestEntry("raw/b.txt", 200, "v2", "hash-b", ()))
+    assert manifest.is_current("raw/a.txt", 100, "v1")
+    assert not manifest.is_current("raw/a.txt", 101, "v1")
+    assert not manifest.is_current("raw/a.txt", 100, "v3")
+    assert not manifest.is_current("raw/c.txt", 100, "v1")
+    raw_stats = [("raw/a.txt", 100, "v1"), ("raw/b.txt", 200, "v3"), ("raw/c.txt", 300, "v4")]
+    assert list(manifest.iter_changed(raw_stats)) == raw_stats[1:]
+
+
+def test_manifest_finds_the_same_content(create_manifest):
+    manifest = create_manifest()
+    manifest.record(ManifestEntry("raw/a.txt", 100, "v1", "hash-a", ()))
+    assert manifest.find_content("hash-a", exclude_raw_key="raw/a.txt") is None
+    manifest.record(ManifestEntry("raw/copy.txt", 100, "v1", "hash-a", ()))
+    assert manifest.find_content("hash-a", exclude_raw_key="raw/a.txt") == "raw/copy.txt"
+    # A recorded file whose content changed no longer has its previous content
+    manifest.record(ManifestEntry("raw/copy.txt", 120, "v2", "hash-copy", ()))
+    assert manifest.find_content("hash-a", exclude_raw_key="raw/a.txt") is None
+
+
+def test_cloud_fingerprint_is_the_etag():
+    s3 = FakeS3()
+    raw_key = put_bucket_histories(s3, BUCKET_NAME, files_count=1, hands_count=HANDS_COUNT)[0]
+    splitter = CloudFileSplitter(BUCKET_NAME, s3_client=s3)
+    splitter.split_files()
+    destination_dir = splitter.get_destination_dir(raw_key)
+    fingerprints = splitter.list_split_fingerprints(destination_dir)
+    assert len(fingerprints) == HANDS_COUNT
+    for destination_key, hand_text in splitter.get_separated_hands_info(raw_key):
+        fingerprint = fingerprints[destination_key]
+        assert fingerprint == hashlib.md5(hand_text.encode("utf-8")).hexdigest()
+        assert splitter.matches_fingerprint(destination_key, hand_text, fingerprint)
+        assert not splitter.matches_fingerprint(destination_key, f"{hand_text} ", fingerprint)
+        assert not splitter.matches_fingerprint(destination_key, hand_text, None)
+
+
+def test_local_fingerprint_is_the_size(tmp_path):
+    data_dir = str(tmp_path)
+    raw_key = write_local_histories(data_dir, files_count=1, hands_count=HANDS_COUNT)[0]
+    splitter = LocalFileSplitter(data_dir)
+    splitter.split_files()
+    fingerprints = splitter.list_split_fingerprints(splitter.get_destination_dir(raw_key))
+    destination_key, hand_text = splitter.get_separated_hands_info(raw_key)[0]
+    assert splitter.matches_fingerprint(destination_key, hand_text, fingerprints[destination_key])
+    # A content of the same size is read to be compared
+    changed_text = f"{hand_text[:-1]}#"
+    assert not splitter.matches_fingerprint(destination_key, changed_text, fingerprints[destination_key])
+    assert not splitter.matches_fingerprint(destination_key, hand_text, fingerprints[destination_key] + 1)
+
+
+class CountingSplitter(LocalFileSplitter):
+    """
+    A local splitter with a manifest, recording the raw files it reads
+    """
+
+    def __init__(self, data_dir: str):
+        super().__init__(data_dir)
+        self.set_manifest()
+        self.read_keys = []
+
+    def read_raw_history(self, raw_key: str) -> str:
+        self.read_keys.append(raw_key)
+        return super().read_raw_history(raw_key)
+
+
+def count_split_files(data_dir: str) -> int:
+    return sum(len(files) for _, _, files in os.walk(os.path.join(data_dir, "histories", "split")))
+
+
+def test_changed_file_is_split_again(tmp_path):
+    data_dir = str(tmp_path)
+    raw_keys = write_local_histories(data_dir, FILES_COUNT, hands_count=HANDS_COUNT)
+    CountingSplitter(data_dir).split_new_files()
+    assert count_split_files(data_dir) == FILES_COUNT * HANDS_COUNT
+    # The manifest survives the splitter, so an unchanged tree is not read again
+    splitter = CountingSplitter(data_dir)
+    splitter.split_new_files()
+    assert splitter.read_keys == []
+    # The first raw file is rewritten with two more hands
+    write_local_histories(data_dir, files_count=1, hands_count=HANDS_COUNT + 2)
+    splitter = CountingSplitter(data_dir)
+    splitter.split_new_files()
+    assert splitter.read_keys == [raw_keys[0]]
+    assert count_split_files(data_dir) == FILES_COUNT * HANDS_COUNT + 2
+    assert splitter.manifest.get(raw_keys[0]).hand_count == HANDS_COUNT + 2
+
+
+def test_changed_object_is_split_again():
+    s3 = FakeS3()
+    raw_keys = put_bucket_histories(s3, BUCKET_NAME, files_count=FILES_COUNT, hands_count=HANDS_COUNT)
+    splitter = CloudFileSplitter(BUCKET_NAME, s3_client=s3)
+    splitter.set_manifest()
+    splitter.split_new_files()
+    # The ETag of the rewritten object changes, while the other objects are skipped without being read
+    put_bucket_histories(s3, BUCKET_NAME, files_count=1, hands_count=HANDS_COUNT + 2)
+    splitter = CloudFileSplitter(BUCKET_NAME, s3_client=s3)
+    splitter.set_manifest()
+    s3.get_count = s3.put_count = 0
+    splitter.split_new_files()
+    # The rewritten object is read, and its two new hands are written with the manifest
+    assert s3.get_count == 1
+    assert s3.put_count == 2 + 1
+    assert splitter.manifest.get(raw_keys[0]).hand_count == HANDS_COUNT + 2
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,96 @@
+"""This module tests the metrics of the split runs: the histograms, the JSON export and the Prometheus text format."""
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from history_generator import write_local_histories
+from pkrsplitter.splitters.local import LocalFileSplitter
+from pkrsplitter.splitters.metrics import Histogram, SplitMetrics, STAGES
+
+BUCKETS = (0.1, 1.0)
+DURATIONS = (0.05, 0.1, 0.5, 2.0)
+
+
+def test_histogram_buckets():
+    histogram = Histogram(BUCKETS)
+    assert histogram.get_quantile(0.5) == 0.0
+    for duration in DURATIONS:
+        histogram.observe(duration)
+    # A value equal to a bound is counted in its bucket, like the "le" buckets of Prometheus
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.to_dict() == {"count": 4, "sum": 2.65, "p50": 0.1, "p99": float("inf"),
+                                   "buckets": {"0.1": 2, "1.0": 3, "+Inf": 4}}
+    assert histogram.get_quantile(0.75) == 1.0
+
+
+def record_metrics() -> SplitMetrics:
+    metrics = SplitMetrics(BUCKETS)
+    for duration in DURATIONS:
+        metrics.observe("fetch", duration)
+    metrics.increment("files", 2)
+    metrics.increment("hands", 20)
+    return metrics
+
+
+def test_json_export():
+    snapshot = json.loads(record_metrics().to_json())
+    assert snapshot["counters"] == {"files": 2, "hands": 20, "bytes": 0, "skipped": 0, "quarantined": 0,
+                                    "retries": 0, "throttles": 0}
+    assert list(snapshot["stages"]) == list(STAGES)
+    assert snapshot["stages"]["fetch"]["buckets"] == {"0.1": 2, "1.0": 3, "+Inf": 4}
+    assert snapshot["stages"]["fetch"]["count"] == 4
+    assert snapshot["stages"]["write"]["count"] == 0
+
+
+def test_prometheus_text_format():
+    lines = record_metrics().to_prometheus().splitlines()
+    assert lines[:4] == ["# TYPE pkrsplitter_files_total counter", "pkrsplitter_files_total 2",
+                         "# TYPE pkrsplitter_hands_total counter", "pkrsplitter_hands_total 20"]
+    assert lines.count("# TYPE pkrsplitter_stage_seconds histogram") == 1
+    fetch_lines = [line for line in lines if 'stage="fetch"' in line]
+    assert fetch_lines == ['pkrsplitter_stage_seconds_bucket{stage="fetch",le="0.1"} 2',
+                           'pkrsplitter_stage_seconds_bucket{stage="fetch",le="1.0"} 3',
+                           'pkrsplitter_stage_seconds_bucket{stage="fetch",le="+Inf"} 4',
+                           'pkrsplitter_stage_seconds_sum{stage="fetch"} 2.65',
+                           'pkrsplitter_stage_seconds_count{stage="fetch"} 4']
+
+
+def test_hooks_and_dump(tmp_path):
+    metrics = SplitMetrics(BUCKETS)
+    recorded_values = []
+    metrics.add_hook(lambda kind, name, value: recorded_values.append((kind, name, value)))
+    metrics.increment("files")
+    metrics.observe("custom", 0.5)
+    assert recorded_values == [("counter", "files", 1), ("stage", "custom", 0.5)]
+    json_path, prometheus_path = str(tmp_path / "metrics.json"), str(tmp_path / "metrics.prom")
+    metrics.dump(json_path)
+    metrics.dump(prometheus_path, "prometheus")
+    with open(json_path) as file:
+        assert json.load(file)["stages"]["custom"]["count"] == 1
+    with open(prometheus_path) as file:
+        assert file.read() == metrics.to_prometheus()
+    with pytest.raises(ValueError):
+        metrics.dump(json_path, "csv")
+    metrics.reset()
+    assert metrics.get_snapshot()["counters"]["files"] == 0
+
+
+def test_split_run_metrics(tmp_path):
+    data_dir = str(tmp_path)
+    write_local_histories(data_dir, files_count=3, hands_count=5)
+    splitter = LocalFileSplitter(data_dir)
+    metrics = SplitMetrics()
+    splitter.set_metrics(metrics)
+    splitter.split_files()
+    snapshot = metrics.get_snapshot()
+    assert snapshot["counters"]["files"] == 3
+    assert snapshot["counters"]["hands"] == 15
+    assert all(snapshot["stages"][stage]["count"] == 3 for stage in ("fetch", "split", "write"))
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
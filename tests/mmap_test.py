@@ -0,0 +1,66 @@
+"""This module tests the splitting of memory-mapped raw histories, which must write the same files as text mode."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from history_generator import write_local_histories
+from pkrsplitter.splitters.local import LocalFileSplitter
+
+FILES_COUNT = 3
+HANDS_COUNT = 10
+
+
+def read_split_files(data_dir: str) -> dict:
+    split_files = {}
+    split_dir = os.path.join(data_dir, "histories", "split")
+    for root, _, files in os.walk(split_dir):
+        for file_name in files:
+            with open(os.path.join(root, file_name), "rb") as file:
+                split_files[os.path.relpath(os.path.join(root, file_name), split_dir)] = file.read()
+    return split_files
+
+
+def write_histories(data_dir: str, line_ending: str) -> list:
+    raw_keys = write_local_histories(data_dir, FILES_COUNT, hands_count=HANDS_COUNT)
+    for raw_key in raw_keys:
+        with open(raw_key, "rb") as file:
+            raw_bytes = file.read()
+        with open(raw_key, "wb") as file:
+            file.write(raw_bytes.replace(b"\n", line_ending.encode()))
+    return raw_keys
+
+
+@pytest.mark.parametrize("line_ending", ["\n", "\r\n"])
+def test_mapped_files_match_text_mode(tmp_path, line_ending):
+    text_dir, mapped_dir = str(tmp_path / "text"), str(tmp_path / "mapped")
+    write_histories(text_dir, line_ending)
+    write_histories(mapped_dir, line_ending)
+    LocalFileSplitter(text_dir).split_files()
+    LocalFileSplitter(mapped_dir, use_mmap=True).split_files()
+    text_files = read_split_files(text_dir)
+    assert len(text_files) == FILES_COUNT * HANDS_COUNT
+    assert read_split_files(mapped_dir) == text_files
+
+
+def test_mapped_split_new_files_keeps_the_text_files(tmp_path):
+    data_dir = str(tmp_path)
+    write_histories(data_dir, "\r\n")
+    LocalFileSplitter(data_dir).split_files()
+    split_files = read_split_files(data_dir)
+    splitter = LocalFileSplitter(data_dir, use_mmap=True)
+    splitter.set_deduplication(raw=False)
+    written_keys = []
+    write_many = splitter.writer.write_many
+    splitter.writer.write_many = lambda files: write_many(
+        (written_keys.append(file_key) or file_key, content) for file_key, content in files)
+    splitter.split_files()
+    # The translated hands match the files written in text mode, which are not written again
+    assert written_keys == []
+    assert read_split_files(data_dir) == split_files
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
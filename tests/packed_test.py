@@ -0,0 +1,70 @@
+"""This module tests the packed output format and the ranged reads of single hands from the packs."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_s3 import FakeS3
+from history_generator import put_bucket_histories, write_local_histories
+from pkrsplitter.splitters.cloud import CloudFileSplitter
+from pkrsplitter.splitters.local import LocalFileSplitter
+from pkrsplitter.splitters.packed import get_index_key, get_pack_key, read_pack_index, read_packed_hand
+
+BUCKET_NAME = "packed-bucket"
+FILES_COUNT = 2
+HANDS_COUNT = 10
+
+
+def test_local_packed_hands_are_read_back(tmp_path):
+    data_dir = str(tmp_path)
+    raw_keys = write_local_histories(data_dir, FILES_COUNT, hands_count=HANDS_COUNT)
+    splitter = LocalFileSplitter(data_dir, output_format="packed")
+    splitter.split_files()
+    for raw_key in raw_keys:
+        destination_dir = splitter.get_destination_dir(raw_key)
+        assert os.path.isfile(get_pack_key(destination_dir))
+        assert os.path.isfile(get_index_key(destination_dir))
+        assert not os.path.exists(destination_dir)
+        index = read_pack_index(splitter, destination_dir)
+        # The spans of the hands follow each other in the pack
+        spans = sorted(index.values())
+        assert [offset for offset, _ in spans] == [0] + [offset + length for offset, length in spans[:-1]]
+        assert sum(length for _, length in spans) == os.path.getsize(get_pack_key(destination_dir))
+        expected_hands = LocalFileSplitter(data_dir).get_separated_hands_info(raw_key)
+        assert len(expected_hands) == HANDS_COUNT
+        for destination_key, hand_text in expected_hands:
+            assert splitter.read_split_hand(destination_key) == hand_text
+            assert read_packed_hand(splitter, destination_key, index) == hand_text
+
+
+def test_cloud_packed_hand_is_read_with_a_ranged_request():
+    s3 = FakeS3()
+    raw_keys = put_bucket_histories(s3, BUCKET_NAME, files_count=FILES_COUNT, hands_count=HANDS_COUNT)
+    splitter = CloudFileSplitter(BUCKET_NAME, s3_client=s3, output_format="packed")
+    splitter.split_files()
+    destination_key, hand_text = splitter.get_separated_hands_info(raw_keys[0])[3]
+    destination_dir = splitter.get_destination_dir(raw_keys[0])
+    index = read_pack_index(splitter, destination_dir)
+    requests = []
+    get_object = s3.get_object
+    s3.get_object = lambda **kwargs: requests.append(kwargs) or get_object(**kwargs)
+    assert read_packed_hand(splitter, destination_key, index) == hand_text
+    offset, length = index[destination_key.rsplit("/", 1)[1][:-len(".txt")]]
+    assert requests == [{"Bucket": BUCKET_NAME, "Key": get_pack_key(destination_dir),
+                         "Range": f"bytes={offset}-{offset + length - 1}"}]
+
+
+def test_packed_split_new_files_keeps_complete_packs():
+    s3 = FakeS3()
+    put_bucket_histories(s3, BUCKET_NAME, files_count=FILES_COUNT, hands_count=HANDS_COUNT)
+    splitter = CloudFileSplitter(BUCKET_NAME, s3_client=s3, output_format="packed")
+    splitter.split_files()
+    s3.put_count = 0
+    splitter.split_new_files()
+    assert s3.put_count == 0
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
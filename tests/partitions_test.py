@@ -0,0 +1,59 @@
+"""This module tests the listing of the raw histories selected by a sub-directory and a date range."""
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_s3 import FakeS3
+from history_generator import put_bucket_histories, write_local_histories
+from pkrsplitter.splitters.cloud import CloudFileSplitter
+from pkrsplitter.splitters.local import LocalFileSplitter
+from pkrsplitter.splitters.partitions import get_date_prefixes, intersect_prefixes
+
+FILES_COUNT = 40
+
+
+def test_intersect_prefixes():
+    date_prefixes = get_date_prefixes(date(2023, 12, 30), date(2024, 2, 29))
+    assert date_prefixes == ["2023/12/30/", "2023/12/31/", "2024/01/", "2024/02/"]
+    assert intersect_prefixes("2023/12", date_prefixes) == ["2023/12/30/", "2023/12/31/"]
+    assert intersect_prefixes("/2024/01/15/", date_prefixes) == ["2024/01/15/"]
+    assert intersect_prefixes("2024", date_prefixes) == ["2024/01/", "2024/02/"]
+    assert intersect_prefixes("2023/11", date_prefixes) == []
+
+
+@pytest.mark.parametrize("prefix, start_date, end_date, expected_days", [
+    ("2024/01/1", date(2024, 1, 5), None, set()),
+    ("2024/01/10", date(2024, 1, 5), None, {10}),
+    ("2024/01/10", date(2024, 1, 12), None, set()),
+    ("2024/01", date(2024, 1, 29), None, {29, 30, 31}),
+    ("2024", date(2024, 1, 20), date(2024, 1, 22), {20, 21, 22}),
+])
+def test_prefix_with_date_range(tmp_path, prefix, start_date, end_date, expected_days):
+    data_dir = str(tmp_path)
+    write_local_histories(data_dir, FILES_COUNT, hands_count=1)
+    splitter = LocalFileSplitter(data_dir)
+    splitter.set_raw_filter(prefix, start_date=start_date, end_date=end_date)
+    listed_keys = [job.raw_key for job in splitter.iter_raw_histories_jobs()]
+    assert {int(raw_key.split(os.sep)[-2]) for raw_key in listed_keys} == expected_days
+    assert all(f"{os.sep}raw{os.sep}{prefix}" in raw_key.replace("/", os.sep) for raw_key in listed_keys)
+
+
+def test_bucket_listing_skips_the_sibling_prefixes():
+    s3 = FakeS3()
+    raw_keys = put_bucket_histories(s3, "bucket", files_count=3, hands_count=1)
+    for raw_key in raw_keys:
+        # A backup directory whose name starts with the name of the raw directory
+        backup_key = raw_key.replace("/raw/", "/raw_backup/")
+        s3.put_object(Bucket="bucket", Key=backup_key, Body=s3.objects[("bucket", raw_key)])
+    splitter = CloudFileSplitter("bucket", s3_client=s3)
+    assert sorted(job.raw_key for job in splitter.iter_raw_histories_jobs()) == sorted(raw_keys)
+    splitter.set_raw_filter("2024/01/0")
+    assert list(splitter.iter_raw_histories_jobs()) == []
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,110 @@
+"""This module tests the bounded pipeline running the stages of the splitting: back-pressure, errors and threads."""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pkrsplitter.splitters.pipeline import Pipeline, Stage
+
+ITEMS_COUNT = 100
+
+
+def get_pipeline_threads() -> list:
+    return [thread for thread in threading.enumerate() if thread.name.startswith("pipeline-")]
+
+
+def wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_pipeline_processes_every_item():
+    results = []
+    lock = threading.Lock()
+
+    def collect(item):
+        with lock:
+            results.append(item)
+
+    stages = [Stage("double", lambda item: 2 * item, workers=3, queue_size=2),
+              Stage("drop_odd_tens", lambda item: None if item % 20 == 10 else item, workers=2, queue_size=2),
+              Stage("collect", collect, workers=2, queue_size=2)]
+    Pipeline(stages).run(range(ITEMS_COUNT))
+    assert sorted(results) == [2 * item for item in range(ITEMS_COUNT) if (2 * item) % 20 != 10]
+    assert not get_pipeline_threads()
+
+
+def test_slow_stage_blocks_the_source():
+    pulled = []
+    release = threading.Event()
+
+    def iter_source():
+        for item in range(ITEMS_COUNT):
+            pulled.append(item)
+            yield item
+
+    queue_size = 3
+    pipeline = Pipeline([Stage("slow", lambda item: release.wait(), workers=1, queue_size=queue_size)])
+    runner = threading.Thread(target=pipeline.run, args=(iter_source(),))
+    runner.start()
+    try:
+        # The worker holds an item, the queue is full, and the source is blocked on the next one
+        assert wait_for(lambda: len(pulled) == queue_size + 2)
+        time.sleep(0.1)
+        assert len(pulled) == queue_size + 2
+    finally:
+        release.set()
+        runner.join()
+    assert len(pulled) == ITEMS_COUNT
+    assert not get_pipeline_threads()
+
+
+@pytest.mark.parametrize("failing_index", [0, 1, 2])
+def test_stage_error_is_raised(failing_index):
+    processed = []
+
+    def get_func(index):
+        def func(item):
+            if index == failing_index and item == 10:
+                raise ValueError(f"stage {index} failed")
+            if index == 2:
+                processed.append(item)
+            return item
+        return func
+
+    pipeline = Pipeline([Stage(f"stage{index}", get_func(index), workers=2, queue_size=2) for index in range(3)])
+    with pytest.raises(ValueError, match=f"stage {failing_index} failed"):
+        pipeline.run(range(ITEMS_COUNT))
+    # The items left after the failure are drained without being processed
+    assert len(processed) < ITEMS_COUNT
+    assert not get_pipeline_threads()
+
+
+def test_source_error_is_raised():
+    def iter_source():
+        yield from range(10)
+        raise OSError("listing failed")
+
+    processed = []
+    with pytest.raises(OSError, match="listing failed"):
+        Pipeline([Stage("process", processed.append, workers=2, queue_size=2)]).run(iter_source())
+    assert not get_pipeline_threads()
+
+
+def test_stage_needs_a_worker():
+    with pytest.raises(ValueError):
+        Stage("empty", print, workers=0)
+    with pytest.raises(ValueError):
+        Pipeline([])
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,40 @@
+"""This module defines when the benchmark tests run and where they write their results, apart from the default run."""
+import os
+import tempfile
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPORTS_DIR = os.path.join(BASE_DIR, "reports")
+TEMP_REPORTS_DIR = os.path.join(tempfile.gettempdir(), "pkrsplitter_reports")
+# Set to 1 to update the committed reports from a test run, as the benchmarks run as scripts do
+WRITE_REPORTS_VARIABLE = "POKER_SPLITTER_WRITE_REPORTS"
+# Set to 1 to run the benchmarks, whose timings are only meaningful on an idle machine
+RUN_BENCHMARKS_VARIABLE = "POKER_SPLITTER_RUN_BENCHMARKS"
+
+
+def is_variable_set(name: str) -> bool:
+    return os.environ.get(name, "") not in ("", "0")
+
+
+# Marks a benchmark test, skipped by the default test run
+benchmark = pytest.mark.skipif(not is_variable_set(RUN_BENCHMARKS_VARIABLE),
+                               reason=f"a benchmark, run with {RUN_BENCHMARKS_VARIABLE}=1")
+
+
+def get_results_path(results_path: str, report_path: str) -> str:
+    """
+    Returns the path of the results of a benchmark test
+    Args:
+        results_path (str): The path given to the test, or None for its default path
+        report_path (str): The path of the committed report of the test
+
+    Returns:
+        results_path (str): The given path, the committed report if WRITE_REPORTS_VARIABLE is set, or else a file
+            of the same name in a temporary directory
+    """
+    if results_path is not None:
+        return results_path
+    if is_variable_set(WRITE_REPORTS_VARIABLE):
+        return report_path
+    return os.path.join(TEMP_REPORTS_DIR, os.path.basename(report_path))
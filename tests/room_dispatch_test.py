@@ -0,0 +1,97 @@
+"""This module tests the overhead of sniffing the room of each raw history file before splitting it."""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from reports import REPORTS_DIR, benchmark, get_results_path
+from pkrsplitter.splitters.local import LocalFileSplitter
+from pkrsplitter.splitters.rooms import ROOMS
+
+ROOM_DISPATCH_RESULTS_PATH = os.path.join(REPORTS_DIR, "room_dispatch_results.txt")
+RAW_DIR = os.path.join("histories", "raw", "2024", "01", "15")
+# The sniffing must add less than this share of the time needed to split a file
+MAX_OVERHEAD_RATIO = 0.05
+
+
+def get_hand_text(room: str, tournament_id: int, hand_number: int) -> str:
+    hand_id = f"{tournament_id}{hand_number:06d}"
+    if room == "winamax":
+        header = (f'Winamax Poker - Tournament "Freeroll" buyIn: 0€ + 0€ level: 1 - HandId: #{tournament_id}-'
+                  f'{hand_number}-1705348800 - Holdem no limit (10/20) - 2024/01/15 20:00:00 UTC\n')
+    elif room == "pokerstars":
+        header = (f"PokerStars Hand #{hand_id}: Tournament #{tournament_id}, Freeroll Hold'em No Limit - "
+                  f"Level I (10/20) - 2024/01/15 20:00:00 ET\n")
+    else:
+        header = (f"Poker Hand #TM{hand_id}: Tournament #{tournament_id}, Freeroll Hold'em No Limit - "
+                  f"Level1(10/20) - 2024/01/15 20:00:00\n")
+    return (header + f"Table '{tournament_id} 1' 6-max Seat #1 is the button\n"
+            "Seat 1: player1 (20000)\nSeat 2: player2 (20000)\nplayer1: posts small blind 10\n"
+            "player2: posts big blind 20\n*** HOLE CARDS ***\nplayer1: folds\n"
+            "player2 collected 30 from pot\n*** SUMMARY ***\nTotal pot 30 | Rake 0\n\n\n")
+
+
+def create_raw_files(data_dir: str, files_count: int, hands_count: int) -> dict:
+    raw_dir = os.path.join(data_dir, RAW_DIR)
+    os.makedirs(raw_dir, exist_ok=True)
+    rooms = {}
+    for file_number in range(files_count):
+        room = tuple(ROOMS)[file_number % len(ROOMS)]
+        tournament_id = 1000 + file_number
+        raw_key = os.path.join(raw_dir, f"20240115_Freeroll({tournament_id})_real_holdem_no-limit.txt")
+        with open(raw_key, "w", encoding="utf-8") as file:
+            file.write("".join(get_hand_text(room, tournament_id, hand_number) for hand_number in range(hands_count)))
+        rooms[raw_key] = room
+    return rooms
+
+
+def test_room_sniffing(tmp_path):
+    rooms = create_raw_files(str(tmp_path), files_count=6, hands_count=20)
+    splitter = LocalFileSplitter(str(tmp_path))
+    for raw_key, room in rooms.items():
+        assert splitter.get_raw_room(raw_key).name == room, f"{raw_key} is not sniffed as {room}"
+        assert len(set(splitter.get_id_list(raw_key))) == 20, f"{raw_key} has duplicate hand ids"
+
+
+@benchmark
+def test_room_dispatch(files_count: int = 30, hands_count: int = 200, runs: int = 5,
+                       results_path: str = None):
+    results_path = get_results_path(results_path, ROOM_DISPATCH_RESULTS_PATH)
+    data_dir = tempfile.mkdtemp()
+    try:
+        rooms = create_raw_files(data_dir, files_count, hands_count)
+        splitter = LocalFileSplitter(data_dir)
+        sniff_times, split_times = [], []
+        for _ in range(runs):
+            start = time.perf_counter()
+            for raw_key in rooms:
+                splitter.get_raw_room(raw_key)
+            sniff_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            for raw_key in rooms:
+                splitter.write_split_files(raw_key)
+            split_times.append(time.perf_counter() - start)
+    finally:
+        shutil.rmtree(data_dir)
+    sniff_time_us = min(sniff_times) / files_count * 1e6
+    split_time_us = min(split_times) / files_count * 1e6
+    overhead_ratio = sniff_time_us / split_time_us
+    lines = [
+        f"Rooms: {', '.join(ROOMS)}, {files_count} files of {hands_count} hands",
+        f"Sniffing: {sniff_time_us:.1f} us per file",
+        f"Splitting: {split_time_us:.1f} us per file",
+        f"Overhead: {overhead_ratio:.2%} of the splitting time",
+    ]
+    print("\n".join(lines))
+    assert overhead_ratio < MAX_OVERHEAD_RATIO, f"Sniffing takes {overhead_ratio:.2%} of the splitting time"
+    os.makedirs(os.path.dirname(results_path), exist_ok=True)
+    print(f"Writing results to {results_path}")
+    with open(results_path, "w") as file:
+        file.write("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    test_room_dispatch(results_path=ROOM_DISPATCH_RESULTS_PATH)
@@ -0,0 +1,89 @@
+"""This module tests the split keys cache, which lists the existing split keys in bulk during a split run."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_s3 import FakeS3
+from history_generator import put_bucket_histories
+from pkrsplitter.splitters.cloud import CloudFileSplitter
+from pkrsplitter.splitters.split_keys import SplitKeysCache
+
+BUCKET_NAME = "split-keys-bucket"
+SPLIT_DIR = "data/histories/split"
+# Two files share each of the first days of the generated dates
+FILES_COUNT = 40
+HANDS_COUNT = 5
+
+
+def record_split_listings(s3: FakeS3) -> list:
+    """
+    Records the prefixes of the listings of split keys sent to a fake S3
+    Args:
+        s3 (FakeS3): The fake S3 client
+
+    Returns:
+        prefixes (list): The prefixes of the split listings, filled as they are sent
+    """
+    prefixes = []
+    list_objects_v2 = s3.list_objects_v2
+
+    def recorded_list_objects_v2(**kwargs):
+        if kwargs.get("Prefix", "").startswith(SPLIT_DIR):
+            prefixes.append(kwargs["Prefix"])
+        return list_objects_v2(**kwargs)
+
+    s3.list_objects_v2 = recorded_list_objects_v2
+    return prefixes
+
+
+def test_split_keys_are_listed_once_per_partition():
+    s3 = FakeS3()
+    raw_keys = put_bucket_histories(s3, BUCKET_NAME, files_count=FILES_COUNT, hands_count=HANDS_COUNT)
+    splitter = CloudFileSplitter(BUCKET_NAME, s3_client=s3)
+    splitter.split_files()
+    prefixes = record_split_listings(s3)
+    s3.put_count = 0
+    # The raw files are split in the order of their listing, partition after partition, by a worker per stage, so
+    # that each partition is still cached when its second raw file is checked
+    splitter.set_pipeline({"fetch": 1, "split": 1, "write": 1}, queue_size=1)
+    splitter.split_raw_keys(sorted(raw_keys), only_new=True)
+    partitions = {f"{os.path.dirname(splitter.get_destination_dir(raw_key))}/" for raw_key in raw_keys}
+    assert len(partitions) < FILES_COUNT
+    assert sorted(prefixes) == sorted(partitions)
+    assert s3.put_count == 0
+
+
+def test_written_split_keys_are_seen_by_later_checks():
+    s3 = FakeS3()
+    raw_key = put_bucket_histories(s3, BUCKET_NAME, files_count=1, hands_count=HANDS_COUNT)[0]
+    splitter = CloudFileSplitter(BUCKET_NAME, s3_client=s3)
+    # A single writer, so that the second job of the raw file is checked once the first one is written
+    splitter.set_pipeline({"fetch": 1, "split": 1, "write": 1}, queue_size=1)
+    prefixes = record_split_listings(s3)
+    splitter.split_raw_keys([raw_key, raw_key], only_new=True)
+    assert s3.put_count == 1 + HANDS_COUNT
+    assert len(prefixes) == 1
+
+
+def test_cache_keeps_the_written_keys_of_listed_partitions():
+    listed_partitions = []
+
+    def list_split_keys(partition):
+        listed_partitions.append(partition)
+        return [f"{partition}/file/1.txt"]
+
+    cache = SplitKeysCache(list_split_keys, max_partitions=1)
+    assert list(cache.get_split_dir_keys("split/01/file")) == ["split/01/file/1.txt"]
+    # The keys of a partition which is not listed yet are left to its listing
+    cache.add_split_keys(["split/01/file/2.txt", "split/02/file/2.txt"])
+    assert list(cache.get_split_dir_keys("split/01/file")) == ["split/01/file/1.txt", "split/01/file/2.txt"]
+    assert list(cache.get_split_dir_keys("split/02/file")) == ["split/02/file/1.txt"]
+    assert list(cache.get_split_dir_keys("split/01/file")) == ["split/01/file/1.txt"]
+    assert listed_partitions == ["split/01", "split/02", "split/01"]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,53 @@
+"""This module tests the streamed splitting of raw histories read in chunks, around the chunk boundaries."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from history_generator import generate_raw_text, write_local_histories
+from pkrsplitter.splitters.engine import BOUNDARY_LOOKBACK, NEW_HAND_REGEX, iter_hand_texts, iter_streamed_hand_texts
+from pkrsplitter.splitters.local import LocalFileSplitter
+
+RAW_TEXT = generate_raw_text(0, hands_count=4, hand_size=1)
+# A preamble longer than the lookback, so that the first marker is only found thanks to the kept characters
+PREAMBLE = "x" * (3 * BOUNDARY_LOOKBACK)
+
+
+def get_chunks(text: str, chunk_size: int) -> list:
+    return [text[start:start + chunk_size] for start in range(0, len(text), chunk_size)]
+
+
+@pytest.mark.parametrize("text", [RAW_TEXT, PREAMBLE + RAW_TEXT])
+def test_streamed_hands_with_a_cut_marker(text):
+    expected_hands = list(iter_hand_texts(text))
+    assert len(expected_hands) == 4
+    for match in NEW_HAND_REGEX.finditer(text):
+        # Each boundary from just before to just after the marker, including every cut inside it
+        for cut in range(match.start() - 1, match.end() + 2):
+            assert list(iter_streamed_hand_texts([text[:cut], text[cut:]])) == expected_hands, f"cut at {cut}"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, BOUNDARY_LOOKBACK - 1, BOUNDARY_LOOKBACK, BOUNDARY_LOOKBACK + 1, 1000])
+def test_streamed_hands_with_small_chunks(chunk_size):
+    for text in (RAW_TEXT, PREAMBLE + RAW_TEXT):
+        assert list(iter_streamed_hand_texts(get_chunks(text, chunk_size))) == list(iter_hand_texts(text))
+
+
+def test_streamed_hands_without_marker():
+    assert list(iter_streamed_hand_texts(get_chunks(PREAMBLE, 7))) == []
+    assert list(iter_streamed_hand_texts([])) == []
+
+
+def test_streaming_splitter_writes_the_same_hands(tmp_path):
+    data_dir = str(tmp_path)
+    raw_key = write_local_histories(data_dir, files_count=1, hands_count=20)[0]
+    streaming_splitter = LocalFileSplitter(data_dir, streaming=True, chunk_size=BOUNDARY_LOOKBACK // 2)
+    expected_hands = list(LocalFileSplitter(data_dir).get_separated_hands_info(raw_key))
+    assert len(expected_hands) == 20
+    assert list(streaming_splitter.get_separated_hands_info(raw_key)) == expected_hands
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
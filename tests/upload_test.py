@@ -0,0 +1,66 @@
+"""This module tests the upload of split files to a fake S3 which throttles the requests like S3 does."""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_s3 import FakeS3
+from pkrsplitter.splitters.cloud import CloudFileSplitter
+
+BUCKET_NAME = "fake-bucket"
+RAW_DIR = "data/histories/raw/2024/01/15"
+
+
+def get_hand_text(tournament_id: int, hand_number: int) -> str:
+    return (f'Winamax Poker - Tournament "Freeroll" buyIn: 0€ + 0€ level: 1 - HandId: #{tournament_id}-'
+            f'{hand_number}-1705348800 - Holdem no limit (10/20) - 2024/01/15 20:00:00 UTC\n'
+            f"Table: 'Freeroll({tournament_id})#001' 6-max (real money) Seat #1 is the button\n"
+            "Seat 1: player1 (20000)\nSeat 2: player2 (20000)\n*** ANTE/BLINDS ***\n"
+            "player1 posts small blind 10\nplayer2 posts big blind 20\n*** PRE-FLOP ***\n"
+            "player1 folds\nplayer2 collected 30 from pot\n*** SUMMARY ***\nTotal pot 30 | No rake\n\n\n")
+
+
+def fill_bucket(s3: FakeS3, files_count: int, hands_count: int):
+    for tournament_id in range(1000, 1000 + files_count):
+        raw_text = "".join(get_hand_text(tournament_id, hand_number) for hand_number in range(hands_count))
+        raw_key = f"{RAW_DIR}/20240115_Freeroll({tournament_id})_real_holdem_no-limit.txt"
+        s3.put_object(Bucket=BUCKET_NAME, Key=raw_key, Body=raw_text.encode("utf-8"))
+    s3.put_count = 0
+
+
+def test_upload(files_count: int = 20, hands_count: int = 200, max_concurrency: int = 16, throttle_rate: float = 0.01,
+                latency: float = 0.002):
+    s3 = FakeS3(throttle_rate=throttle_rate, max_concurrency=max_concurrency, latency=latency, seed=0)
+    fill_bucket(s3, files_count, hands_count)
+    splitter = CloudFileSplitter(BUCKET_NAME, s3_client=s3, upload_workers=64)
+    start = time.time()
+    splitter.split_files()
+    total_time = time.time() - start
+    split_keys = splitter.list_split_keys("data/histories/split")
+    uploader = splitter.uploader
+    print(f"\nSplit {len(split_keys)} hands of {files_count} files in {total_time:.2f} seconds, "
+          f"or {len(split_keys) / total_time:.0f} hands per second")
+    print(f"{s3.put_count} PUT requests, {s3.throttled_count} throttled, {uploader.retries_count} retries")
+    print(f"Concurrency limit after the run: {uploader.concurrency.limit:.1f} for {max_concurrency} allowed requests")
+    assert len(split_keys) == files_count * hands_count
+
+
+def test_upload_prefixes_and_close():
+    s3 = FakeS3()
+    fill_bucket(s3, files_count=3, hands_count=5)
+    with CloudFileSplitter(BUCKET_NAME, s3_client=s3) as splitter:
+        splitter.split_files()
+        uploader = splitter.uploader
+        # The split files of all the raw files of a day share the token bucket of their date partition
+        assert list(uploader._prefix_buckets) == ["data/histories/split/2024/01/15"]
+        # The upload workers are stopped at the end of the run, and started again by the next upload
+        assert uploader._pool is None
+        splitter.write_files([("data/histories/split/2024/01/16/file/1.txt", "hand")])
+    assert uploader._pool is None
+    assert list(uploader._prefix_buckets) == ["data/histories/split/2024/01/15", "data/histories/split/2024/01/16"]
+
+
+if __name__ == "__main__":
+    test_upload()
+    test_upload_prefixes_and_close()